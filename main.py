@@ -1,4 +1,6 @@
+import os
 import sys
+from functools import partial
 from PyQt5.QtGui import QColor
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtWidgets import QApplication, QMainWindow, QColorDialog, QVBoxLayout, QWidget, QTabWidget, QTableWidget, \
@@ -7,20 +9,22 @@ from pathlib import Path
 from fileManager import FileManager, readSpectraFile, loadTheory
 from spectraTable import SpectraTable
 from spectraPlot import SpectraPlot
-import pickle
-from spectrumObject import SpectrumObject
+import numpy as np
+from spectrumObject import SpectrumObject, loadErrorListeners
 from theoryUI import TheoryUI
 from experimentUI import *
 from theoryFileTree import TheoryFileTree
-from PyQt5.QtCore import pyqtSlot, Qt, QSize
+from importTask import ImportTask, PasteTask
+from sessionStore import SESSION_FILE, saveSession, loadSession
+from PyQt5.QtCore import pyqtSlot, pyqtSignal, Qt, QSize
 import clipboard
 from dataTypes import DataTypes, FileTypes
 from screenSettings import screenSize
 from darktheme.widget_template import DarkApplication, DarkPalette
-from ascManager import parse_asc_data
 
 
 class MainWindow(QMainWindow):
+    signalSpectrumLoadFailed = pyqtSignal(str, str)  # file name, message, the points are read in any thread
 
     def __init__(self):
         super(MainWindow, self).__init__()
@@ -92,7 +96,11 @@ class MainWindow(QMainWindow):
         self.tabs.tabBar().setTabButton(0, QTabBar.RightSide, None)  # Hide close button
 
         def onOpenTheory(filePath):
-            tup = loadTheory(filePath)
+            try:
+                tup = loadTheory(filePath)
+            except ValueError as e:  # malformed file or a setting out of its choices
+                self.statusbar.showMessage("Failed: " + Path(filePath).name + " (" + str(e) + ")")
+                return
             theory = tup[0]
             for t in self.theoryUI.theoryList.theories:
                 if t.text == theory.text:
@@ -110,6 +118,7 @@ class MainWindow(QMainWindow):
                             break
 
         self.theoryFileTree.signalOpenFiles.connect(onOpenTheory)
+        self.theoryFileTree.signalBatchFitMessage.connect(lambda message: self.statusbar.showMessage(message))
         # ############## BOTTOM BLOCK > THEORY FILES ###############
 
         # ############## BOTTOM BLOCK > THEORY ###############
@@ -137,7 +146,14 @@ class MainWindow(QMainWindow):
 
         # ##################### INIT #########################
         self.setAcceptDrops(True)
-        # self.loadExpFiles(self.loadDataOnStart())
+        self.importTasks = {}  # dropped files being read, by path
+        self.importedFiles = []
+        self.importErrors = []
+        self.pasteTasks = []
+        self.signalSpectrumLoadFailed.connect(self.onSpectrumLoadFailed)
+        loadErrorListeners.append(
+            lambda spectrum, message: self.signalSpectrumLoadFailed.emit(spectrum.fileName, message))
+        self.loadDataOnStart()
         # self.currentTableSpectrum = None
         mainSplitter.setSizes([900, 200])
         # ##################### INIT #########################
@@ -180,12 +196,11 @@ class MainWindow(QMainWindow):
         for table in self.tables:
             for spectrum in table.selectedPlotsBySpectra:
                 if spectrum.dataType == plotDataType:
-                    for i in range(len(spectrum.xValues)):
-                        xValue = spectrum.xValues[i]
-                        yValue = spectrum.yValues[i]
-                        if spectrum.dataType == DataTypes.Phf:
-                            yValue = spectrum.yValues[i] / spectrum.xValues[i]
-                        spectrumStr += str(xValue) + "\t" + str(yValue) + "\n"
+                    xValues = np.asarray(spectrum.xValues, dtype=np.float64)
+                    yValues = np.asarray(spectrum.yValues, dtype=np.float64)
+                    if spectrum.dataType == DataTypes.Phf:
+                        yValues = yValues / xValues
+                    spectrumStr += "".join(f"{x}\t{y}\n" for x, y in zip(xValues.tolist(), yValues.tolist()))
         clipboard.copy(spectrumStr)
         self.statusbar.showMessage("Copy experiment to clipboard: " + plotDataType)
     ################# PLOTS #################
@@ -199,36 +214,108 @@ class MainWindow(QMainWindow):
 
     def dropEvent(self, event):
         files = [u.toLocalFile() for u in event.mimeData().urls()]
-        self.loadExpFiles(files)
+        self.importExpFiles(files)
 
-    def loadExpFiles(self, files):
-        fileNames = ""
+    # dropped files are read in the import pool, every table is added as soon as its file is read
+    def importExpFiles(self, files):
+        for f in files:
+            if f in FileManager.files or f in self.importTasks:
+                continue
+            task = ImportTask(f)
+            task.signals.loaded.connect(self.onExpFileImported)
+            task.signals.failed.connect(self.onExpFileImportFailed)
+            self.importTasks[f] = task
+            task.start()
+        if len(self.importTasks) > 0:
+            self.statusbar.showMessage("Loading " + str(len(self.importTasks)) + " files...")
+
+    def onExpFileImported(self, f, newSpectra):
+        self.importTasks.pop(f, None)
+        if f not in FileManager.files:
+            self.addExpFile(f, newSpectra)
+            self.importedFiles.append(Path(f).name)
+        self.showImportStatus()
+
+    def onExpFileImportFailed(self, f, message):
+        self.importTasks.pop(f, None)
+        self.importErrors.append(Path(f).name + " (" + message + ")")
+        print("import error: " + f + ": " + message)
+        self.showImportStatus()
+
+    def showImportStatus(self):
+        if len(self.importTasks) > 0:
+            self.statusbar.showMessage("Loaded: " + str(len(self.importedFiles)) + ", loading " +
+                                       str(len(self.importTasks)) + " files...")
+            return
+        message = "Loaded: " + " ".join(self.importedFiles)
+        if len(self.importErrors) > 0:
+            message += "   Failed: " + ", ".join(self.importErrors)
+        self.statusbar.showMessage(message)
+        self.importedFiles = []
+        self.importErrors = []
+
+    def onSpectrumLoadFailed(self, fileName, message):
+        print("load error: " + fileName + ": " + message)
+        self.statusbar.showMessage("Failed: " + fileName + " (" + message + ")")
+
+    def addExpFile(self, f, newSpectra):
         for table in self.tables:
             table.newSpectraAdded = False
+        self.experimentUI.addNewTable(newSpectra[0].fileType, newSpectra, Path(f).name)
+        FileManager.files.append(f)
+        for table in self.tables:
+            if table.newSpectraAdded:
+                table.fillTable()
+
+    # read in the GUI thread, for the experiments of a theory that are selected right after loading
+    def loadExpFiles(self, files):
+        fileNames = ""
+        errors = []
         for f in files:
             if f in FileManager.files:
                 continue
-            newSpectra = readSpectraFile(f)
+            try:
+                newSpectra = readSpectraFile(f)
+            except Exception as e:
+                newSpectra = []
+                print("load error: " + f + ": " + repr(e))
             if len(newSpectra) == 0:
-                return
-            self.experimentUI.addNewTable(newSpectra[0].fileType, newSpectra, Path(f).name)
+                errors.append(Path(f).name)
+                continue
+            self.addExpFile(f, newSpectra)
             fileNames += Path(f).name + " "
-            FileManager.files.append(f)
-        self.statusbar.showMessage("Loaded: " + fileNames)
-        for table in self.tables:
-            if table.newSpectraAdded:
-                table.fillTable()
+        self.statusbar.showMessage("Loaded: " + fileNames + ("   Failed: " + ", ".join(errors) if errors else ""))
     ################# DRAG AND DROP FILES #################
 
     ################# SAVE/LOAD DATA ON EXIT/START #################
     def saveDataOnExit(self):
-        with open('expFiles.pkl', 'wb') as file:
-            pickle.dump(FileManager.files, file)
+        saveSession(SESSION_FILE, self.tables, self.theoryUI.theoryList.theories, self.plotByType)
 
+    # tables, selected spectra, theories and plot ranges of the last session
     def loadDataOnStart(self):
-        if Path('expFiles.pkl').is_file():
-            with open('expFiles.pkl', 'rb') as file:
-                return pickle.load(file)
+        try:
+            session = loadSession(SESSION_FILE)
+        except Exception as e:
+            print("session not loaded: " + repr(e))
+            return
+        if session is None:
+            return
+        tables, theories, selectionRanges = session
+        for experimentName, fileType, spectra, selectedRows, sources in tables:
+            for table in self.tables:
+                table.newSpectraAdded = False
+            self.experimentUI.addNewTable(fileType, spectra, experimentName)
+            table = self.tables[-1]
+            table.fillTable()
+            FileManager.files += [os.path.abspath(f) for f in sources]
+            for row in selectedRows:
+                self.experimentUI.selectLoadedSpectra(row, table)
+        for theory in theories:
+            self.theoryUI.theoryList.addNewTheory(theory)
+        for dataType, selectionRange in selectionRanges.items():  # after plotting, a new plot clears the range
+            if dataType in self.plotByType:
+                self.plotByType[dataType].selectionRange = list(selectionRange)
+                self.plotByType[dataType].plotSelectionRange()
     ################# SAVE/LOAD DATA ON EXIT/START #################
 
     ################# KEY PRESSED #################
@@ -246,25 +333,35 @@ class MainWindow(QMainWindow):
             # self.copyTableSpectrumToClipboard()
         if event.key() == Qt.Key_Return:
             if self.theoryUI.currentTheory is not None:
-                self.theoryUI.currentTheory.update()
-                self.theoryUI.currentTheory.plotCurves()
+                self.theoryUI.currentTheory.requestUpdate()
         if event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_V:
             clipboard = QApplication.clipboard()
             pasted_text = clipboard.text()
             self.pasteExpFromTPSCalc(pasted_text)
             # print(f'Pasted text: {pasted_text}')
 
+    # the text is parsed in the import pool, large exports do not stop the window
     def pasteExpFromTPSCalc(self, pasted_text):
+        task = PasteTask(pasted_text)
+        task.signals.loaded.connect(partial(self.onPasteParsed, task))
+        task.signals.failed.connect(partial(self.onPasteFailed, task))
+        self.pasteTasks.append(task)
+        task.start()
+
+    def onPasteParsed(self, task, source, newSpectra):
+        self.pasteTasks.remove(task)
         for table in self.tables:
             table.newSpectraAdded = False
-        newSpectra = parse_asc_data(pasted_text)
-        if len(newSpectra) == 0:
-            return
         self.experimentUI.addNewTable(newSpectra[0].fileType, newSpectra, "Pasted")
         self.statusbar.showMessage("Paste")
         for table in self.tables:
             if table.newSpectraAdded:
                 table.fillTable()
+
+    def onPasteFailed(self, task, source, message):
+        self.pasteTasks.remove(task)
+        print("paste error: " + message)
+        self.statusbar.showMessage("Paste failed: " + message)
     ################# KEY PRESSED #################
 
 class TabBar(QTabBar):
@@ -277,16 +374,17 @@ class TabBar(QTabBar):
 # main
 # QtWidgets.QApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling, True) #enable highdpi scaling
 # QtWidgets.QApplication.setAttribute(QtCore.Qt.AA_UseHighDpiPixmaps, True) #use highdpi icons
-app = QApplication(sys.argv)
-# app.setPalette(DarkPalette())
-mainWindow = MainWindow()
-widget = QtWidgets.QStackedWidget()
-widget.addWidget(mainWindow)
-widget.setMinimumWidth(int(screenSize()[0] * 0.7))
-widget.setMinimumHeight(int(screenSize()[1] * 0.7))
-# widget.showMaximized()
-widget.show()
-try:
-    sys.exit(app.exec_())
-except SystemExit:
-    mainWindow.saveDataOnExit()
+if __name__ == "__main__":  # worker processes of the batch fit import the main module
+    app = QApplication(sys.argv)
+    # app.setPalette(DarkPalette())
+    mainWindow = MainWindow()
+    widget = QtWidgets.QStackedWidget()
+    widget.addWidget(mainWindow)
+    widget.setMinimumWidth(int(screenSize()[0] * 0.7))
+    widget.setMinimumHeight(int(screenSize()[1] * 0.7))
+    # widget.showMaximized()
+    widget.show()
+    try:
+        sys.exit(app.exec_())
+    except SystemExit:
+        mainWindow.saveDataOnExit()
@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+# LRU cache of kernel results keyed on the exact kernel arguments (parameters and grid arrays).
+# The size of the stored results is limited by maxBytes, the least recently used results are dropped first.
+class KernelCache:
+    def __init__(self, maxBytes=64 * 1024 ** 2):
+        self.maxBytes = maxBytes
+        self.results = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # theories are calculated in the worker thread as well as in the GUI thread
+
+    def call(self, kernel, *args):
+        key = (kernel,) + tuple(self.argumentKey(a) for a in args)
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return self.results[key]
+        result = kernel(*args)
+        if isinstance(result, tuple):
+            arrays = result
+        else:
+            arrays = (result,)
+        for array in arrays:
+            array.setflags(write=False)  # the same arrays are returned on every hit
+        size = sum(array.nbytes for array in arrays)
+        with self.lock:
+            self.misses += 1
+            if key not in self.results and size <= self.maxBytes:
+                self.results[key] = result
+                self.bytes += size
+                self.evict()
+        return result
+
+    def evict(self):
+        while self.bytes > self.maxBytes and len(self.results) > 0:
+            key, result = self.results.popitem(last=False)
+            self.bytes -= sum(array.nbytes for array in (result if isinstance(result, tuple) else (result,)))
+
+    def setMaxBytes(self, maxBytes):
+        with self.lock:
+            self.maxBytes = maxBytes
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+            self.bytes = 0
+
+    @staticmethod
+    def argumentKey(a):
+        if isinstance(a, np.ndarray):
+            return a.dtype.str, a.shape, a.tobytes()
+        return type(a), a
+
+
+kernelCache = KernelCache()
@@ -0,0 +1,179 @@
+import math
+from functools import partial
+import numpy as np
+from numba import jit, prange
+from kernelCache import kernelCache
+from numbaThreads import useThreadingLayer
+
+useThreadingLayer()
+
+# Six rare-earth sites of langasite with distributed moment directions. The moments of all sites and
+# distribution nodes and the weights of the nodes depend on the ion parameters only, they are tabulated once
+# (siteTable) and the field sweeps of the kernels are sums over the tables. The sums run in parallel over the field
+# points, the sum of one point is serial in a fixed order, so the results do not depend on the number of threads.
+
+LIGHT_SPEED = 2.998e10  # cm/s
+PI = math.pi
+h = 6.6260755E-27 / (2 * PI)
+kB = 1.380658E-16
+kcm = 2 * PI * h * LIGHT_SPEED  # cm^-1 to erg
+pi23 = 2 * PI / 3
+
+# quadrature of the distributions, the resolution setting "Quadrature" of the theories
+UNIFORM = 0  # uniform grids
+GAUSS = 1  # Gauss rules, comparable accuracy with a few nodes per axis
+QUADRATURES = {UNIFORM: "uniform", GAUSS: "Gauss"}
+
+
+def normal(x, sigma):
+    return np.exp(- 0.5 * (x / sigma) ** 2) / math.sqrt(2 * PI) / sigma
+
+
+# 2n nodes over the width (in sigma) of a normal distribution, (offsets, weights).
+# Gauss: Gauss-Hermite nodes if the width covers +-3 sigma, Gauss-Legendre on the truncated interval otherwise
+def normalNodes(sigma, n, width=6, quadrature=UNIFORM):
+    if quadrature == GAUSS:
+        if width >= 6:
+            x, w = np.polynomial.hermite_e.hermegauss(2 * n)
+            return sigma * x, w / math.sqrt(2 * PI)
+        return legendreNodes(partial(normal, sigma=sigma), -0.5 * width * sigma, 0.5 * width * sigma, 2 * n)
+    step = width * sigma / (2 * n + 1)
+    x = np.arange(-n, n) * step
+    return x, normal(x, sigma) * step
+
+
+# Gauss-Legendre nodes of a density on [start, end], (nodes, weights)
+def legendreNodes(density, start, end, numNodes):
+    x, w = np.polynomial.legendre.leggauss(numNodes)
+    x = start + (x + 1) * 0.5 * (end - start)
+    return x, density(x) * w * 0.5 * (end - start)
+
+
+# nodes of the rayleigh distribution on [0, inf): Gauss-Laguerre in u = x^2 / (2 sigma^2), the density is exp(-u) du
+def rayleighNodes(sigma, numNodes):
+    u, w = np.polynomial.laguerre.laggauss(numNodes)
+    return sigma * np.sqrt(2 * u), w
+
+
+# moments (3, nodes) of the sites 1p, 1m, 2p, 2m, 3p, 3m for all (fi, teta) offsets, sites change fastest
+def siteMoments(mIon, tetaIon, fiIon, tetaOffsets, fiOffsets):
+    fiSites = np.array([0, PI - 2 * fiIon, pi23, PI - 2 * fiIon + pi23, -pi23, PI - 2 * fiIon - pi23])
+    teta = (tetaIon + tetaOffsets)[None, :, None]
+    fi = fiIon + fiSites[None, None, :] + fiOffsets[:, None, None]
+    shape = (len(fiOffsets), len(tetaOffsets), 6)
+    moments = np.empty((3,) + shape)
+    moments[0] = mIon * np.cos(fi) * np.sin(teta)
+    moments[1] = mIon * np.sin(fi) * np.sin(teta)
+    moments[2] = mIon * np.cos(teta)
+    return moments.reshape(3, -1)
+
+
+# (moments (3, nodes), weights (nodes)) of normal distributions of teta and fi around the ion direction
+def siteTable(mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, nTeta, nFi, width=6, quadrature=UNIFORM):
+    tetaOffsets, tetaWeights = normalNodes(sigmaTeta, nTeta, width, quadrature)
+    fiOffsets, fiWeights = normalNodes(sigmaFi, nFi, width, quadrature)
+    moments = siteMoments(mIon, tetaIon, fiIon, tetaOffsets, fiOffsets)
+    weights = np.repeat((fiWeights[:, None] * tetaWeights[None, :]).ravel(), 6)
+    return moments, weights
+
+
+# nodes with equal keys merged, the weights summed. A field along c sees the same moment projection on all
+# six sites and all fi, so the table shrinks to the teta nodes.
+def foldNodes(keys, weights):
+    keys, inverse = np.unique(keys, return_inverse=True)
+    return keys, np.bincount(inverse.ravel(), weights=weights, minlength=len(keys))
+
+
+# (results, error estimate) of a kernel called with the node counts and the quadrature as the last arguments.
+# The estimate is the largest change of the results relative to their largest value when the node counts are
+# halved, that is the error of the coarser rule, so it is on the safe side; None if not estimated
+def callWithError(kernel, args, nodeCounts, quadrature, estimate=True):
+    results = kernelCache.call(kernel, *args, *nodeCounts, quadrature)
+    if not estimate:
+        return results, None
+    coarse = kernelCache.call(kernel, *args, *[max(n // 2, 1) for n in nodeCounts], quadrature)
+    if not isinstance(results, tuple):
+        results, coarse = (results,), (coarse,)
+    error = 0.0
+    for result, coarseResult in zip(results, coarse):
+        scale = np.max(np.abs(result))
+        if scale > 0:
+            error = max(error, float(np.max(np.abs(result - coarseResult)) / scale))
+    return (results if len(results) > 1 else results[0]), error
+
+
+# compensated (Kahan) addition of x to the sum s with the correction c, returns (sum, correction). The sums over
+# the nodes run over up to several 100000 terms, the short sums over the splitting nodes are added compensated
+@jit(nopython=True, nogil=True, cache=True)
+def kahanAdd(s, c, x):
+    y = x - c
+    t = s + y
+    return t, (t - s) - y
+
+
+# index of the axis 1(x), 2(y), 3(z), x by default
+def axisIndex(axis):
+    return int(axis) - 1 if int(axis) in (1, 2, 3) else 0
+
+
+# M(H) along one axis: sum of w m^2 H tanh(E / kT) / E over the moment nodes (squared projections m2 on the
+# field) and the splitting nodes dcf, E = sqrt(dcf^2 + (H m)^2) in cm-1
+@jit(nopython=True, nogil=True, parallel=True, cache=True)
+def sumM_H(H, m2, weights, dcf, dcfWeights, T):
+    M = np.zeros(len(H))
+    for i in prange(len(H)):
+        s = 0.0
+        c = 0.0
+        for k in range(len(m2)):
+            hm2 = H[i] ** 2 * m2[k] / kcm ** 2
+            p = 0.0  # short sum over the splitting nodes
+            for j in range(len(dcf)):
+                EPos = math.sqrt(dcf[j] ** 2 + hm2)
+                if EPos == 0:
+                    EPos = 0.0000001
+                p += dcfWeights[j] * math.tanh(EPos * kcm / kB / T) / (EPos * kcm)
+            s, c = kahanAdd(s, c, weights[k] * m2[k] * H[i] * p)
+        M[i] = s
+    return M
+
+
+# M along a field Hrot rotated in the plane of the moment components ma, mb, H = Hrot (sin a, cos a)
+@jit(nopython=True, nogil=True, parallel=True, cache=True)
+def sumM_Angle(angles, ma, mb, weights, Hrot, Dcf, T):
+    M = np.zeros(len(angles))
+    for i in prange(len(angles)):
+        Ha = Hrot * math.sin(angles[i])
+        Hb = Hrot * math.cos(angles[i])
+        s = 0.0
+        c = 0.0
+        for k in range(len(ma)):
+            mH = ma[k] * Ha + mb[k] * Hb
+            EPos = math.sqrt(Dcf ** 2 + (mH / kcm) ** 2)
+            s, c = kahanAdd(s, c, weights[k] * mH ** 2 / Hrot * math.tanh(EPos * kcm / kB / T) / (EPos * kcm))
+        M[i] = s
+    return M
+
+
+# 1 + magnetic contributions of the transitions of all nodes at the frequency f, mH2 - squared projections of
+# the moments on the static field, weights include the squared projections on the ac field
+@jit(nopython=True, nogil=True, parallel=True, cache=True)
+def sumDmu_H(H, f, mH2, weights, dcf, dcfWeights, T, gamma):
+    mu = np.empty(len(H), dtype=np.complex128)
+    for i in prange(len(H)):
+        s = 1 + 0j
+        c = 0j
+        for k in range(len(mH2)):
+            hm2 = H[i] ** 2 * mH2[k] / kcm ** 2
+            p = 0j  # short sum over the splitting nodes
+            for j in range(len(dcf)):
+                EPos = math.sqrt(dcf[j] ** 2 + hm2)
+                if EPos == 0:
+                    EPos = 0.00001
+                f0 = 2 * EPos
+                dMu = weights[k] * dcfWeights[j] / (EPos * kcm) * math.tanh(EPos * kcm / kB / T) * (dcf[j] / EPos) ** 2
+                r = f0 ** 2 - f ** 2 - 1j * gamma * f
+                if r != 0:
+                    p += dMu * f0 ** 2 / r
+            s, c = kahanAdd(s, c, p)
+        mu[i] = s
+    return mu
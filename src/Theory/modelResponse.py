@@ -0,0 +1,145 @@
+import math
+import numpy as np
+from theoryModels import Model
+
+LIGHT_SPEED = 2.998e10  # cm/s
+PI = math.pi
+h = 0.66260755e-26
+muB = 0.927401549e-20
+kcm = h * LIGHT_SPEED
+kB = 1.380658E-16
+Vcell = 3.347009702e-22  # cm3
+H_ZERO = 0.0001  # Oe, substitute for H = 0 in the field dependent resonances (E = 0 is singular)
+
+# parameters of each model type as stored in the table, by Model attribute name
+modelColumns = {Model.OSCILLATOR: ("deltaEps", "f0", "gamma"),
+                Model.MAGNET_OSCILLATOR: ("deltaMu", "f0", "gamma"),
+                Model.MAGNET_OSCILLATOR_H: ("deltaMu", "gamma", "deltaCF", "magneticMoment"),
+                Model.MAGNET_OSCILLATOR_ND: ("A", "gamma", "B"),
+                Model.OSCILLATOR_ND: ("deltaEps", "gamma", "mu"),
+                Model.RELAXATOR: ("deltaEps", "f0"),
+                Model.DRUDE: ("sigma", "gamma"),
+                }
+
+
+def nonZero(H):
+    return np.where(H == 0, H_ZERO, H)
+
+
+def lorentz(strength, f0, gamma, f):
+    return np.sum(strength * f0 ** 2 / (f0 ** 2 - f ** 2 - 1j * gamma * f), axis=-1)
+
+
+# derivatives of a single lorentz term by strength, f0 and gamma
+def lorentzDerivatives(strength, f0, gamma, f):
+    D = f0 ** 2 - f ** 2 - 1j * gamma * f
+    return f0 ** 2 / D, 2 * strength * f0 * (-f ** 2 - 1j * gamma * f) / D ** 2, strength * f0 ** 2 * 1j * f / D ** 2
+
+
+# model types with analytic derivatives of eps, mu by their parameters
+derivativeModelTypes = [Model.OSCILLATOR, Model.MAGNET_OSCILLATOR, Model.MAGNET_OSCILLATOR_H, Model.RELAXATOR,
+                        Model.DRUDE]
+
+
+class ModelTable:
+    # Parameter table of a theory's models: one float64 row per parameter, one column per model.
+    # Built once per update, then eps and mu are evaluated for all points and all models in one array operation.
+    def __init__(self, models, modelTypes=None):
+        self.columns = {}
+        self.parameters = {}  # model parameter: (model type, row, column) in the table
+        for name, attributes in modelColumns.items():
+            if modelTypes is not None and name not in modelTypes:
+                continue
+            selected = [model for model in models if model.name == name]
+            if len(selected) == 0:
+                continue
+            self.columns[name] = np.array([[getattr(model, a).value for model in selected] for a in attributes],
+                                          dtype=np.float64)
+            for row, a in enumerate(attributes):
+                for column, model in enumerate(selected):
+                    self.parameters[getattr(model, a)] = (name, row, column)
+
+    # f, cm-1 and H, Oe - scalars or arrays, broadcast against each other
+    def calcEps(self, f, H, epsInf):
+        f, H = self.prepare(f, H)
+        eps = np.zeros(np.broadcast_shapes(f.shape, H.shape)[:-1], dtype=np.complex128) + epsInf
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if Model.OSCILLATOR in self.columns:
+                deltaEps, f0, gamma = self.columns[Model.OSCILLATOR]
+                eps += lorentz(deltaEps, f0, gamma, f)
+            if Model.OSCILLATOR_ND in self.columns:
+                deltaEps, gamma, mu = self.columns[Model.OSCILLATOR_ND]
+                f0 = 2 * mu * muB * nonZero(H) / kcm
+                eps += lorentz(deltaEps, f0, gamma, f)
+            if Model.RELAXATOR in self.columns:
+                deltaEps, f0 = self.columns[Model.RELAXATOR]
+                eps += np.sum(deltaEps / (1 - 1j * f / f0), axis=-1)
+            if Model.DRUDE in self.columns:
+                sigma, gamma = self.columns[Model.DRUDE]
+                eps += np.sum(1j * 4 * PI * sigma * gamma / (f * (gamma - 1j * f)), axis=-1)
+        return eps
+
+    def calcMu(self, f, H, muInf, temperature=1.8):
+        f, H = self.prepare(f, H)
+        mu = np.zeros(np.broadcast_shapes(f.shape, H.shape)[:-1], dtype=np.complex128) + muInf
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if Model.MAGNET_OSCILLATOR in self.columns:
+                deltaMu, f0, gamma = self.columns[Model.MAGNET_OSCILLATOR]
+                mu += lorentz(deltaMu, f0, gamma, f)
+            if Model.MAGNET_OSCILLATOR_H in self.columns:
+                deltaMu, gamma, deltaCF, magneticMoment = self.columns[Model.MAGNET_OSCILLATOR_H]
+                f0 = 2 * np.sqrt(deltaCF ** 2 + (H * magneticMoment * muB / kcm) ** 2)  # Model.f0_H
+                mu += lorentz(deltaMu, f0, gamma, f)
+            if Model.MAGNET_OSCILLATOR_ND in self.columns:
+                A, gamma, B = self.columns[Model.MAGNET_OSCILLATOR_ND]
+                E = B * muB * nonZero(H)
+                f0 = 2 * E / kcm
+                deltaMu = 4 * PI / Vcell * (A * muB) ** 2 * np.tanh(E / kB / temperature) / E
+                mu += lorentz(deltaMu, f0, gamma, f)
+        return mu
+
+    def hasDerivative(self, parameter):
+        return parameter in self.parameters and self.parameters[parameter][0] in derivativeModelTypes
+
+    # derivatives of eps and mu by model parameters, the first axis runs over the parameters.
+    # epsConstants, muConstants - constant derivatives by other parameters, e.g. {epsInf2: 1j}
+    def calcDerivatives(self, f, H, parameters, epsConstants=None, muConstants=None):
+        f = np.asarray(f, dtype=np.float64)
+        H = np.asarray(H, dtype=np.float64)
+        shape = (len(parameters),) + np.broadcast_shapes(f.shape, H.shape)
+        dEps = np.zeros(shape, dtype=np.complex128)
+        dMu = np.zeros(shape, dtype=np.complex128)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i, parameter in enumerate(parameters):
+                if epsConstants is not None and parameter in epsConstants:
+                    dEps[i] = epsConstants[parameter]
+                if muConstants is not None and parameter in muConstants:
+                    dMu[i] = muConstants[parameter]
+                if not self.hasDerivative(parameter):
+                    continue
+                name, row, column = self.parameters[parameter]
+                values = self.columns[name][:, column]
+                if name == Model.OSCILLATOR:
+                    dEps[i] = lorentzDerivatives(*values, f)[row]
+                elif name == Model.MAGNET_OSCILLATOR:
+                    dMu[i] = lorentzDerivatives(*values, f)[row]
+                elif name == Model.MAGNET_OSCILLATOR_H:
+                    deltaMu, gamma, deltaCF, magneticMoment = values
+                    h = H * muB / kcm
+                    f0 = 2 * np.sqrt(deltaCF ** 2 + (h * magneticMoment) ** 2)  # Model.f0_H
+                    dStrength, dF0, dGamma = lorentzDerivatives(deltaMu, f0, gamma, f)
+                    dMu[i] = [dStrength, dGamma, dF0 * 4 * deltaCF / f0, dF0 * 4 * h ** 2 * magneticMoment / f0][row]
+                elif name == Model.RELAXATOR:
+                    deltaEps, f0 = values
+                    D = 1 - 1j * f / f0
+                    dEps[i] = [1 / D, -deltaEps * 1j * f / f0 ** 2 / D ** 2][row]
+                elif name == Model.DRUDE:
+                    sigma, gamma = values
+                    dEps[i] = [1j * 4 * PI * gamma / (f * (gamma - 1j * f)), 4 * PI * sigma / (gamma - 1j * f) ** 2][row]
+        return dEps, dMu
+
+    @staticmethod
+    def prepare(f, H):
+        f = np.asarray(f, dtype=np.float64)[..., None]
+        H = np.asarray(H, dtype=np.float64)[..., None]
+        return f, H
@@ -0,0 +1,12 @@
+import numba
+
+# The parallel kernels run in the theory worker thread (theoryTask), not in the main thread. After tbb has been used
+# from such a thread the process does not exit, so tbb is the last choice and never taken: workqueue is always
+# available. workqueue allows one calling thread at once, the kernels are calculated in one thread of a process.
+# The threading layer is chosen at the first parallel launch, the modules with parallel kernels call
+# useThreadingLayer() when they are imported.
+THREADING_LAYERS = ["omp", "workqueue", "tbb"]  # in the order of preference, all layers are listed
+
+
+def useThreadingLayer():
+    numba.config.THREADING_LAYER_PRIORITY = THREADING_LAYERS
@@ -0,0 +1,95 @@
+import math
+import numpy as np
+
+PI = math.pi
+
+
+# Transmission and reflection of a plane-parallel slab (Fabry-Perot) for normal incidence.
+# mu, eps - complex arrays (or scalars), f - frequencies in cm-1, d - thickness in cm.
+# All inputs are broadcast against each other, so a fixed frequency with a field sweep of mu works too.
+# Returns Tr, phase of Tr (rad), R, phase of R (rad) as numpy arrays.
+def calcTrPh(mu, eps, f, d, minTr=None):
+    mu = np.asarray(mu, dtype=np.complex128)
+    eps = np.asarray(eps, dtype=np.complex128)
+    f = np.asarray(f, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        nk = np.sqrt(mu * eps)
+        n = nk.real
+        k = nk.imag
+        ab = np.sqrt(mu / eps)
+        a = ab.real
+        b = ab.imag
+        a2b2 = a ** 2 + b ** 2
+        A = 2 * PI * n * d * f  # w_Hz = w_cm-1 * LIGHT_SPEED
+        E = np.exp(-4 * PI * k * d * f)  # w_Hz = w_cm-1 * LIGHT_SPEED
+        R = ((a - 1) ** 2 + b ** 2) / ((a + 1) ** 2 + b ** 2)
+        fiR = np.arctan((2 * b) / (a2b2 - 1))
+        RE = R * E
+        T = E * ((1 - R) ** 2 + 4 * R * np.sin(fiR) ** 2) / ((1 - RE) ** 2 + 4 * RE * np.sin(A + fiR) ** 2)
+        if minTr is not None:  # value limitation for logarithmic scale use
+            T = np.where(T < minTr, minTr, T)
+        phase2 = 2 * A + 2 * fiR
+        fiT = A - np.arctan(b * (a2b2 - 1) / (a2b2 * (2 + a) + a)) + np.arctan(
+            (RE * np.sin(phase2)) / (1 - RE * np.cos(phase2)))
+    return T, fiT, R, fiR
+
+
+# calcTrPh together with the derivatives of its outputs by parameters of the slab.
+# dMu, dEps - derivatives of mu, eps by the parameters, the first axis runs over the parameters,
+# dD - derivatives of d (1 for the thickness itself, 0 otherwise), a sequence or an array of the same first axis.
+# Returns (Tr, phase of Tr, R, phase of R) and their derivatives with the parameters axis first.
+def calcTrPhDerivatives(mu, eps, f, d, dMu, dEps, dD, minTr=None):
+    mu = np.asarray(mu, dtype=np.complex128)
+    eps = np.asarray(eps, dtype=np.complex128)
+    f = np.asarray(f, dtype=np.float64)
+    dMu = np.asarray(dMu, dtype=np.complex128)
+    dEps = np.asarray(dEps, dtype=np.complex128)
+    dD = np.asarray(dD, dtype=np.float64).reshape((-1,) + (1,) * (dMu.ndim - 1))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        nk = np.sqrt(mu * eps)
+        dNk = (dMu * eps + mu * dEps) / (2 * nk)
+        n, dN = nk.real, dNk.real
+        k, dK = nk.imag, dNk.imag
+        ab = np.sqrt(mu / eps)
+        dAb = (dMu * eps - mu * dEps) / (2 * ab * eps ** 2)
+        a, da = ab.real, dAb.real
+        b, db = ab.imag, dAb.imag
+        a2b2 = a ** 2 + b ** 2
+        dA2b2 = 2 * a * da + 2 * b * db
+        A = 2 * PI * n * d * f
+        dA = 2 * PI * f * (dN * d + n * dD)
+        E = np.exp(-4 * PI * k * d * f)
+        dE = -4 * PI * f * (dK * d + k * dD) * E
+        numR = (a - 1) ** 2 + b ** 2
+        denR = (a + 1) ** 2 + b ** 2
+        R = numR / denR
+        dR = ((2 * (a - 1) * da + 2 * b * db) * denR - numR * (2 * (a + 1) * da + 2 * b * db)) / denR ** 2
+        u = (2 * b) / (a2b2 - 1)
+        fiR = np.arctan(u)
+        dFiR = (2 * db * (a2b2 - 1) - 2 * b * dA2b2) / (a2b2 - 1) ** 2 / (1 + u ** 2)
+        RE = R * E
+        dRE = dR * E + R * dE
+        P = (1 - R) ** 2 + 4 * R * np.sin(fiR) ** 2
+        dP = -2 * (1 - R) * dR + 4 * dR * np.sin(fiR) ** 2 + 4 * R * np.sin(2 * fiR) * dFiR
+        Q = (1 - RE) ** 2 + 4 * RE * np.sin(A + fiR) ** 2
+        dQ = -2 * (1 - RE) * dRE + 4 * dRE * np.sin(A + fiR) ** 2 + 4 * RE * np.sin(2 * (A + fiR)) * (dA + dFiR)
+        T = E * P / Q
+        dT = (dE * P + E * dP) / Q - T * dQ / Q
+        if minTr is not None:  # value limitation for logarithmic scale use
+            dT = np.where(T < minTr, 0, dT)
+            T = np.where(T < minTr, minTr, T)
+        phase2 = 2 * A + 2 * fiR
+        dPhase2 = 2 * dA + 2 * dFiR
+        numV = b * (a2b2 - 1)
+        denV = a2b2 * (2 + a) + a
+        v = numV / denV
+        dV = ((db * (a2b2 - 1) + b * dA2b2) * denV - numV * (dA2b2 * (2 + a) + a2b2 * da + da)) / denV ** 2
+        numW = RE * np.sin(phase2)
+        denW = 1 - RE * np.cos(phase2)
+        w = numW / denW
+        dNumW = dRE * np.sin(phase2) + RE * np.cos(phase2) * dPhase2
+        dDenW = -dRE * np.cos(phase2) + RE * np.sin(phase2) * dPhase2
+        dW = (dNumW * denW - numW * dDenW) / denW ** 2
+        fiT = A - np.arctan(v) + np.arctan(w)
+        dFiT = dA - dV / (1 + v ** 2) + dW / (1 + w ** 2)
+    return (T, fiT, R, fiR), (dT, dFiT, dR, dFiR)
@@ -0,0 +1,217 @@
+import time
+import numpy as np
+from scipy.optimize import least_squares
+from dataTypes import DataTypes, getDataTypeAttributes
+
+DIFF_STEP = 1e-4  # relative step of the numerical derivatives, large enough for the float32 kernels
+NAN_RESIDUAL = 1e3  # residual of the points where the theory is not finite
+PROGRESS_INTERVAL = 0.1  # s, minimal interval between the plotted fit steps
+
+
+class FitStopped(Exception):
+    pass
+
+
+# free theory or model parameter with its bounds
+class FitParameter:
+    def __init__(self, parameter, lower=-np.inf, upper=np.inf, text=""):
+        self.parameter = parameter
+        self.lower = lower
+        self.upper = upper
+        self.text = text
+
+
+# experimental points of a spectrum in the units of its plot (the same as of the theory curves)
+class FitData:
+    def __init__(self, dataType, x, y, text=""):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        order = np.argsort(x)
+        self.x = x[order]
+        self.y = y[order]
+        self.dataType = dataType
+        self.text = text
+        attributes = getDataTypeAttributes(DataTypes.types, dataType)
+        self.logY = attributes is not None and attributes.logY  # fitted on the scale it is plotted in
+
+
+# selected spectra of the experiment tables, limited to the range selected on their plot
+def selectedFitData(tables, plotByType):
+    data = []
+    for table in tables:
+        for spectrum, plotItem in table.selectedPlotsBySpectra.items():
+            x = np.asarray(plotItem.xData, dtype=np.float64)
+            y = np.asarray(plotItem.yData, dtype=np.float64)
+            selectionRange = plotByType[spectrum.dataType].selectionRange
+            if selectionRange[0] is not None and selectionRange[1] is not None:
+                mask = (x >= min(selectionRange)) & (x <= max(selectionRange))
+                x = x[mask]
+                y = y[mask]
+            if len(x) > 0:
+                data.append(FitData(spectrum.dataType, x, y, spectrum.spectrumName + ", " + spectrum.sampleName))
+    return data
+
+
+class TheoryFit:
+    # Least squares fit of the free parameters of a theory to experimental spectra.
+    # Each spectrum is compared with the theory curve of its data type interpolated to the measured points,
+    # residuals are normalised so that every spectrum has the same weight whatever its units and point count.
+    def __init__(self, theory, fitParameters, data):
+        self.theory = theory
+        self.fitParameters = fitParameters
+        self.data = data
+        self.progress = None  # callback(values, cost, curvesData) on every improvement
+        self.stopped = False
+        self.evaluations = 0
+        self.bestCost = np.inf
+        self.bestValues = None
+        self.curveIndices = []  # theory curve fitted to each spectrum
+        self.masks = []  # measured points inside the theory range
+        self.scales = []
+        self.lastProgress = 0
+        self.analytic = False  # derivatives are calculated by the theory together with the curves
+        self.jacobianValues = None
+        self.lastJacobian = None
+
+        self.stages = set()  # stages recalculated when the free parameters change
+        for fitParameter in fitParameters:
+            if fitParameter.parameter.stages is None or self.stages is None:
+                self.stages = None
+            else:
+                self.stages |= set(fitParameter.parameter.stages)
+
+    def values(self):
+        return np.array([p.parameter.value for p in self.fitParameters], dtype=np.float64)
+
+    def setValues(self, values):
+        for fitParameter, value in zip(self.fitParameters, values):
+            fitParameter.parameter.value = float(value)
+
+    def evaluate(self, values):
+        self.setValues(values)
+        self.theory.stages = None if self.evaluations == 0 else self.stages
+        self.theory.update()
+        self.evaluations += 1
+
+    @staticmethod
+    def interpolate(curve, x, values):
+        curveX = np.asarray(curve.x, dtype=np.float64)
+        order = np.argsort(curveX)
+        return np.interp(x, curveX[order], np.asarray(values, dtype=np.float64)[order])
+
+    def curveResiduals(self, curve, data, mask):
+        yTheory = self.interpolate(curve, data.x[mask], curve.y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if data.logY:
+                return np.log10(yTheory) - np.log10(data.y[mask])
+            return yTheory - data.y[mask]
+
+    # residual derivatives from the curve derivatives calculated by the theory, one column per parameter
+    def curveJacobian(self, curve, data, mask):
+        x = data.x[mask]
+        jacobian = np.array([self.interpolate(curve, x, row) for row in curve.derivatives]).T
+        if data.logY:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                jacobian = jacobian / (self.interpolate(curve, x, curve.y)[:, None] * np.log(10))
+        return jacobian
+
+    # pair every spectrum with the closest theory curve of its type, fixed for the whole fit
+    def prepare(self, values):
+        self.evaluate(values)
+        self.curveIndices = []
+        self.masks = []
+        self.scales = []
+        for data in self.data:
+            best = None
+            for i, curve in enumerate(self.theory.curves):
+                if curve.dataType != data.dataType or curve.x is None or len(curve.x) < 2:
+                    continue
+                mask = (data.x >= np.min(curve.x)) & (data.x <= np.max(curve.x)) & np.isfinite(data.y)
+                if data.logY:
+                    mask &= data.y > 0
+                if np.count_nonzero(mask) == 0:
+                    continue
+                r = self.curveResiduals(curve, data, mask)
+                cost = np.nanmean(r ** 2) if np.any(np.isfinite(r)) else np.inf
+                if best is None or cost < best[0]:
+                    best = (cost, i, mask)
+            if best is None:
+                raise ValueError("no theory curve covers " + data.dataType + " " + data.text)
+            cost, i, mask = best
+            y = np.log10(data.y[mask]) if data.logY else data.y[mask]
+            scale = np.std(y) if np.std(y) > 0 else max(np.abs(np.mean(y)), 1)
+            self.curveIndices.append(i)
+            self.masks.append(mask)
+            self.scales.append(scale * np.sqrt(np.count_nonzero(mask)))
+
+    def residuals(self, values):
+        if self.stopped:
+            raise FitStopped()
+        self.evaluate(values)
+        r = np.concatenate([self.curveResiduals(self.theory.curves[i], data, mask) / scale
+                            for data, i, mask, scale in zip(self.data, self.curveIndices, self.masks, self.scales)])
+        r = np.where(np.isfinite(r), r, NAN_RESIDUAL)
+        if self.analytic:
+            J = np.concatenate([self.curveJacobian(self.theory.curves[i], data, mask) / scale
+                                for data, i, mask, scale in
+                                zip(self.data, self.curveIndices, self.masks, self.scales)])
+            self.lastJacobian = np.where(np.isfinite(J), J, 0)
+            self.jacobianValues = np.array(values, dtype=np.float64)
+        cost = 0.5 * np.dot(r, r)
+        if cost < self.bestCost:
+            self.bestCost = cost
+            self.bestValues = np.array(values, dtype=np.float64)
+            if self.progress is not None and time.time() - self.lastProgress > PROGRESS_INTERVAL:
+                self.lastProgress = time.time()
+                self.progress(self.bestValues, cost, [(np.array(x), np.array(y)) for x, y in self.theory.curvesData()])
+        return r
+
+    def jacobian(self, values):
+        if self.jacobianValues is None or not np.array_equal(values, self.jacobianValues):
+            self.residuals(values)
+        return self.lastJacobian
+
+    # Levenberg-Marquardt without bounds, trust region reflective otherwise
+    def run(self, maxEvaluations=None, analytic=True):
+        initial = self.values()
+        lower = np.array([p.lower for p in self.fitParameters], dtype=np.float64)
+        upper = np.array([p.upper for p in self.fitParameters], dtype=np.float64)
+        x0 = np.clip(initial, lower, upper)
+        parameters = [p.parameter for p in self.fitParameters]
+        self.analytic = analytic and self.theory.supportsDerivatives(parameters)
+        if self.analytic:
+            self.theory.derivativeParameters = parameters
+        try:
+            self.prepare(x0)
+            numResiduals = sum(np.count_nonzero(mask) for mask in self.masks)
+            bounded = np.any(np.isfinite(lower)) or np.any(np.isfinite(upper))
+            method = "trf" if bounded or numResiduals < len(x0) else "lm"
+            result = least_squares(self.residuals, x0, jac=self.jacobian if self.analytic else '2-point',
+                                   bounds=(lower, upper), method=method,
+                                   x_scale='jac', diff_step=DIFF_STEP, max_nfev=maxEvaluations)
+            result.errors = self.standardErrors(result)
+            self.bestValues = result.x
+            self.bestCost = result.cost
+        except FitStopped:
+            result = None
+        except Exception:
+            self.setValues(initial)
+            raise
+        finally:
+            self.theory.stages = None
+            self.theory.derivativeParameters = None
+        if self.bestValues is None:
+            self.bestValues = initial
+        self.setValues(self.bestValues)
+        return result
+
+    @staticmethod
+    def standardErrors(result):
+        dof = len(result.fun) - len(result.x)
+        if dof <= 0:
+            return None
+        try:
+            covariance = np.linalg.inv(result.jac.T @ result.jac) * 2 * result.cost / dof
+        except np.linalg.LinAlgError:
+            return None
+        return np.sqrt(np.abs(np.diag(covariance)))
@@ -1,24 +1,32 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from slabOptics import calcTrPh
+from modelResponse import ModelTable
+from kernelCache import kernelCache
 import numpy as np
 
-from numba import vectorize, cuda, jit, float32, float64, int8, uint8, int16, prange, njit, complex64
+from numba import vectorize, cuda, jit, float32, float64, int8, uint8, int16, int32, prange, njit, complex64, complex128
 from numba.types import UniTuple
+from numbaThreads import useThreadingLayer
+
+useThreadingLayer()
 
 
 class TheoryGaussPhonon(Theory):
     name = "Gauss phonon"
 
     def __init__(self):
-        Theory.__init__(self)
+        Theory.__init__(self, numPoints)
+        self.nF = TheoryParameter(oneSidePointsNum, 'N<sub>ν</sub>', "", False)  # quadrature nodes on one side
+        self.precision = TheoryParameter(Theory.MIXED, 'Precision', "", False,
+                                         choices=Theory.PRECISIONS)
+        self.resolution += [self.nF, self.precision]
 
-        self.color = QColor(0x0000FF)
+        self.color = 0x0000FF
 
         ################### v PARAMETERS v ###################
-        self.d = TheoryParameter(1.756 * 0.1, 'd', "cm")  # thickness
+        self.d = TheoryParameter(1.756 * 0.1, 'd', "cm", stages=[Theory.SLAB])  # thickness
         self.epsInf1 = TheoryParameter(14, '\u03B5\'<sub>\u221E</sub>', "")  # epsilon1 inf
         self.epsInf2 = TheoryParameter(0.05, '\u03B5\"<sub>\u221E</sub>', "")  # epsilon2 inf
         self.muInf1 = TheoryParameter(1, '\u03BC\'<sub>\u221E</sub>', "")  # mu1 inf
@@ -37,6 +45,8 @@ class TheoryGaussPhonon(Theory):
 
         ################### v PLOT VALUES v ###################
         self.f = None  # frequencies array, cm
+        self.eps_f = None  # eps, mu of the frequency sweep, reused when only the slab stage changes
+        self.mu_f = None
         self.tr_f = None  # transmittance
         self.ph_f = None  # phase/frequency, rad/cm-1
         self.r_f = None  # Reflectivity
@@ -56,76 +66,33 @@ class TheoryGaussPhonon(Theory):
         self.calc_f()
 
     def calc_f(self):
-        self.f = np.array([self.f_Start.value + i * (self.f_End.value - self.f_Start.value) / numPoints for i in
-                           range(numPoints)], dtype=np.float32)  # frequencies array, cm
-
-        eps = calcDEps_f_GaussPhonon(self.f, float32(self.deltaEps.value),
-                                     float32(self.f0.value),
-                                     float32(self.sigma2.value),
-                                     float32(self.gamma.value))
-
-        # eps = []
-        mu = []
-        for i in range(numPoints):
-            eps[i] += complex(self.epsInf1.value, self.epsInf2.value)
-            mu_i = complex(self.muInf1.value, 0)
-            for model in self.models:
-                if model.name == Model.OSCILLATOR:
-                    eps[i] += model.deltaEps.value * model.f0.value ** 2 / (
-                            model.f0.value ** 2 - self.f[i] ** 2 - complex(0, model.gamma.value * self.f[i]))
-                if model.name == Model.MAGNET_OSCILLATOR:
-                    f0 = model.f0.value
-                    mu_i += model.deltaMu.value * f0 ** 2 / (
-                            f0 ** 2 - self.f[i] ** 2 - complex(0, model.gamma.value * self.f[i]))
-            # eps.append(eps_i)
-            mu.append(mu_i)
-            # np.append(eps, eps_i)
-
-        self.tr_f = []
-        self.ph_f = []
-        self.r_f = []
-        self.rph_f = []
-        for i in range(numPoints):
-            # TrPh = self.calcTrPh(mu[i], eps[i], self.f[i])
-            # Tr = TrPh[0]
-            # fiTr = TrPh[1]
-            # self.tr_f.append(Tr)
-            # self.ph_f.append(fiTr / self.f[i])
-
-            TrRPh = self.calcTrRPh(mu[i], eps[i], self.f[i])
-            T = TrRPh[0]
-            fiT = TrRPh[1]
-            R = TrRPh[2]
-            fiR = TrRPh[3]
-            self.tr_f.append(T)
-            self.ph_f.append(fiT / self.f[i])
-            self.r_f.append(R)
-            self.rph_f.append(fiR)
+        if self.isStageChanged(Theory.F_SWEEP) or self.eps_f is None:
+            numPoints = self.gridPoints(self.numPoints)
+            floatType = self.floatType()
+            self.f = np.array([self.f_Start.value + i * (self.f_End.value - self.f_Start.value) / numPoints for i in
+                               range(numPoints)], dtype=floatType)  # frequencies array, cm
+
+            eps = kernelCache.call(calcDEps_f_GaussPhonon, self.f, floatType(self.deltaEps.value),
+                                   floatType(self.f0.value),
+                                   floatType(self.sigma2.value),
+                                   floatType(self.gamma.value),
+                                   int32(self.gridPoints(self.nF)))
+
+            modelTable = ModelTable(self.models, self.modelTypes)
+            self.eps_f = eps + modelTable.calcEps(self.f, 0, complex(self.epsInf1.value, self.epsInf2.value))
+            self.mu_f = modelTable.calcMu(self.f, 0, complex(self.muInf1.value, 0))
+
+        T, fiT, R, fiR = calcTrPh(self.mu_f, self.eps_f, self.f, self.d.value, minTr=1e-50)
+        self.tr_f = T
+        self.ph_f = fiT / self.f
+        self.r_f = R
+        self.rph_f = fiR
 
         self.updateCurvePoints(self.f, self.tr_f, DataTypes.Trf)
         self.updateCurvePoints(self.f, self.ph_f, DataTypes.Phf)
         self.updateCurvePoints(self.f, self.r_f, DataTypes.R_f)
         self.updateCurvePoints(self.f, self.rph_f, DataTypes.PhR_f)
 
-    def calcTrRPh(self, mu, eps, f):
-        nk = (mu * eps) ** 0.5
-        n = nk.real
-        k = nk.imag
-        ab = (mu / eps) ** 0.5
-        a = ab.real
-        b = ab.imag
-        A = 2 * PI * n * self.d.value * f  # w_Hz = w_cm-1 * LIGHT_SPEED
-        E = math.exp(-4 * PI * k * self.d.value * f)  # w_Hz = w_cm-1 * LIGHT_SPEED
-        R = ((a - 1) ** 2 + b ** 2) / ((a + 1) ** 2 + b ** 2)
-        fiR = math.atan((2 * b) / (a ** 2 + b ** 2 - 1))
-        T = E * ((1 - R) ** 2 + 4 * R * (math.sin(fiR)) ** 2) / (
-                (1 - R * E) ** 2 + 4 * R * E * (math.sin(A + fiR)) ** 2)
-        if T < 1e-50:  # value limitation for logarithmic scale use
-            T = 1e-50
-        fiT = A - math.atan(b * (a ** 2 + b ** 2 - 1) / ((a ** 2 + b ** 2) * (2 + a) + a)) + math.atan(
-            (R * E * math.sin(2 * A + 2 * fiR)) / (1 - R * E * math.cos(2 * A + 2 * fiR)))
-        return T, fiT, R, fiR
-
 
 LIGHT_SPEED = 2.998e10  # cm/s
 PI = math.pi
@@ -142,22 +109,27 @@ ro = 5.2
 numPoints = 1000
 oneSidePointsNum = 300
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
+@jit([float32(float32, float32), float64(float64, float64)], nopython=True, nogil=True, cache=True)
 def normal(x, sigma):
     return math.exp(- 0.5 * (x / sigma) ** 2) / math.sqrt(2 * PI) / sigma
 
 
-@vectorize([complex64(float32, float32, float32, float32, float32)], target='parallel')
-def calcDEps_f_GaussPhonon(f_i, deltaEps, f0, sigma2, gamma):
-    dFPos = 1.5 * 3 * sigma2 / (2 * oneSidePointsNum + 1)
+@vectorize([complex64(float32, float32, float32, float32, float32, int32),
+            complex128(float64, float64, float64, float64, float64, int32)], target='parallel', cache=True)
+def calcDEps_f_GaussPhonon(f_i, deltaEps, f0, sigma2, gamma, nF):
+    dFPos = 1.5 * 3 * sigma2 / (2 * nF + 1)
     # gammaLorentz = 4 * gamma / oneSidePointsNum
-    eps_i = 0
-    for iFPos in prange(-oneSidePointsNum, oneSidePointsNum):
+    eps_i = 0j
+    c = 0j  # Kahan correction of the sum
+    for iFPos in range(-nF, nF):
 
         dEpsPos = normal(iFPos * dFPos, sigma2 * 0.5) * deltaEps * dFPos
         f = f0 + iFPos * dFPos
 
         r = f ** 2 - f_i ** 2 - 1j * gamma * f_i
         if r != 0:
-            eps_i += (dEpsPos * f ** 2 / r)
+            y = dEpsPos * f ** 2 / r - c
+            t = eps_i + y
+            c = (t - eps_i) - y
+            eps_i = t
     return eps_i
@@ -1,12 +1,15 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from slabOptics import calcTrPh
+from modelResponse import ModelTable
 import numpy as np
 
 from numba import vectorize, cuda, jit, float32, float64, int8, uint8, int16, prange, njit, complex64
 from numba.types import UniTuple
+from numbaThreads import useThreadingLayer
+
+useThreadingLayer()
 
 
 class TheoryHoLGS_DistrAngle(Theory):
@@ -15,7 +18,7 @@ class TheoryHoLGS_DistrAngle(Theory):
     def __init__(self):
         Theory.__init__(self)
 
-        self.color = QColor(0x0000FF)
+        self.color = 0x0000FF
 
         ################### v PARAMETERS v ###################
         self.d = TheoryParameter(1.756 * 0.1, 'd', "cm")  # thickness
@@ -58,42 +61,17 @@ class TheoryHoLGS_DistrAngle(Theory):
 
     def calcData_H(self):
         H = np.array([self.H_Start.value + i * (self.H_End.value - self.H_Start.value) / numPoints for i in range(numPoints)], dtype=np.float32)
-        eps_H0 = 0
         f = self.fFix.value / 30
-        for model in self.models:
-            if model.name == Model.OSCILLATOR:
-                f0 = model.f0.value
-                eps_H0 += model.deltaEps.value * f0 ** 2 / (f0 ** 2 - f ** 2 - complex(0, model.gamma.value * f))
 
         mu = calcDmu_H_f(H, f, int8(self.axis_Hext.value), int8(self.axis_h.value))
 
-        self.tr_H = []
-        self.ph_H = []
-        epsH = complex(self.epsInf1.value, self.epsInf2.value) + eps_H0
-        for i in range(numPoints):
-            Tr, fiT = self.calcTrPh(mu[i], epsH, f)
-            self.tr_H.append(Tr)
-            self.ph_H.append(fiT / (2 * PI * f) * 10)  # mirror (optical depth), mm
+        epsH = ModelTable(self.models, self.modelTypes).calcEps(f, 0, complex(self.epsInf1.value, self.epsInf2.value))
+        Tr, fiT, R, fiR = calcTrPh(mu, epsH, f, self.d.value)
+        self.tr_H = Tr
+        self.ph_H = fiT / (2 * PI * f) * 10  # mirror (optical depth), mm
         self.updateCurvePoints(H, self.tr_H, DataTypes.SignalH)
         self.updateCurvePoints(H, self.ph_H, DataTypes.MirrorH)
 
-    def calcTrPh(self, mu, eps, f):
-        nk = (mu * eps) ** 0.5
-        n = nk.real
-        k = nk.imag
-        ab = (mu / eps) ** 0.5
-        a = ab.real
-        b = ab.imag
-        A = 2 * PI * n * self.d.value * f  # w_Hz = w_cm-1 * LIGHT_SPEED
-        E = np.exp(-4 * PI * k * self.d.value * f)  # w_Hz = w_cm-1 * LIGHT_SPEED
-        R = ((a - 1) ** 2 + b ** 2) / ((a + 1) ** 2 + b ** 2)
-        fiR = np.arctan((2 * b) / (a ** 2 + b ** 2 - 1))
-        T = E * ((1 - R) ** 2 + 4 * R * (np.sin(fiR)) ** 2) / (
-                (1 - R * E) ** 2 + 4 * R * E * (np.sin(A + fiR)) ** 2)
-        fiT = A - np.arctan(b * (a ** 2 + b ** 2 - 1) / ((a ** 2 + b ** 2) * (2 + a) + a)) + np.arctan(
-            (R * E * np.sin(2 * A + 2 * fiR)) / (1 - R * E * np.cos(2 * A + 2 * fiR)))
-        return T, fiT
-
 
 LIGHT_SPEED = 2.998e10  # cm/s
 PI = math.pi
@@ -133,12 +111,12 @@ nPos4PI = 4 * PI * ro / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi# * dDcf2
 # nPos = 1 / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi * dDcf2
 
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
+@jit(float32(float32, float32), nopython=True, nogil=True, cache=True)
 def normal(x, sigma):
     return math.exp(- 0.5 * (x / sigma) ** 2) / math.sqrt(2 * PI) / sigma
 
 
-@jit(float32(float32, float32, float32, float32), nopython=True, nogil=True)
+@jit(float32(float32, float32, float32, float32), nopython=True, nogil=True, cache=True)
 def normalX(x, sigma, mu, normFactor):
     # sigma = 1.5  # 1  # 0.8  # 1.5
     # maxPos = 2.01
@@ -147,7 +125,7 @@ def normalX(x, sigma, mu, normFactor):
     return normFactor * math.exp(- 0.5 * ((x - mu) / sigma) ** 2) * x
 
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
+@jit(float32(float32, float32), nopython=True, nogil=True, cache=True)
 def calcNormFactor(sigma, mu):
     p = math.sqrt(0.5 * PI) * mu / math.sqrt(1 / sigma ** 2) + \
         math.exp(-mu ** 2 / (2 * sigma ** 2)) * sigma ** 2 + \
@@ -160,12 +138,12 @@ def calcNormFactor(sigma, mu):
 #     return 2 * np.sqrt(_Dcf ** 2 + (1 / kcm * (vectHx * vectMx + vectHy * vectMy + vectHz * vectMz)) ** 2)
 
 
-@jit(float32(float32, float32, float32, float32, float32, float32, float32), nopython=True, nogil=True)
+@jit(float32(float32, float32, float32, float32, float32, float32, float32), nopython=True, nogil=True, cache=True)
 def getEPos(vectHx, vectHy, vectHz, vectMx, vectMy, vectMz, _Dcf):  # cm^-1
     return np.sqrt(_Dcf ** 2 + (1 / kcm * (vectHx * vectMx + vectHy * vectMy + vectHz * vectMz)) ** 2)
 
 
-@jit(UniTuple(float32, 3)(uint8, float32, float32), nopython=True, nogil=True)
+@jit(UniTuple(float32, 3)(uint8, float32, float32), nopython=True, nogil=True, cache=True)
 def getVectM(pos, deltaTeta, deltaFi):
     teta = tetaIon + deltaTeta
     if pos == 0:  # 1p
@@ -184,24 +162,24 @@ def getVectM(pos, deltaTeta, deltaFi):
     return mIon * math.cos(fi) * math.sin(teta), mIon * math.sin(fi) * math.sin(teta), mIon * math.cos(teta)
 
 
-@jit(float32(float32, float32, float32), nopython=True, nogil=True)
+@jit(float32(float32, float32, float32), nopython=True, nogil=True, cache=True)
 def getDMuPosE(EPos, m, _Dcf):
     dMuPos = nPos4PI * m ** 2 / (2 * EPos * kcm) * math.tanh(EPos * kcm / kB / T) * (_Dcf / EPos) ** 2
     return dMuPos
 
 
-@vectorize([complex64(float32, float32, int8, int8)], target='parallel')
+@vectorize([complex64(float32, float32, int8, int8)], target='parallel', cache=True)
 def calcDmu_H_f(H_i, f_i, axis_Hext, axis_h):
     # maxPos = 2 * Dcf0
     # mu = maxPos - sigmaDcf2 ** 2 / maxPos
     # normFactor = calcNormFactor(sigmaDcf2, mu)
 
     mu_i = 1
-    for iFi in prange(-oneSidePointsNum, oneSidePointsNum):
-        for iTeta in prange(-oneSidePointsNum, oneSidePointsNum):
+    for iFi in range(-oneSidePointsNum, oneSidePointsNum):
+        for iTeta in range(-oneSidePointsNum, oneSidePointsNum):
             # for iDcf in prange(-oneSidePointsNum, oneSidePointsNum):
             # for iDcf in prange(0, 2 * oneSidePointsNum):
-                for pos in prange(0, 5):
+                for pos in range(0, 5):
                     vectMx, vectMy, vectMz = getVectM(pos, float32(iTeta * dTeta), float32(iFi * dFi))
 
                     if axis_Hext == 1:  # H||a
@@ -1,24 +1,32 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from slabOptics import calcTrPh
+from modelResponse import ModelTable
+from kernelCache import kernelCache
+from langasiteSites import UNIFORM, GAUSS, QUADRATURES, callWithError, rayleighNodes, siteTable, foldNodes, axisIndex, sumDmu_H
 import numpy as np
 
-from numba import vectorize, cuda, jit, float32, float64, int8, uint8, int16, prange, njit, complex64, guvectorize
-from numba.types import UniTuple
+from numba import int8
 
 
 class TheoryHoLGS_DistrAngleDcf(Theory):
     name = "Ho LGS DistrAngleDcf"
 
     def __init__(self):
-        Theory.__init__(self)
+        Theory.__init__(self, numPoints)
 
-        self.color = QColor(0x0000FF)
+        self.color = 0x0000FF
+        self.nTeta = TheoryParameter(oneSidePointsNum, 'N<sub>θ</sub>', "", False)  # quadrature nodes on one side
+        self.nFi = TheoryParameter(oneSidePointsNum, 'N<sub>φ</sub>', "", False)
+        self.nDcf = TheoryParameter(oneSidePointsNum, 'N<sub>ΔCF</sub>', "", False)
+        self.quadrature = TheoryParameter(UNIFORM, 'Quadrature', "", False, choices=QUADRATURES)
+        self.resolution += [self.nTeta, self.nFi, self.nDcf, self.quadrature]
+        self.quadratureError = None  # estimated relative error of the last Gauss calculation
+        self.refinements = [4, 2, 1]  # quick preview passes before the full grid
 
         ################### v PARAMETERS v ###################
-        self.d = TheoryParameter(1.756 * 0.1, 'd', "cm")  # thickness
+        self.d = TheoryParameter(1.756 * 0.1, 'd', "cm", stages=[Theory.SLAB])  # thickness
         self.epsInf1 = TheoryParameter(14, '\u03B5\'<sub>\u221E</sub>', "")  # epsilon1 inf
         self.epsInf2 = TheoryParameter(0.0, '\u03B5\"<sub>\u221E</sub>', "")  # epsilon2 inf
         self.muInf1 = TheoryParameter(1, '\u03BC\'<sub>\u221E</sub>', "")  # mu1 inf
@@ -55,6 +63,8 @@ class TheoryHoLGS_DistrAngleDcf(Theory):
         ################### v PLOT VALUES v ###################
         self.H = None  # magnetic fields array, kOe
         self.tr_H = None  # transmittance
+        self.eps_H = None  # eps, mu of the field sweep, reused when only the slab stage changes
+        self.mu_H = None
         self.ph_H = None  # mirror (optical length), mm
         self.f_H_6m = [None for i in range(6)]
         self.dMu_H_6m = [None for i in range(6)]
@@ -71,45 +81,25 @@ class TheoryHoLGS_DistrAngleDcf(Theory):
         self.calcData_H()
 
     def calcData_H(self):
-        H = np.array([self.H_Start.value + i * (self.H_End.value - self.H_Start.value) / numPoints for i in range(numPoints)], dtype=np.float32)
-        eps_H0 = 0
         f = self.fFix.value / 30
-        for model in self.models:
-            if model.name == Model.OSCILLATOR:
-                f0 = model.f0.value
-                eps_H0 += model.deltaEps.value * f0 ** 2 / (f0 ** 2 - f ** 2 - complex(0, model.gamma.value * f))
-        mu = calcDmu_H_f(H, f,
-                         self.Temperature.value, self.cc.value,
-                         self.mIon.value * muB, self.tetaIon.value * PI / 180, self.fiIon.value * PI / 180, self.sigmaTeta.value * PI / 180, self.sigmaFi.value * PI / 180,
-                         self.deltaCFMaxPos.value, self.deltaCF2Sigma.value, self.gamma.value,
-                         int8(self.axis_Hext.value), int8(self.axis_h.value))
-
-        self.tr_H = []
-        self.ph_H = []
-        epsH = complex(self.epsInf1.value, self.epsInf2.value) + eps_H0
-        for i in range(numPoints):
-            Tr, fiT = self.calcTrPh(mu[i], epsH, f)
-            self.tr_H.append(Tr)
-            self.ph_H.append(fiT / (2 * PI * f) * 10)  # mirror (optical depth), mm
-        self.updateCurvePoints(H, self.tr_H, DataTypes.SignalH)
-        self.updateCurvePoints(H, self.ph_H, DataTypes.MirrorH)
-
-    def calcTrPh(self, mu, eps, f):
-        nk = (mu * eps) ** 0.5
-        n = nk.real
-        k = nk.imag
-        ab = (mu / eps) ** 0.5
-        a = ab.real
-        b = ab.imag
-        A = 2 * PI * n * self.d.value * f  # w_Hz = w_cm-1 * LIGHT_SPEED
-        E = np.exp(-4 * PI * k * self.d.value * f)  # w_Hz = w_cm-1 * LIGHT_SPEED
-        R = ((a - 1) ** 2 + b ** 2) / ((a + 1) ** 2 + b ** 2)
-        fiR = np.arctan((2 * b) / (a ** 2 + b ** 2 - 1))
-        T = E * ((1 - R) ** 2 + 4 * R * (np.sin(fiR)) ** 2) / (
-                (1 - R * E) ** 2 + 4 * R * E * (np.sin(A + fiR)) ** 2)
-        fiT = A - np.arctan(b * (a ** 2 + b ** 2 - 1) / ((a ** 2 + b ** 2) * (2 + a) + a)) + np.arctan(
-            (R * E * np.sin(2 * A + 2 * fiR)) / (1 - R * E * np.cos(2 * A + 2 * fiR)))
-        return T, fiT
+        if self.isStageChanged(Theory.H_SWEEP) or self.mu_H is None:
+            numPoints = self.gridPoints(self.numPoints)
+            self.H = np.array([self.H_Start.value + i * (self.H_End.value - self.H_Start.value) / numPoints for i in range(numPoints)], dtype=np.float64)
+            self.mu_H, self.quadratureError = callWithError(
+                calcDmu_H_f, (self.H, f,
+                              self.Temperature.value, self.cc.value,
+                              self.mIon.value * muB, self.tetaIon.value * PI / 180, self.fiIon.value * PI / 180, self.sigmaTeta.value * PI / 180, self.sigmaFi.value * PI / 180,
+                              self.deltaCFMaxPos.value, self.deltaCF2Sigma.value, self.gamma.value,
+                              int8(self.axis_Hext.value), int8(self.axis_h.value)),
+                (self.gridPoints(self.nTeta), self.gridPoints(self.nFi), self.gridPoints(self.nDcf)), int(self.quadrature.value),
+                self.refinement == 1 and self.quadrature.value == GAUSS)
+            self.eps_H = ModelTable(self.models, self.modelTypes).calcEps(f, 0, complex(self.epsInf1.value, self.epsInf2.value))
+
+        Tr, fiT, R, fiR = calcTrPh(self.mu_H, self.eps_H, f, self.d.value)
+        self.tr_H = Tr
+        self.ph_H = fiT / (2 * PI * f) * 10  # mirror (optical depth), mm
+        self.updateCurvePoints(self.H, self.tr_H, DataTypes.SignalH)
+        self.updateCurvePoints(self.H, self.ph_H, DataTypes.MirrorH)
 
 
 LIGHT_SPEED = 2.998e10  # cm/s
@@ -127,30 +117,20 @@ ro = 5.2
 numPoints = 30
 oneSidePointsNum = 20
 ############## PARAMS
-pi23 = 2 * PI / 3
 
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
-def normal(x, sigma):
-    return math.exp(- 0.5 * (x / sigma) ** 2) / math.sqrt(2 * PI) / sigma
-
-
-@jit(float32(float32, float32), nopython=True, nogil=True)
 def rayleigh(x, sigma):
-    return x * math.exp(-0.5 * (x / sigma) ** 2) / sigma ** 2
+    return x * np.exp(-0.5 * (x / sigma) ** 2) / sigma ** 2
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
-def malkin(x, sigma):
-    return sigma*x/((sigma**2+x**2)**(3/2))
 
+def malkin(x, sigma):
+    return sigma * x / ((sigma ** 2 + x ** 2) ** (3 / 2))
 
 
-@jit(float32(float32, float32, float32, float32), nopython=True, nogil=True)
 def normalX(x, sigma, mu, normFactor):  # x * normal(x)
-    return normFactor * math.exp(- 0.5 * ((x - mu) / sigma) ** 2) * x
+    return normFactor * np.exp(- 0.5 * ((x - mu) / sigma) ** 2) * x
 
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
 def calcNormFactor(sigma, mu):
     p = math.sqrt(0.5 * PI) * mu / math.sqrt(1 / sigma ** 2) + \
         math.exp(-mu ** 2 / (2 * sigma ** 2)) * sigma ** 2 + \
@@ -158,112 +138,34 @@ def calcNormFactor(sigma, mu):
     return 1 / p
 
 
-@jit(float32(float32, float32, float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getEPos(vectHx, vectHy, vectHz, vectMx, vectMy, vectMz, _Dcf):  # cm^-1
-    return np.sqrt(_Dcf ** 2 + (1 / kcm * (vectHx * vectMx + vectHy * vectMy + vectHz * vectMz)) ** 2)
-
-
-@jit(UniTuple(float32, 3)(uint8, float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getVectM(pos, deltaTeta, deltaFi, mIon, tetaIon, fiIon):
-    teta = tetaIon + deltaTeta
-    if pos == 0:  # 1p
-        fiPos = 0
-    elif pos == 1:  # 1m
-        fiPos = PI - 2 * fiIon
-    if pos == 2:  # 2p
-        fiPos = pi23
-    elif pos == 3:  # 2m
-        fiPos = PI - 2 * fiIon + pi23
-    if pos == 4:  # 3p
-        fiPos = - pi23
-    elif pos == 5:  # 3m
-        fiPos = PI - 2 * fiIon - pi23
-    fi = fiIon + fiPos + deltaFi
-    return mIon * math.cos(fi) * math.sin(teta), mIon * math.sin(fi) * math.sin(teta), mIon * math.cos(teta)
-
-
-@jit(float32(float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getDMuPosE(EPos, m, _Dcf, T, nPos4PI):
-    # th = math.tanh(EPos * kcm / kB / T)
-    # dMuPos = nPos4PI * m**2 * (th * (_Dcf/EPos)**2 / (EPos * kcm) + (1 - th**2) * (EPos**2 - _Dcf**2)/(EPos**2 * kB * T))
-    dMuPos = nPos4PI * m ** 2 / (EPos * kcm) * math.tanh(EPos * kcm / kB / T) * (_Dcf / EPos) ** 2
-    return dMuPos
-
-
-@guvectorize([
-    "void(float32[:], float32, "
-    "float32, float32, "
-    "float32, float32, float32, float32, float32, "
-    "float32, float32, float32, "
-    "int8, int8, "
-    "complex64[:])"],
-    "(n),(),(),(),(),(),(),(),(),(),(),(),(),()->(n)",
-    target='parallel')
-# @vectorize([complex64(float32, float32, int8, int8)], target='parallel')
+# mu(H) at the frequency f_i: the moments of the six sites over the teta, fi nodes are tabulated once per
+# ion parameters, the splittings 2 Dcf have a rayleigh distribution on 2 nDcf nodes
 def calcDmu_H_f(H, f_i,
                 Temperature, cc,
                 mIon, tetaIon, fiIon, sigmaTeta, sigmaFi,
                 deltaCFMaxPos, deltaCF2Sigma, gamma,
                 axis_Hext, axis_h,
-                mu):
+                nTeta, nFi, nDcf, quadrature):
 
     # maxPos = 2 * deltaCFMaxPos
     # normMu = maxPos - deltaCF2Sigma ** 2 / maxPos
     # normFactor = calcNormFactor(deltaCF2Sigma, normMu)
 
     MvHoLang = (138.90 * (1 - cc) + 164.93 * cc) * 3 + 69.72 * 5 + 28.08 + 16 * 14
-    dTeta = 3 * 2 * sigmaTeta / (2 * oneSidePointsNum + 1)
-    dFi = 3 * 2 * sigmaFi / (2 * oneSidePointsNum + 1)
-    dDcf2 = 7 / (2 * oneSidePointsNum)  # 12 normalX, 7 rayleigh, 25 malkin
-    nPos4PI = 4 * PI * ro / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi * dDcf2
-
-    mu[:] = [0 for i in range(len(H))]
-    for i in prange(len(H)):
-        H_i = H[i]
-        mu_i = 1
-        for iFi in prange(-oneSidePointsNum, oneSidePointsNum):
-            for iTeta in prange(-oneSidePointsNum, oneSidePointsNum):
-                for iDcf in prange(0, 2 * oneSidePointsNum):
-                    for pos in prange(6):
-                        vectMx, vectMy, vectMz = getVectM(pos, float32(iTeta * dTeta), float32(iFi * dFi), mIon, tetaIon, fiIon)
-
-                        if axis_Hext == 1:  # H||a
-                            Hx, Hy, Hz = H_i, 0, 0
-                        elif axis_Hext == 2:  # H||b
-                            Hx, Hy, Hz = 0, H_i, 0
-                        elif axis_Hext == 3:  # H||c
-                            Hx, Hy, Hz = 0, 0, H_i
-                        else:  # H||a
-                            Hx, Hy, Hz = H_i, 0, 0
-
-                        EPos = getEPos(Hx, Hy, Hz, vectMx, vectMy, vectMz, float32(iDcf * dDcf2 * 0.5))
-                        if EPos == 0:
-                            EPos = 0.00001
-                        f0 = 2 * EPos
-
-                        if axis_h == 1:  # h||a
-                            vectM = vectMx
-                        elif axis_h == 2:  # h||b
-                            vectM = vectMy
-                        elif axis_h == 3:  # h||c
-                            vectM = vectMz
-                        else:  # h||a
-                            vectM = vectMx
-
-                        dMu = getDMuPosE(EPos, vectM, iDcf * dDcf2 * 0.5, Temperature, nPos4PI) * \
-                                        normal(iTeta * dTeta, sigmaTeta) * \
-                                        normal(iFi * dFi, sigmaFi) * \
-                                        rayleigh(iDcf * dDcf2, deltaCF2Sigma)
-                                        # malkin(iDcf * dDcf2, deltaCF2Sigma)
-                                        # normalX(iDcf * dDcf2, deltaCF2Sigma, normMu, normFactor)
-
-                        r = f0 ** 2 - f_i ** 2 - 1j * gamma * f_i
-                        if r != 0:
-                            mu_i += (dMu * f0 ** 2 / r)
-            mu[i] = complex64(mu_i)
-
-
-
-
-
-
+    dDcf2 = 7 / (2 * nDcf)  # 12 normalX, 7 rayleigh, 25 malkin
+    nPos4PI = 4 * PI * ro / 6 * (3 * cc * NA / MvHoLang)
+
+    moments, weights = kernelCache.call(siteTable, mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, nTeta, nFi, 6, quadrature)
+    mH = moments[axisIndex(axis_Hext)]  # projections on the static field
+    mh = moments[axisIndex(axis_h)]  # projections on the ac field
+    mH2, nodeWeights = foldNodes(mH ** 2, nPos4PI * weights * mh ** 2)
+
+    if quadrature == GAUSS:
+        dcf2, dcfWeights = rayleighNodes(deltaCF2Sigma, 2 * nDcf)
+    else:
+        dcf2 = np.arange(2 * nDcf) * dDcf2
+        dcfWeights = rayleigh(dcf2, deltaCF2Sigma) * dDcf2
+        # malkin(dcf2, deltaCF2Sigma) * dDcf2
+        # normalX(dcf2, deltaCF2Sigma, normMu, normFactor) * dDcf2
+    mu = sumDmu_H(H.astype(np.float64), f_i, mH2, nodeWeights, dcf2 * 0.5, dcfWeights, Temperature, gamma)
+    return mu.astype(np.result_type(H.dtype, np.complex64))
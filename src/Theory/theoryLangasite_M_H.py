@@ -1,21 +1,24 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from kernelCache import kernelCache
+from langasiteSites import UNIFORM, GAUSS, QUADRATURES, callWithError, siteTable, foldNodes, sumM_H
 import numpy as np
 
-from numba import vectorize, guvectorize, cuda, jit, float32, float64, int8, uint8, int16, prange, njit, complex64
-from numba.types import UniTuple
-
 
 class TheoryLangasite_M_H(Theory):
     name = "Ho LGS M(H)"
 
     def __init__(self):
-        Theory.__init__(self)
+        Theory.__init__(self, numPoints)
 
-        self.color = QColor(0x0000FF)
+        self.color = 0x0000FF
+        self.nTeta = TheoryParameter(oneSidePointsNum, 'N<sub>θ</sub>', "", False)  # quadrature nodes on one side
+        self.nFi = TheoryParameter(oneSidePointsNum, 'N<sub>φ</sub>', "", False)
+        self.quadrature = TheoryParameter(UNIFORM, 'Quadrature', "", False, choices=QUADRATURES)
+        self.resolution += [self.nTeta, self.nFi, self.quadrature]
+        self.quadratureError = None  # estimated relative error of the last Gauss calculation
+        self.refinements = [4, 2, 1]  # quick preview passes before the full grid
 
         ################### v PARAMETERS v ###################
         self.Concentration = TheoryParameter(0.0445, "Concentration", "")
@@ -53,16 +56,19 @@ class TheoryLangasite_M_H(Theory):
         self.calcData_H()
 
     def calcData_H(self):
+        numPoints = self.gridPoints(self.numPoints)
         H = np.array(
             [self.H_Start.value + i * (self.H_End.value - self.H_Start.value) / numPoints for i in range(numPoints)],
-            dtype=np.float32)
-
-        Mx, My, Mz = calcM_H(H,
-                             self.Concentration.value, self.Temperature.value, self.mIon.value * muB,
-                             self.tetaIon.value * PI / 180, self.fiIon.value * PI / 180, self.sigmaTeta.value * PI / 180,
-                             self.sigmaFi.value * PI / 180, self.Dcf0.value, self.sigmaDcf2.value,
-                             self.hiVVc.value, self.hiVVab.value,
-                             )
+            dtype=np.float64)  # the kernels work in float64
+
+        (Mx, My, Mz), self.quadratureError = callWithError(
+            calcM_H, (H,
+                      self.Concentration.value, self.Temperature.value, self.mIon.value * muB,
+                      self.tetaIon.value * PI / 180, self.fiIon.value * PI / 180, self.sigmaTeta.value * PI / 180,
+                      self.sigmaFi.value * PI / 180, self.Dcf0.value, self.sigmaDcf2.value,
+                      self.hiVVc.value, self.hiVVab.value),
+            (self.gridPoints(self.nTeta), self.gridPoints(self.nFi)), int(self.quadrature.value),
+            self.refinement == 1 and self.quadrature.value == GAUSS)
         M_H = [Mx, My, Mz]
         for k in range(3):
             self.updateCurvePoints(H, M_H[k], DataTypes.M_H, "H axis " + str(k))
@@ -101,8 +107,8 @@ oneSidePointsNum = 20
 # hiVVab = 4.2E-6
 ############## PARAMS
 pi23 = 2 * PI / 3
-# dTeta = 3 * 2 * sigmaTeta / (2 * oneSidePointsNum + 1)
-# dFi = 3 * 2 * sigmaFi / (2 * oneSidePointsNum + 1)
+# dTeta = 3 * 2 * sigmaTeta / (2 * nTeta + 1)
+# dFi = 3 * 2 * sigmaFi / (2 * nFi + 1)
 # dDcf2 = 7 / (2 * oneSidePointsNum + 1)  # normalX
 
 
@@ -110,143 +116,21 @@ pi23 = 2 * PI / 3
 # nPos = 1 / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi * dDcf2
 
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
-def normal(x, sigma):
-    return math.exp(- 0.5 * (x / sigma) ** 2) / math.sqrt(2 * PI) / sigma
-
-
-@jit(float32(float32, float32, float32, float32), nopython=True, nogil=True)
-def normalX(x, sigma, mu, normFactor):
-    return normFactor * math.exp(- 0.5 * ((x - mu) / sigma) ** 2) * x
-
-
-@jit(float32(float32, float32), nopython=True, nogil=True)
-def calcNormFactor(sigma, mu):
-    p = math.sqrt(0.5 * PI) * mu / math.sqrt(1 / sigma ** 2) + \
-        math.exp(-mu ** 2 / (2 * sigma ** 2)) * sigma ** 2 + \
-        math.sqrt(0.5 * PI) * mu * sigma * math.erf(mu / (math.sqrt(2) * sigma))
-    return 1 / p
-
-
-@jit(float32(float32, float32, float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getEPos(vectHx, vectHy, vectHz, vectMx, vectMy, vectMz, _Dcf):  # cm^-1
-    return np.sqrt(_Dcf ** 2 + (1 / kcm * (vectHx * vectMx + vectHy * vectMy + vectHz * vectMz)) ** 2)
-
-
-@jit(UniTuple(float32, 3)(uint8, float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getVectM(pos, deltaTeta, deltaFi, tetaIon, fiIon, mIon):
-    teta = tetaIon + deltaTeta
-    if pos == 0:  # 1p
-        fiPos = 0
-    elif pos == 1:  # 1m
-        fiPos = PI - 2 * fiIon
-    if pos == 2:  # 2p
-        fiPos = pi23
-    elif pos == 3:  # 2m
-        fiPos = PI - 2 * fiIon + pi23
-    if pos == 4:  # 3p
-        fiPos = - pi23
-    elif pos == 5:  # 3m
-        fiPos = PI - 2 * fiIon - pi23
-    fi = fiIon + fiPos + deltaFi
-    return mIon * math.cos(fi) * math.sin(teta), mIon * math.sin(fi) * math.sin(teta), mIon * math.cos(teta)
-
-
-@guvectorize(["void(float32[:], float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32[:], float32[:], float32[:])"],
-             "(n),(),(),(),(),(),(),(),(),(),(),()->(n),(n),(n)",
-             target='parallel')
-# def calcM_H(H, Mx, My, Mz):
+# M(H) along x, y, z: the moments of the six sites over the teta, fi nodes are tabulated once per ion parameters,
+# the sums over the nodes depend on the squared projections only and equal ones are merged
 def calcM_H(H,
             cc, T, mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, Dcf0, sigmaDcf2, hiVVc, hiVVab,
-            Mx, My, Mz):
-    Mx[:] = [0 for i in range(len(H))]
-    My[:] = [0 for i in range(len(H))]
-    Mz[:] = [0 for i in range(len(H))]
-
-    dTeta = 3 * 2 * sigmaTeta / (2 * oneSidePointsNum + 1)
-    dFi = 3 * 2 * sigmaFi / (2 * oneSidePointsNum + 1)
-    MvHoLang = (138.90 * (1 - cc) + 164.93 * cc) * 3 + 69.72 * 5 + 28.08 + 16 * 14
-
-    # maxPos = 2 * Dcf0
-    # mu = maxPos - sigmaDcf2 ** 2 / maxPos
-    # normFactor = calcNormFactor(sigmaDcf2, mu)
-    # startDcf2Point = maxPos - 3 * sigmaDcf2
-    # if startDcf2Point < 0:
-    #     startDcf2Point = 0
-    # dDcf2 = (maxPos + 3 * sigmaDcf2 - startDcf2Point) / (2 * oneSidePointsNum + 1)  # normalX
-
-    nPos = 1 / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi# * dDcf2
-
-    for i in prange(len(H)):
-        for iFi in prange(-oneSidePointsNum, oneSidePointsNum):
-            for iTeta in prange(-oneSidePointsNum, oneSidePointsNum):
-                # for iDcf in prange(0, 2 * oneSidePointsNum + 1):
-                    for pos in prange(6):
-                        vectMx, vectMy, vectMz = getVectM(pos, float32(iTeta * dTeta), float32(iFi * dFi),
-                                                          tetaIon, fiIon, mIon)
-                        dFactor = normal(iTeta * dTeta, sigmaTeta) * normal(iFi * dFi, sigmaFi) #* normalX(iDcf * dDcf2, sigmaDcf2, mu, normFactor)
-
-                        # EPos = getEPos(H[i], 0, 0, vectMx, vectMy, vectMz, float32(iDcf * dDcf2 * 0.5))
-                        EPos = getEPos(H[i], 0, 0, vectMx, vectMy, vectMz, float32(Dcf0))
-                        if EPos == 0: EPos = 0.0000001
-                        Mx[i] += nPos * (vectMx ** 2 * H[i]) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                        # EPos = getEPos(0, H[i], 0, vectMx, vectMy, vectMz, float32(iDcf * dDcf2 * 0.5))
-                        EPos = getEPos(0, H[i], 0, vectMx, vectMy, vectMz, float32(Dcf0))
-                        if EPos == 0: EPos = 0.0000001
-                        My[i] += nPos * (vectMy ** 2 * H[i]) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                        # EPos = getEPos(0, 0, H[i], vectMx, vectMy, vectMz, float32(iDcf * dDcf2 * 0.5))
-                        EPos = getEPos(0, 0, H[i], vectMx, vectMy, vectMz, float32(Dcf0))
-                        if EPos == 0: EPos = 0.0000001
-                        Mz[i] += nPos * (vectMz ** 2 * H[i]) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-        Mx[i] += hiVVab * H[i]
-        My[i] += hiVVab * H[i]
-        Mz[i] += hiVVc * H[i]
-
-
-@guvectorize(["void(float32[:], float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32[:], float32[:], float32[:])"],
-             "(n),(),(),(),(),(),(),(),(),(),(),()->(n),(n),(n)",
-             target='parallel')
-# def calcM_H(H, Mx, My, Mz):
-def calcM_Angle(H,
-                cc, T, mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, Dcf0, sigmaDcf2, hiVVc, hiVVab,
-                Mxy, Myz, Mxz):
-    Mxy[:] = [0 for i in range(len(H))]
-    Myz[:] = [0 for i in range(len(H))]
-    Mxz[:] = [0 for i in range(len(H))]
-
-    dTeta = 3 * 2 * sigmaTeta / (2 * oneSidePointsNum + 1)
-    dFi = 3 * 2 * sigmaFi / (2 * oneSidePointsNum + 1)
+            nTeta, nFi, quadrature):
     MvHoLang = (138.90 * (1 - cc) + 164.93 * cc) * 3 + 69.72 * 5 + 28.08 + 16 * 14
-    nPos = 1 / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi# * dDcf2
-
-    # maxPos = 2 * Dcf0
-    # mu = maxPos - sigmaDcf2 ** 2 / maxPos
-    # normFactor = calcNormFactor(sigmaDcf2, mu)
-
-    for i in prange(len(H)):
-        for iFi in prange(-oneSidePointsNum, oneSidePointsNum):
-            for iTeta in prange(-oneSidePointsNum, oneSidePointsNum):
-                # for iDcf in prange(0, 2 * oneSidePointsNum):
-                    for pos in prange(6):
-                        vectMx, vectMy, vectMz = getVectM(pos, float32(iTeta * dTeta), float32(iFi * dFi),
-                                                          tetaIon, fiIon, mIon)
-                        dFactor = normal(iTeta * dTeta, sigmaTeta) * normal(iFi * dFi, sigmaFi) #* normalX(iDcf * dDcf2,
-                                                                                                          #sigmaDcf2, mu,
-                                                                                                          #normFactor)
-
-                        EPos = getEPos(H[i], 0, 0, vectMx, vectMy, vectMz, float32(Dcf0))
-                        if EPos == 0: EPos = 0.0000001
-                        Mxy[i] += nPos * (vectMx ** 2 * H[i]) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                        EPos = getEPos(0, H[i], 0, vectMx, vectMy, vectMz, float32(Dcf0))
-                        if EPos == 0: EPos = 0.0000001
-                        Myz[i] += nPos * (vectMy ** 2 * H[i]) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                        EPos = getEPos(0, 0, H[i], vectMx, vectMy, vectMz, float32(Dcf0))
-                        if EPos == 0: EPos = 0.0000001
-                        Mxz[i] += nPos * (vectMz ** 2 * H[i]) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-        Mxy[i] += hiVVab * H[i]
-        Myz[i] += hiVVab * H[i]
-        Mxz[i] += hiVVc * H[i]
+    nPos = 1 / 6 * (3 * cc * NA / MvHoLang)  # node steps are in the weights
+
+    moments, weights = kernelCache.call(siteTable, mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, nTeta, nFi, 6, quadrature)
+    dtype = H.dtype  # the results have the float type of the grid
+    H = H.astype(np.float64)
+    dcf = np.array([Dcf0], dtype=np.float64)
+    dcfWeights = np.ones(1)
+    M = []
+    for k, hiVV in enumerate([hiVVab, hiVVab, hiVVc]):
+        m2, nodeWeights = foldNodes(moments[k] ** 2, nPos * weights)
+        M.append((sumM_H(H, m2, nodeWeights, dcf, dcfWeights, T) + hiVV * H).astype(dtype))
+    return M[0], M[1], M[2]
@@ -1,21 +1,24 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from kernelCache import kernelCache
+from langasiteSites import UNIFORM, GAUSS, QUADRATURES, callWithError, siteTable, sumM_Angle
 import numpy as np
 
-from numba import vectorize, guvectorize, cuda, jit, float32, float64, int8, uint8, int16, prange, njit, complex64
-from numba.types import UniTuple
-
 
 class TheoryLangasite_M_teta(Theory):
     name = "Ho LGS M(teta)"
 
     def __init__(self):
-        Theory.__init__(self)
+        Theory.__init__(self, numPoints)
 
-        self.color = QColor(0x0000FF)
+        self.color = 0x0000FF
+        self.nTeta = TheoryParameter(oneSidePointsNum, 'N<sub>θ</sub>', "", False)  # quadrature nodes on one side
+        self.nFi = TheoryParameter(oneSidePointsNum, 'N<sub>φ</sub>', "", False)
+        self.quadrature = TheoryParameter(UNIFORM, 'Quadrature', "", False, choices=QUADRATURES)
+        self.resolution += [self.nTeta, self.nFi, self.quadrature]
+        self.quadratureError = None  # estimated relative error of the last Gauss calculation
+        self.refinements = [4, 2, 1]  # quick preview passes before the full grid
 
         ################### v PARAMETERS v ###################
         self.Concentration = TheoryParameter(0.0445, "Concentration", "")
@@ -49,9 +52,9 @@ class TheoryLangasite_M_teta(Theory):
 
         for k in range(3):
             self.curves.append(TheoryCurve(teta, self.M_teta[k], DataTypes.M_teta, "H rot " + str(k)))
-        self.curves[0].color = QColor(0xFF0000)
-        self.curves[1].color = QColor(0x00FF00)
-        self.curves[2].color = QColor(0x0000FF)
+        self.curves[0].color = 0xFF0000
+        self.curves[1].color = 0x00FF00
+        self.curves[2].color = 0x0000FF
 
         self.initParameters()
 
@@ -60,16 +63,19 @@ class TheoryLangasite_M_teta(Theory):
         self.calcData_H()
 
     def calcData_H(self):
-        teta = np.array([i * (180) / 180 for i in range(180)], dtype=np.float32)
-        Mxy, Myz, Mxz = calcM_Angle(teta,
-                                    self.Concentration.value, self.Temperature.value, self.mIon.value * muB,
-                                    self.tetaIon.value * PI / 180, self.fiIon.value * PI / 180,
-                                    self.sigmaTeta.value * PI / 180,
-                                    self.sigmaFi.value * PI / 180, self.Dcf0.value, self.sigmaDcf2.value,
-                                    self.hiVVc.value, self.hiVVab.value,
-                                    self.shiftXY.value, self.shiftYZ.value, self.shiftXZ.value,
-                                    self.H_Rot.value
-                                    )
+        numPoints = self.gridPoints(self.numPoints)
+        teta = np.array([i * 180 / numPoints for i in range(numPoints)], dtype=np.float64)  # the kernels work in float64
+        (Mxy, Myz, Mxz), self.quadratureError = callWithError(
+            calcM_Angle, (teta,
+                          self.Concentration.value, self.Temperature.value, self.mIon.value * muB,
+                          self.tetaIon.value * PI / 180, self.fiIon.value * PI / 180,
+                          self.sigmaTeta.value * PI / 180,
+                          self.sigmaFi.value * PI / 180, self.Dcf0.value, self.sigmaDcf2.value,
+                          self.hiVVc.value, self.hiVVab.value,
+                          self.shiftXY.value, self.shiftYZ.value, self.shiftXZ.value,
+                          self.H_Rot.value),
+            (self.gridPoints(self.nTeta), self.gridPoints(self.nFi)), int(self.quadrature.value),
+            self.refinement == 1 and self.quadrature.value == GAUSS)
         M_teta = [Myz, Mxz, Mxy]
         for k in range(3):
             self.updateCurvePoints(np.append(teta, 180 + teta), np.append(M_teta[k], M_teta[k]), DataTypes.M_teta,
@@ -88,7 +94,7 @@ ro = 5.2
 # Magnetization, frequencies and magnetic contributions for a distorted crystal: six sites
 
 ############## PARAMS
-numPoints = 26
+numPoints = 180  # field rotation angles over 180 deg
 oneSidePointsNum = 15
 
 # Hrot = 20000
@@ -111,8 +117,8 @@ oneSidePointsNum = 15
 # hiVVab = 4.2E-6
 ############## PARAMS
 pi23 = 2 * PI / 3
-# dTeta = 3 * 2 * sigmaTeta / (2 * oneSidePointsNum + 1)
-# dFi = 3 * 2 * sigmaFi / (2 * oneSidePointsNum + 1)
+# dTeta = 3 * 2 * sigmaTeta / (2 * nTeta + 1)
+# dFi = 3 * 2 * sigmaFi / (2 * nFi + 1)
 dDcf2 = 7 / (2 * oneSidePointsNum + 1)  # normalX
 
 
@@ -120,104 +126,25 @@ dDcf2 = 7 / (2 * oneSidePointsNum + 1)  # normalX
 # nPos = 1 / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi * dDcf2
 
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
-def normal(x, sigma):
-    return math.exp(- 0.5 * (x / sigma) ** 2) / math.sqrt(2 * PI) / sigma
-
-
-@jit(float32(float32, float32, float32, float32), nopython=True, nogil=True)
-def normalX(x, sigma, mu, normFactor):
-    return normFactor * math.exp(- 0.5 * ((x - mu) / sigma) ** 2) * x
-
-
-@jit(float32(float32, float32), nopython=True, nogil=True)
-def calcNormFactor(sigma, mu):
-    p = math.sqrt(0.5 * PI) * mu / math.sqrt(1 / sigma ** 2) + \
-        math.exp(-mu ** 2 / (2 * sigma ** 2)) * sigma ** 2 + \
-        math.sqrt(0.5 * PI) * mu * sigma * math.erf(mu / (math.sqrt(2) * sigma))
-    return 1 / p
-
-
-@jit(float32(float32, float32, float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getEPos(vectHx, vectHy, vectHz, vectMx, vectMy, vectMz, _Dcf):  # cm^-1
-    return np.sqrt(_Dcf ** 2 + (1 / kcm * (vectHx * vectMx + vectHy * vectMy + vectHz * vectMz)) ** 2)
-
-
-@jit(UniTuple(float32, 3)(uint8, float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getVectM(pos, deltaTeta, deltaFi, tetaIon, fiIon, mIon):
-    teta = tetaIon + deltaTeta
-    if pos == 0:  # 1p
-        fiPos = 0
-    elif pos == 1:  # 1m
-        fiPos = PI - 2 * fiIon
-    if pos == 2:  # 2p
-        fiPos = pi23
-    elif pos == 3:  # 2m
-        fiPos = PI - 2 * fiIon + pi23
-    if pos == 4:  # 3p
-        fiPos = - pi23
-    elif pos == 5:  # 3m
-        fiPos = PI - 2 * fiIon - pi23
-    fi = fiIon + fiPos + deltaFi
-    return mIon * math.cos(fi) * math.sin(teta), mIon * math.sin(fi) * math.sin(teta), mIon * math.cos(teta)
-
-
-@guvectorize([
-    "void(float32[:], float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32, float32[:], float32[:], float32[:])"],
-    "(n),(),(),(),(),(),(),(),(),(),(),(),(),(),(),()->(n),(n),(n)",
-    target='parallel')
-# def calcM_H(H, Mx, My, Mz):
+# M along the field Hrot rotated in the xy, yz and xz planes: the moments of the six sites over the teta, fi nodes
+# are tabulated once per ion parameters
 def calcM_Angle(alpha,
                 cc, T, mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, Dcf0, sigmaDcf2, hiVVc, hiVVab,
                 shiftXY, shiftYZ, shiftXZ,
                 Hrot,
-                Mxy, Myz, Mxz):
-    Mxy[:] = [0 for i in range(len(alpha))]
-    Myz[:] = [0 for i in range(len(alpha))]
-    Mxz[:] = [0 for i in range(len(alpha))]
-
-    dTeta = 3 * 2 * sigmaTeta / (2 * oneSidePointsNum + 1)
-    dFi = 3 * 2 * sigmaFi / (2 * oneSidePointsNum + 1)
+                nTeta, nFi, quadrature):
     MvHoLang = (138.90 * (1 - cc) + 164.93 * cc) * 3 + 69.72 * 5 + 28.08 + 16 * 14
-    nPos = 1 / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi #* dDcf2
-
-    # maxPos = 2 * Dcf0
-    # mu = maxPos - sigmaDcf2 ** 2 / maxPos
-    # normFactor = calcNormFactor(sigmaDcf2, mu)
-
-    for i in prange(len(alpha)):
-        for iFi in prange(-oneSidePointsNum, oneSidePointsNum):
-            for iTeta in prange(-oneSidePointsNum, oneSidePointsNum):
-                #for iDcf in prange(0, 2 * oneSidePointsNum):
-                for pos in prange(6):
-                    # if pos != 0 and pos != 1: continue
-                    vectMx, vectMy, vectMz = getVectM(pos, float32(iTeta * dTeta), float32(iFi * dFi),
-                                                      tetaIon, fiIon, mIon)
-                    dFactor = normal(iTeta * dTeta, sigmaTeta) * normal(iFi * dFi, sigmaFi) #* normalX(iDcf * dDcf2, sigmaDcf2, mu, normFactor)
-                    angle = PI * i / 180
-
-                    teta = angle + shiftXY * PI / 180
-                    EPos = getEPos(Hrot * math.sin(teta), Hrot * math.cos(teta), 0, vectMx, vectMy, vectMz,
-                                   #float32(iDcf * dDcf2 * 0.5))
-                                   float32(Dcf0))
-                    vectMH = vectMx * Hrot * math.sin(teta) + vectMy * Hrot * math.cos(teta)
-                    Mxy[i] += nPos * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                    teta = angle + shiftYZ * PI / 180
-                    EPos = getEPos(0, Hrot * math.sin(teta), Hrot * math.cos(teta), vectMx, vectMy, vectMz,
-                    # EPos = getEPos(0.1*Hrot * math.cos(teta), Hrot * math.sin(teta), 0.9*Hrot * math.cos(teta), vectMx, vectMy, vectMz,
-                                   # float32(iDcf * dDcf2 * 0.5))
-                                   float32(Dcf0))
-                    vectMH = vectMy * Hrot * math.sin(teta) + vectMz * Hrot * math.cos(teta)
-                    Myz[i] += nPos * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                    teta = angle + shiftXZ * PI / 180
-                    EPos = getEPos(Hrot * math.sin(teta), 0, Hrot * math.cos(teta), vectMx, vectMy, vectMz,
-                                   # float32(iDcf * dDcf2 * 0.5))
-                                   float32(Dcf0))
-                    vectMH = vectMx * Hrot * math.sin(teta) + vectMz * Hrot * math.cos(teta)
-                    Mxz[i] += nPos * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-        Mxy[i] += hiVVab * Hrot * math.cos(teta) ** 2 + hiVVab * Hrot * math.sin(teta) ** 2
-        Myz[i] += hiVVc * Hrot * math.cos(teta) ** 2 + hiVVab * Hrot * math.sin(teta) ** 2
-        Mxz[i] += hiVVc * Hrot * math.cos(teta) ** 2 + hiVVab * Hrot * math.sin(teta) ** 2
+    nPos = 1 / 6 * (3 * cc * NA / MvHoLang)  # node steps are in the weights
+
+    moments, weights = kernelCache.call(siteTable, mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, nTeta, nFi, 6, quadrature)
+    Mx, My, Mz = moments
+    angle = alpha.astype(np.float64) * PI / 180
+    Mxy = sumM_Angle(angle + shiftXY * PI / 180, Mx, My, nPos * weights, Hrot, Dcf0, T)
+    Myz = sumM_Angle(angle + shiftYZ * PI / 180, My, Mz, nPos * weights, Hrot, Dcf0, T)
+    Mxz = sumM_Angle(angle + shiftXZ * PI / 180, Mx, Mz, nPos * weights, Hrot, Dcf0, T)
+
+    teta = angle + shiftXZ * PI / 180  # the Van Vleck terms of all planes take the xz angle
+    Mxy += hiVVab * Hrot * np.cos(teta) ** 2 + hiVVab * Hrot * np.sin(teta) ** 2
+    Myz += hiVVc * Hrot * np.cos(teta) ** 2 + hiVVab * Hrot * np.sin(teta) ** 2
+    Mxz += hiVVc * Hrot * np.cos(teta) ** 2 + hiVVab * Hrot * np.sin(teta) ** 2
+    return Mxy.astype(alpha.dtype), Myz.astype(alpha.dtype), Mxz.astype(alpha.dtype)
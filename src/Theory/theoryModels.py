@@ -1,17 +1,30 @@
 import math
-from spectrumObject import SpectrumObject
-from numberLineEdit import NumberLineEdit
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor, QDoubleValidator, QValidator, QFont, QFontDatabase
-from PyQt5.QtCore import pyqtSignal, pyqtSlot, QObject, Qt
+import threading
+from functools import partial
+import numpy as np
 from dataTypes import DataTypes, FileTypes
 
 
-class Theory(QObject):
+# Theories, models and parameters hold only values and arrays and can be calculated and pickled without Qt.
+# The widgets of the parameters (parameterWidget) and the background updates (theoryTask) are bound by the GUI.
+
+
+class Theory:
+    # calculation stages a parameter can feed, see TheoryParameter.stages
+    F_SWEEP = "f sweep"  # eps, mu of the frequency sweep
+    H_SWEEP = "H sweep"  # eps, mu of the field sweep
+    SLAB = "slab"  # Tr, Ph of the slab from eps, mu
+
+    # precision of the numba kernels, the resolution setting "Precision" of the theories that have it
+    SINGLE = 0  # float32
+    DOUBLE = 1  # float64
+    MIXED = 2  # float32 preview passes, float64 full grid passes and fits
+    PRECISIONS = {SINGLE: "float32", DOUBLE: "float64", MIXED: "float32 previews"}
+
     def __init__(self, numPoints=1000):
-        super(QObject, self).__init__()
         self.text = None
-        self.numPoints = numPoints
+        self.numPoints = TheoryParameter(numPoints, 'N<sub>points</sub>', "", False)  # curve points
+        self.resolution = [self.numPoints]  # grid settings, integer valued
         self.curves = []
         # self.plotItems = []
         self.parameters = []
@@ -24,31 +37,124 @@ class Theory(QObject):
         self.models = []
         self.modelsList = None
 
+        self.generation = 0  # incremented on every parameter change, stale results are not plotted
+        self.task = None  # running background update
+        self.refinements = [1]  # grid coarsening factors of the background passes, coarse to fine
+        self.refinement = 1  # coarsening factor of the current pass
+        self.derivativeParameters = None  # parameters to differentiate the curves by in update(), see TheoryCurve
+        self.changedStages = None  # stages changed since the last background update, None - all
+        self.stages = None  # stages to recalculate in the current update, None - all
+        self.stagesLock = threading.Lock()
+
     def update(self):
         pass
 
-    def plotCurves(self):
-        for curve in self.curves:
+    # recalculate in background, only the result for the latest parameters is plotted
+    def requestUpdate(self, stages=None):
+        self.markChanged(stages)
+        self.generation += 1
+        if self.task is None:
+            self.startTask()
+
+    def markChanged(self, stages):
+        with self.stagesLock:
+            if stages is None or self.changedStages is None:
+                self.changedStages = None
+            else:
+                self.changedStages = self.changedStages | set(stages)
+
+    def takeChangedStages(self):
+        with self.stagesLock:
+            stages = self.changedStages
+            self.changedStages = set()
+        return stages
+
+    def isStageChanged(self, stage):
+        return self.stages is None or stage in self.stages
+
+    def startTask(self):
+        from theoryTask import TheoryTask  # Qt is imported by the GUI only
+        self.task = TheoryTask(self, self.generation)
+        self.task.setAutoDelete(False)
+        self.task.signals.calculated.connect(self.onTaskCalculated)
+        self.task.signals.finished.connect(self.onTaskFinished)
+        self.task.start()
+
+    def onTaskCalculated(self, generation, data):
+        if generation == self.generation:
+            self.plotCurves(data)
+
+    def onTaskFinished(self, generation):
+        self.task = None
+        if generation != self.generation:  # parameters changed while computing
+            self.startTask()
+
+    def plotCurves(self, data=None):
+        if data is None:
+            data = self.curvesData()
+        for curve, (x, y) in zip(self.curves, data):
             if curve.plotItem is not None:
-                curve.plotItem.setData(curve.x, curve.y)
+                curve.plotItem.setData(x, y)
+
+    def curvesData(self):
+        return [(curve.x, curve.y) for curve in self.curves]
+
+    # number of grid points of a resolution parameter for the current pass
+    def gridPoints(self, parameter):
+        return max(int(parameter.value) // self.refinement, 2)
+
+    # float type of the grids and the kernel results for the current pass, float32 without the precision setting
+    def floatType(self):
+        precision = getattr(self, "precision", None)
+        if precision is not None and (precision.value == Theory.DOUBLE or
+                                      precision.value == Theory.MIXED and self.refinement == 1):
+            return np.float64
+        return np.float32
+
+    def getResolution(self):  # by attribute name
+        return {key: value.value for key, value in vars(self).items() if
+                any(value is parameter for parameter in self.resolution)}
+
+    def setResolution(self, resolution):
+        for key, value in resolution.items():
+            parameter = getattr(self, key, None)
+            if any(parameter is p for p in self.resolution):
+                parameter.setValue(value)
 
     def initParameters(self):
-        for parameter in self.parameters:
-            parameter.numberEdit.signalUpdateNumber.connect(self.updateNumber)
+        for parameter in self.parameters + self.resolution:
+            parameter.listeners.append(partial(self.updateNumber, parameter))
 
-    @pyqtSlot(float)
-    def updateNumber(self, num):
-        if self.name == "Ho LGS DistrAngleDcf" or self.name == "Ho LGS M(teta)" or self.name == "Ho LGS M(H)":
-            pass
-        else:
-            self.update()
-        self.plotCurves()
+    def updateNumber(self, parameter, num):
+        self.requestUpdate(parameter.stages)
+
+    # True if update() calculates the curve derivatives by all these parameters
+    def supportsDerivatives(self, parameters):
+        return False
 
     def updateCurvePoints(self, x, y, dataType, comment=""):
         for curve in self.curves:
             if curve.dataType == dataType and curve.comment == comment:
                 curve.x = x
                 curve.y = y
+                curve.derivatives = None
+
+    def updateCurveDerivatives(self, derivatives, dataType, comment=""):
+        for curve in self.curves:
+            if curve.dataType == dataType and curve.comment == comment:
+                curve.derivatives = derivatives
+
+    # the GUI bindings are not pickled, a theory sent to a worker process has values, models and curves only
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ["listItem", "modelsList", "task", "stagesLock"]:
+            state[key] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.stagesLock = threading.Lock()
+        self.initParameters()
 
 
 # class TheoryTrPh_f(Theory):
@@ -266,7 +372,6 @@ class TheoryTest(Theory):
 
     def __init__(self):
         Theory.__init__(self)
-        self.listItem = QListWidgetItem(self.name)
 
         self.p1 = TheoryParameter(2, "Parameter 1", "cm<sup>-1</sup>")
         self.p2 = TheoryParameter(5, "Parameter 2", "units", False)
@@ -283,7 +388,7 @@ class TheoryTest(Theory):
     def update(self):
         self.x = []
         self.y = []
-        for i in range(self.numPoints):
+        for i in range(int(self.numPoints.value)):
             self.x.append(i)
             self.y.append(self.p1.value * math.sin(self.p2.value * self.x[i]))
         self.curves.append(TheoryCurve(self.x, self.y, DataTypes.Test))
@@ -350,37 +455,66 @@ class Model:
         f0 = 2 * math.sqrt(self.deltaCF.value ** 2 + (H * mu / kcm) ** 2)  # in cm-1
         return f0
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["listItem"] = None
+        return state
+
 
 class TheoryParameter:
-    def __init__(self, value, name, unit, isMain=True, multiplier=1):
+    def __init__(self, value, name, unit, isMain=True, multiplier=1, stages=None, choices=None):
+        self.choices = choices  # {value: text} of a setting with a few allowed values, None - any number
         self.value = value
         self.name = name
         self.unit = unit
         self.isMain = isMain
         self.multiplier = multiplier
+        self.stages = stages  # Theory stages recalculated on change, None - all
+        self.fitBounds = None  # (min, max) when the parameter is fitted, None - fixed
+        self.listeners = []  # called with the new value when it is edited in the widget
+        self.binding = None  # ParameterWidget, created when the GUI shows the parameter
+
+    def getBinding(self):
+        if self.binding is None:
+            from parameterWidget import ParameterWidget  # Qt is imported by the GUI only
+            self.binding = ParameterWidget(self)
+        return self.binding
+
+    @property
+    def widget(self):
+        return self.getBinding().widget
+
+    @property
+    def numberEdit(self):
+        return self.getBinding().numberEdit
+
+    # a choice is rounded to the nearest integer, a value out of the choices raises ValueError
+    def checkValue(self, value):
+        if self.choices is None:
+            return value
+        choice = int(round(value))
+        if choice not in self.choices:
+            raise ValueError(self.name + " must be one of " +
+                             ", ".join(str(key) + " " + text for key, text in self.choices.items()))
+        return choice
+
+    # value set by the program, shown in the widget if there is one
+    def setValue(self, value):
+        self.value = self.checkValue(value)
+        if self.binding is not None:
+            self.binding.resetValue(self.value)
 
-        w = QWidget()
-        hBoxLayout = QHBoxLayout(w)
-        hBoxLayout.setContentsMargins(0, 0, 0, 0)
-        label = QLabel(self.name + (", " if len(self.unit) > 0 else "") + self.unit)
-        # label.setText("<span style='font-size:18pt; font-weight:600; color:#aa0000;'>text1</span><span style='font-size:10pt; font-weight:600; color:#00aa00;'>text2</span>" )
-        label.setFont(QFont('Times new roman', 12))
-        label.setStyleSheet("color: #000000;" if self.isMain else "color: #888888;")
-        hBoxLayout.addWidget(label)
-        numberEdit = NumberLineEdit()
-        numberEdit.multiplier = self.multiplier
-        numberEdit.resetValue(self.value)
-        hBoxLayout.addWidget(numberEdit)
-        self.numberEdit = numberEdit
-        self.widget = w
-
-        # def updateNumber(num):
-        #     self.value = num
-        self.numberEdit.signalUpdateNumber.connect(self.updateNumber)
-
-    # @pyqtSlot(float)
     def updateNumber(self, num):
+        num = self.checkValue(num)
         self.value = num
+        for listener in self.listeners:
+            listener(num)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["listeners"] = []
+        state["binding"] = None
+        return state
 
 
 class TheoryCurve:
@@ -390,6 +524,12 @@ class TheoryCurve:
         self.y = y
         self.dataType = dataType
         self.comment = comment
+        self.derivatives = None  # dy by Theory.derivativeParameters, one row per parameter
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["plotItem"] = None
+        return state
 
 
 
@@ -1,10 +1,14 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from slabOptics import calcTrPh
+from modelResponse import ModelTable
+from kernelCache import kernelCache
 import numpy as np
-from numba import vectorize, cuda, jit, float32, float64, int8, uint8, int16, prange, njit, complex64
+from numba import vectorize, cuda, jit, float32, float64, int8, uint8, int16, int32, prange, njit, complex64, complex128
+from numbaThreads import useThreadingLayer
+
+useThreadingLayer()
 
 
 class TheoryPrLGS_TrPh_f(Theory):
@@ -22,13 +26,16 @@ class TheoryPrLGS_TrPh_f(Theory):
     Vcell = 3.347009702e-22  # cm3
 
     def __init__(self):
-        Theory.__init__(self)
+        Theory.__init__(self, numPoints)
+        self.nF = TheoryParameter(oneSidePointsNum, 'N<sub>ν</sub>', "", False)  # quadrature nodes
+        self.precision = TheoryParameter(Theory.MIXED, 'Precision', "", False,
+                                         choices=Theory.PRECISIONS)
+        self.resolution += [self.nF, self.precision]
 
-        self.color = QColor(0x0000FF)
-        self.listItem = QListWidgetItem(self.name)
+        self.color = 0x0000FF
 
         ################### v PARAMETERS v ###################
-        self.d = TheoryParameter(1.0 * 0.1, 'd', "cm")  # thickness
+        self.d = TheoryParameter(1.0 * 0.1, 'd', "cm", stages=[Theory.SLAB])  # thickness
         self.epsInf1 = TheoryParameter(14, '\u03B5\'<sub>\u221E</sub>', "")  # epsilon1 inf
         self.muInf1 = TheoryParameter(1, '\u03BC\'<sub>\u221E</sub>', "")  # mu1 inf
         self.Temperature = TheoryParameter(1.8, 'T', "K")
@@ -48,6 +55,8 @@ class TheoryPrLGS_TrPh_f(Theory):
 
         ################### v PLOT VALUES v ###################
         self.f = None  # frequencies array, cm
+        self.eps_f = None  # eps, mu of the frequency sweep, reused when only the slab stage changes
+        self.mu_f = None
         self.tr_f = None  # transmittance
         self.ph_f = None  # phase/frequency, rad/cm-1
         ################### ^ PLOT VALUES ^ ###################
@@ -61,52 +70,24 @@ class TheoryPrLGS_TrPh_f(Theory):
         self.calc_f()
 
     def calc_f(self):
-        self.f = np.array([self.f_Start.value + i * (self.f_End.value - self.f_Start.value) / numPoints for i in
-                           range(numPoints)], dtype=np.float32)
-        eps = []
-        # mu = []
-        mu = calcDMu_f_RayleighDistr(self.f,
-                                     float32(self.deltaMu.value),
-                                     float32(self.gamma.value),
-                                     float32(self.sigma.value))
-
-        for i in range(self.numPoints):
-            eps_i = complex(self.epsInf1.value, 0)
-            mu[i] += complex(self.muInf1.value, 0)
-            for model in self.models:
-                if model.name == Model.OSCILLATOR:
-                    eps_i += model.deltaEps.value * model.f0.value ** 2 / (
-                            model.f0.value ** 2 - self.f[i] ** 2 - complex(0, model.gamma.value * self.f[i]))
-            eps.append(eps_i)
-
-        self.tr_f = []
-        self.ph_f = []
-        for i in range(self.numPoints):
-            TrPh = self.calcTrPh(mu[i], eps[i], self.f[i])
-            T = TrPh[0]
-            fiT = TrPh[1]
-            self.tr_f.append(T)
-            self.ph_f.append(fiT / self.f[i])
+        if self.isStageChanged(Theory.F_SWEEP) or self.eps_f is None:
+            numPoints = self.gridPoints(self.numPoints)
+            floatType = self.floatType()
+            self.f = np.array([self.f_Start.value + i * (self.f_End.value - self.f_Start.value) / numPoints for i in
+                               range(numPoints)], dtype=floatType)
+            self.mu_f = kernelCache.call(calcDMu_f_RayleighDistr, self.f,
+                                         floatType(self.deltaMu.value),
+                                         floatType(self.gamma.value),
+                                         floatType(self.sigma.value),
+                                         int32(self.gridPoints(self.nF))) + complex(self.muInf1.value, 0)
+            self.eps_f = ModelTable(self.models, self.modelTypes).calcEps(self.f, 0, complex(self.epsInf1.value, 0))
+
+        T, fiT, R, fiR = calcTrPh(self.mu_f, self.eps_f, self.f, self.d.value)
+        self.tr_f = T
+        self.ph_f = fiT / self.f
         self.updateCurvePoints(self.f, self.tr_f, DataTypes.Trf)
         self.updateCurvePoints(self.f, self.ph_f, DataTypes.Phf)
 
-    def calcTrPh(self, mu, eps, f):
-        nk = (mu * eps) ** 0.5
-        n = nk.real
-        k = nk.imag
-        ab = (mu / eps) ** 0.5
-        a = ab.real
-        b = ab.imag
-        A = 2 * self.PI * n * self.d.value * f  # w_Hz = w_cm-1 * LIGHT_SPEED
-        E = math.exp(-4 * self.PI * k * self.d.value * f)  # w_Hz = w_cm-1 * LIGHT_SPEED
-        R = ((a - 1) ** 2 + b ** 2) / ((a + 1) ** 2 + b ** 2)
-        fiR = math.atan((2 * b) / (a ** 2 + b ** 2 - 1))
-        T = E * ((1 - R) ** 2 + 4 * R * (math.sin(fiR)) ** 2) / (
-                (1 - R * E) ** 2 + 4 * R * E * (math.sin(A + fiR)) ** 2)
-        fiT = A - math.atan(b * (a ** 2 + b ** 2 - 1) / ((a ** 2 + b ** 2) * (2 + a) + a)) + math.atan(
-            (R * E * math.sin(2 * A + 2 * fiR)) / (1 - R * E * math.cos(2 * A + 2 * fiR)))
-        return T, fiT
-
 
 LIGHT_SPEED = 2.998e10  # cm/s
 PI = math.pi
@@ -124,19 +105,24 @@ numPoints = 1000
 oneSidePointsNum = 300
 
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
+@jit([float32(float32, float32), float64(float64, float64)], nopython=True, nogil=True, cache=True)
 def rayleigh(x, sigma):
     return x * math.exp(-0.5 * (x / sigma) ** 2) / sigma ** 2
 
 
-@vectorize([complex64(float32, float32, float32, float32)], target='parallel')
-def calcDMu_f_RayleighDistr(f_i, deltaMu, gamma, sigma):
-    dFPos = 4 * sigma / (oneSidePointsNum + 1)
-    mu_i = 0
-    for iFPos in prange(oneSidePointsNum):
+@vectorize([complex64(float32, float32, float32, float32, int32),
+            complex128(float64, float64, float64, float64, int32)], target='parallel', cache=True)
+def calcDMu_f_RayleighDistr(f_i, deltaMu, gamma, sigma, nF):
+    dFPos = 4 * sigma / (nF + 1)
+    mu_i = 0j
+    c = 0j  # Kahan correction of the sum
+    for iFPos in range(nF):
         dMuPos = rayleigh(iFPos * dFPos, sigma) * deltaMu * dFPos
         f = iFPos * dFPos
         r = f ** 2 - f_i ** 2 - 1j * gamma * f_i
         if r != 0:
-            mu_i += (dMuPos * f ** 2 / r)
+            y = dMuPos * f ** 2 / r - c
+            t = mu_i + y
+            c = (t - mu_i) - y
+            mu_i = t
     return mu_i
@@ -0,0 +1,83 @@
+from PyQt5.QtCore import pyqtSignal, QObject, QRunnable, QThreadPool
+from theoryModels import Theory
+
+# Background calculation of the theories in the GUI, the results are passed to the GUI thread by signals.
+
+threadPool = None  # single worker: numba kernels are parallel themselves and are not reentrant
+
+
+def getThreadPool():
+    global threadPool
+    if threadPool is None:
+        threadPool = QThreadPool()
+        threadPool.setMaxThreadCount(1)
+    return threadPool
+
+
+class TheoryTaskSignals(QObject):
+    calculated = pyqtSignal(int, object)
+    finished = pyqtSignal(int)
+
+
+class TheoryTask(QRunnable):
+    # one background update of a theory, tagged with the parameters generation it was started for
+    def __init__(self, theory, generation):
+        super(TheoryTask, self).__init__()
+        self.theory = theory
+        self.generation = generation
+        self.signals = TheoryTaskSignals()
+
+    def run(self):
+        try:
+            stages = self.theory.takeChangedStages()
+            refinements = self.theory.refinements
+            if stages is not None and stages <= {Theory.SLAB}:
+                refinements = [1]  # kernel results are reused, no preview needed
+            if len(refinements) > 1:
+                stages = None  # grids differ between the passes
+            self.theory.stages = stages
+            for refinement in refinements:
+                self.theory.refinement = refinement
+                self.theory.update()
+                self.signals.calculated.emit(self.generation, self.theory.curvesData())
+                if self.theory.generation != self.generation:
+                    if refinement != 1:
+                        self.theory.markChanged(None)  # stored stage results are on a coarse grid
+                    break  # parameters changed, finer passes are not needed
+        finally:
+            self.theory.refinement = 1
+            self.theory.stages = None
+            self.signals.finished.emit(self.generation)
+
+    def start(self):
+        getThreadPool().start(self)
+
+
+class FitTaskSignals(QObject):
+    progress = pyqtSignal(object, float, object)
+    finished = pyqtSignal(object, str)
+
+
+class FitTask(QRunnable):
+    # runs in the theory update pool, so the fit and the background updates never calculate the theory together
+    def __init__(self, fit, maxEvaluations=None):
+        super(FitTask, self).__init__()
+        self.fit = fit
+        self.maxEvaluations = maxEvaluations
+        self.signals = FitTaskSignals()
+        self.fit.progress = self.signals.progress.emit
+
+    def run(self):
+        result = None
+        message = ""
+        try:
+            result = self.fit.run(self.maxEvaluations)
+            message = "stopped" if result is None else result.message
+        except Exception as e:
+            message = "fit error: " + str(e)
+        finally:
+            self.signals.finished.emit(result, message)
+
+    def start(self):
+        self.setAutoDelete(False)
+        getThreadPool().start(self)
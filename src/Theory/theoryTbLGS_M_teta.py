@@ -1,21 +1,24 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from kernelCache import kernelCache
+from langasiteSites import UNIFORM, GAUSS, QUADRATURES, callWithError, siteTable, sumM_Angle
 import numpy as np
 
-from numba import vectorize, guvectorize, cuda, jit, float32, float64, int8, uint8, int16, prange, njit, complex64
-from numba.types import UniTuple
-
 
 class TheoryTbLGS_M_teta(Theory):
     name = "Tb LGS M(teta)"
 
     def __init__(self):
-        Theory.__init__(self)
+        Theory.__init__(self, numPoints)
 
-        self.color = QColor(0x0000FF)
+        self.color = 0x0000FF
+        self.nTeta = TheoryParameter(oneSidePointsNum, 'N<sub>θ</sub>', "", False)  # quadrature nodes on one side
+        self.nFi = TheoryParameter(oneSidePointsNum, 'N<sub>φ</sub>', "", False)
+        self.quadrature = TheoryParameter(UNIFORM, 'Quadrature', "", False, choices=QUADRATURES)
+        self.resolution += [self.nTeta, self.nFi, self.quadrature]
+        self.quadratureError = None  # estimated relative error of the last Gauss calculation
+        self.refinements = [4, 2, 1]  # quick preview passes before the full grid
 
         ################### v PARAMETERS v ###################
         self.Temperature = TheoryParameter(1.9, "Temperature", "K")
@@ -61,9 +64,9 @@ class TheoryTbLGS_M_teta(Theory):
 
         for k in range(3):
             self.curves.append(TheoryCurve(teta, self.M_teta[k], DataTypes.M_teta, "H rot " + str(k)))
-        self.curves[0].color = QColor(0xFF0000)
-        self.curves[1].color = QColor(0x00FF00)
-        self.curves[2].color = QColor(0x0000FF)
+        self.curves[0].color = 0xFF0000
+        self.curves[1].color = 0x00FF00
+        self.curves[2].color = 0x0000FF
 
         self.initParameters()
 
@@ -72,22 +75,25 @@ class TheoryTbLGS_M_teta(Theory):
         self.calcData_H()
 
     def calcData_H(self):
-        teta = np.array([i * (180) / 180 for i in range(180)], dtype=np.float32)
-        Mxy, Myz, Mxz = calcM_Angle(teta,
-                                    self.Temperature.value,
-
-                                    self.Concentration1.value, self.mIon1.value * muB,
-                                    self.tetaIon1.value * PI / 180, self.fiIon1.value * PI / 180,
-                                    self.sigmaTeta1.value * PI / 180, self.sigmaFi1.value * PI / 180, self.Dcf01.value,
-
-                                    self.Concentration2.value, self.mIon2.value * muB,
-                                    self.tetaIon2.value * PI / 180, self.fiIon2.value * PI / 180,
-                                    self.sigmaTeta2.value * PI / 180, self.sigmaFi2.value * PI / 180, self.Dcf02.value,
-
-                                    self.hiVVc.value, self.hiVVab.value,
-                                    self.shiftXY.value, self.shiftYZ.value, self.shiftXZ.value,
-                                    self.H_Rot.value
-                                    )
+        numPoints = self.gridPoints(self.numPoints)
+        teta = np.array([i * 180 / numPoints for i in range(numPoints)], dtype=np.float64)  # the kernels work in float64
+        (Mxy, Myz, Mxz), self.quadratureError = callWithError(
+            calcM_Angle, (teta,
+                          self.Temperature.value,
+
+                          self.Concentration1.value, self.mIon1.value * muB,
+                          self.tetaIon1.value * PI / 180, self.fiIon1.value * PI / 180,
+                          self.sigmaTeta1.value * PI / 180, self.sigmaFi1.value * PI / 180, self.Dcf01.value,
+
+                          self.Concentration2.value, self.mIon2.value * muB,
+                          self.tetaIon2.value * PI / 180, self.fiIon2.value * PI / 180,
+                          self.sigmaTeta2.value * PI / 180, self.sigmaFi2.value * PI / 180, self.Dcf02.value,
+
+                          self.hiVVc.value, self.hiVVab.value,
+                          self.shiftXY.value, self.shiftYZ.value, self.shiftXZ.value,
+                          self.H_Rot.value),
+            (self.gridPoints(self.nTeta), self.gridPoints(self.nFi)), int(self.quadrature.value),
+            self.refinement == 1 and self.quadrature.value == GAUSS)
         M_teta = [Myz, Mxz, Mxy]
         for k in range(3):
             self.updateCurvePoints(np.append(teta, 180 + teta), np.append(M_teta[k], M_teta[k]), DataTypes.M_teta,
@@ -106,7 +112,7 @@ ro = 5.2
 # Magnetization, frequencies and magnetic contributions for a distorted crystal: six sites
 
 ############## PARAMS
-numPoints = 30
+numPoints = 180  # field rotation angles over 180 deg
 oneSidePointsNum = 10
 
 # Hrot = 20000
@@ -129,8 +135,8 @@ oneSidePointsNum = 10
 # hiVVab = 4.2E-6
 ############## PARAMS
 pi23 = 2 * PI / 3
-# dTeta = 3 * 2 * sigmaTeta / (2 * oneSidePointsNum + 1)
-# dFi = 3 * 2 * sigmaFi / (2 * oneSidePointsNum + 1)
+# dTeta = 3 * 2 * sigmaTeta / (2 * nTeta + 1)
+# dFi = 3 * 2 * sigmaFi / (2 * nFi + 1)
 # dDcf2 = 7 / (2 * oneSidePointsNum + 1)  # normalX
 
 
@@ -138,67 +144,8 @@ pi23 = 2 * PI / 3
 # nPos = 1 / 6 * (3 * cc * NA / MvHoLang) * dTeta * dFi * dDcf2
 
 
-@jit(float32(float32, float32), nopython=True, nogil=True)
-def normal(x, sigma):
-    return math.exp(- 0.5 * (x / sigma) ** 2) / math.sqrt(2 * PI) / sigma
-
-
-@jit(float32(float32, float32, float32, float32), nopython=True, nogil=True)
-def normalX(x, sigma, mu, normFactor):
-    return normFactor * math.exp(- 0.5 * ((x - mu) / sigma) ** 2) * x
-
-
-@jit(float32(float32, float32), nopython=True, nogil=True)
-def calcNormFactor(sigma, mu):
-    p = math.sqrt(0.5 * PI) * mu / math.sqrt(1 / sigma ** 2) + \
-        math.exp(-mu ** 2 / (2 * sigma ** 2)) * sigma ** 2 + \
-        math.sqrt(0.5 * PI) * mu * sigma * math.erf(mu / (math.sqrt(2) * sigma))
-    return 1 / p
-
-
-@jit(float32(float32, float32, float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getEPos(vectHx, vectHy, vectHz, vectMx, vectMy, vectMz, _Dcf):  # cm^-1
-    return np.sqrt(_Dcf ** 2 + (1 / kcm * (vectHx * vectMx + vectHy * vectMy + vectHz * vectMz)) ** 2)
-
-
-@jit(UniTuple(float32, 3)(uint8, float32, float32, float32, float32, float32), nopython=True, nogil=True)
-def getVectM(pos, deltaTeta, deltaFi, tetaIon, fiIon, mIon):
-    teta = tetaIon + deltaTeta
-    if pos == 0:  # 1p
-        fiPos = 0
-    elif pos == 1:  # 1m
-        fiPos = PI - 2 * fiIon
-    if pos == 2:  # 2p
-        fiPos = pi23
-    elif pos == 3:  # 2m
-        fiPos = PI - 2 * fiIon + pi23
-    if pos == 4:  # 3p
-        fiPos = - pi23
-    elif pos == 5:  # 3m
-        fiPos = PI - 2 * fiIon - pi23
-    fi = fiIon + fiPos + deltaFi
-    return mIon * math.cos(fi) * math.sin(teta), mIon * math.sin(fi) * math.sin(teta), mIon * math.cos(teta)
-
-
-@guvectorize([
-    "void(float32[:], "
-    "float32, "
-    "float32, float32, float32, float32, float32, float32, float32, "
-    "float32, float32, float32, float32, float32, float32, float32, "
-    "float32, float32, "
-    "float32, float32, float32, "
-    "float32, "
-    "float32[:], float32[:], float32[:])"],
-
-    "(n),"
-    "(),"
-    "(),(),(),(),(),(),(),"
-    "(),(),(),(),(),(),(),"
-    "(),(),"
-    "(),(),(),"
-    "()->(n),(n),(n)",
-    target='parallel')
-# def calcM_H(H, Mx, My, Mz):
+# M along the field Hrot rotated in the xy, yz and xz planes for two ion positions: the moments of the six sites
+# over the teta, fi nodes are tabulated once per ion parameters
 def calcM_Angle(alpha,
                 T,
                 cc1, mIon1, tetaIon1, fiIon1, sigmaTeta1, sigmaFi1, Dcf01,
@@ -206,72 +153,24 @@ def calcM_Angle(alpha,
                 hiVVc, hiVVab,
                 shiftXY, shiftYZ, shiftXZ,
                 Hrot,
-                Mxy, Myz, Mxz):
-    Mxy[:] = [0 for i in range(len(alpha))]
-    Myz[:] = [0 for i in range(len(alpha))]
-    Mxz[:] = [0 for i in range(len(alpha))]
-
+                nTeta, nFi, quadrature):
     MvHoLang = (138.90 * (1 - cc1 - cc2) + 164.93 * (cc1 + cc2)) * 3 + 69.72 * 5 + 28.08 + 16 * 14
-
-    dTeta1 = 3 * 2 * sigmaTeta1 / (2 * oneSidePointsNum + 1)
-    dFi1 = 3 * 2 * sigmaFi1 / (2 * oneSidePointsNum + 1)
-    nPos1 = 1 / 6 * (3 * cc1 * NA / MvHoLang) * dTeta1 * dFi1
-
-    dTeta2 = 3 * 2 * sigmaTeta2 / (2 * oneSidePointsNum + 1)
-    dFi2 = 3 * 2 * sigmaFi2 / (2 * oneSidePointsNum + 1)
-    nPos2 = 1 / 6 * (3 * cc2 * NA / MvHoLang) * dTeta2 * dFi2
-
-    # maxPos = 2 * Dcf0
-    # mu = maxPos - sigmaDcf2 ** 2 / maxPos
-    # normFactor = calcNormFactor(sigmaDcf2, mu)
-
-    for i in prange(len(alpha)):
-        for iFi in prange(-oneSidePointsNum, oneSidePointsNum):
-            for iTeta in prange(-oneSidePointsNum, oneSidePointsNum):
-                for pos in prange(6):
-                    # if pos != 0 and pos != 1: continue
-                    vectMx, vectMy, vectMz = getVectM(pos, float32(iTeta * dTeta1), float32(iFi * dFi1),
-                                                      tetaIon1, fiIon1, mIon1)
-                    dFactor = normal(iTeta * dTeta1, sigmaTeta1) * normal(iFi * dFi1, sigmaFi1)
-                    angle = PI * i / 180
-
-                    teta = angle + shiftXY * PI / 180
-                    EPos = getEPos(Hrot * math.sin(teta), Hrot * math.cos(teta), 0, vectMx, vectMy, vectMz, Dcf01)
-                    vectMH = vectMx * Hrot * math.sin(teta) + vectMy * Hrot * math.cos(teta)
-                    Mxy[i] += nPos1 * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                    teta = angle + shiftYZ * PI / 180
-                    EPos = getEPos(0, Hrot * math.sin(teta), Hrot * math.cos(teta), vectMx, vectMy, vectMz, Dcf01)
-                    vectMH = vectMy * Hrot * math.sin(teta) + vectMz * Hrot * math.cos(teta)
-                    Myz[i] += nPos1 * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                    teta = angle + shiftXZ * PI / 180
-                    EPos = getEPos(Hrot * math.sin(teta), 0, Hrot * math.cos(teta), vectMx, vectMy, vectMz, Dcf01)
-                    vectMH = vectMx * Hrot * math.sin(teta) + vectMz * Hrot * math.cos(teta)
-                    Mxz[i] += nPos1 * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                for pos in prange(6):
-                    # if pos != 0 and pos != 1: continue
-                    vectMx, vectMy, vectMz = getVectM(pos, float32(iTeta * dTeta2), float32(iFi * dFi2),
-                                                      tetaIon2, fiIon2, mIon2)
-                    dFactor = normal(iTeta * dTeta2, sigmaTeta2) * normal(iFi * dFi2, sigmaFi2)
-                    angle = PI * i / 180
-
-                    teta = angle + shiftXY * PI / 180
-                    EPos = getEPos(Hrot * math.sin(teta), Hrot * math.cos(teta), 0, vectMx, vectMy, vectMz, Dcf02)
-                    vectMH = vectMx * Hrot * math.sin(teta) + vectMy * Hrot * math.cos(teta)
-                    Mxy[i] += nPos2 * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                    teta = angle + shiftYZ * PI / 180
-                    EPos = getEPos(0, Hrot * math.sin(teta), Hrot * math.cos(teta), vectMx, vectMy, vectMz, Dcf02)
-                    vectMH = vectMy * Hrot * math.sin(teta) + vectMz * Hrot * math.cos(teta)
-                    Myz[i] += nPos2 * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-                    teta = angle + shiftXZ * PI / 180
-                    EPos = getEPos(Hrot * math.sin(teta), 0, Hrot * math.cos(teta), vectMx, vectMy, vectMz, Dcf02)
-                    vectMH = vectMx * Hrot * math.sin(teta) + vectMz * Hrot * math.cos(teta)
-                    Mxz[i] += nPos2 * (vectMH ** 2 / Hrot) * math.tanh(EPos * kcm / kB / T) / (EPos * kcm) * dFactor
-
-        Mxy[i] += hiVVab * Hrot * math.cos(teta) ** 2 + hiVVab * Hrot * math.sin(teta) ** 2
-        Myz[i] += hiVVc * Hrot * math.cos(teta) ** 2 + hiVVab * Hrot * math.sin(teta) ** 2
-        Mxz[i] += hiVVc * Hrot * math.cos(teta) ** 2 + hiVVab * Hrot * math.sin(teta) ** 2
+    angle = alpha.astype(np.float64) * PI / 180
+    Mxy = np.zeros(len(angle))
+    Myz = np.zeros(len(angle))
+    Mxz = np.zeros(len(angle))
+    for cc, mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, Dcf0 in [
+            (cc1, mIon1, tetaIon1, fiIon1, sigmaTeta1, sigmaFi1, Dcf01),
+            (cc2, mIon2, tetaIon2, fiIon2, sigmaTeta2, sigmaFi2, Dcf02)]:
+        nPos = 1 / 6 * (3 * cc * NA / MvHoLang)  # node steps are in the weights
+        moments, weights = kernelCache.call(siteTable, mIon, tetaIon, fiIon, sigmaTeta, sigmaFi, nTeta, nFi, 6, quadrature)
+        Mx, My, Mz = moments
+        Mxy += sumM_Angle(angle + shiftXY * PI / 180, Mx, My, nPos * weights, Hrot, Dcf0, T)
+        Myz += sumM_Angle(angle + shiftYZ * PI / 180, My, Mz, nPos * weights, Hrot, Dcf0, T)
+        Mxz += sumM_Angle(angle + shiftXZ * PI / 180, Mx, Mz, nPos * weights, Hrot, Dcf0, T)
+
+    teta = angle + shiftXZ * PI / 180  # the Van Vleck terms of all planes take the xz angle
+    Mxy += hiVVab * Hrot * np.cos(teta) ** 2 + hiVVab * Hrot * np.sin(teta) ** 2
+    Myz += hiVVc * Hrot * np.cos(teta) ** 2 + hiVVab * Hrot * np.sin(teta) ** 2
+    Mxz += hiVVc * Hrot * np.cos(teta) ** 2 + hiVVab * Hrot * np.sin(teta) ** 2
+    return Mxy.astype(alpha.dtype), Myz.astype(alpha.dtype), Mxz.astype(alpha.dtype)
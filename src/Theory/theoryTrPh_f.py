@@ -1,8 +1,8 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
-from PyQt5.QtGui import QColor
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from slabOptics import calcTrPh, calcTrPhDerivatives
+from modelResponse import ModelTable
 import numpy as np
 import time
 from numba import vectorize, cuda, jit, float32, float64, int8, int16, prange
@@ -15,9 +15,8 @@ class TheoryTrPh_f(Theory):
 
     def __init__(self):
         Theory.__init__(self)
-        self.listItem = QListWidgetItem(self.name)
 
-        self.d = TheoryParameter(1.756 * 0.1, 'd', "cm")  # thickness
+        self.d = TheoryParameter(1.756 * 0.1, 'd', "cm", stages=[Theory.SLAB])  # thickness
         self.epsInf1 = TheoryParameter(14, '\u03B5\'<sub>\u221E</sub>', "")  # epsilon1 inf
         self.epsInf2 = TheoryParameter(0.05, '\u03B5\"<sub>\u221E</sub>', "")  # epsilon2 inf
         self.muInf1 = TheoryParameter(1, '\u03BC\'<sub>\u221E</sub>', "")  # mu1 inf
@@ -30,6 +29,8 @@ class TheoryTrPh_f(Theory):
         self.modelTypes = [Model.OSCILLATOR, Model.MAGNET_OSCILLATOR, Model.RELAXATOR, Model.DRUDE]
 
         self.f = None  # frequencies array, cm
+        self.eps_f = None  # eps, mu of the frequency sweep, reused when only the slab stage changes
+        self.mu_f = None
         self.tr_f = None  # transmittance
         self.ph_f = None  # phase/frequency, rad/cm-1
 
@@ -41,60 +42,39 @@ class TheoryTrPh_f(Theory):
     def update(self):
         self.calc_f()
 
+    def supportsDerivatives(self, parameters):
+        modelTable = ModelTable(self.models, self.modelTypes)
+        slabParameters = [self.d, self.epsInf1, self.epsInf2, self.muInf1]
+        return all(any(p is q for q in slabParameters) or modelTable.hasDerivative(p) for p in parameters)
+
+    # derivatives of eps, mu and d by derivativeParameters
+    def slabDerivatives(self, modelTable, f, H):
+        dEps, dMu = modelTable.calcDerivatives(f, H, self.derivativeParameters,
+                                               {self.epsInf1: 1, self.epsInf2: 1j}, {self.muInf1: 1})
+        dD = [float(p is self.d) for p in self.derivativeParameters]
+        return dEps, dMu, dD
+
     def calc_f(self):
-        self.f = [self.f_Start.value + i * (self.f_End.value - self.f_Start.value) / self.numPoints for i in
-                  range(self.numPoints)]  # frequencies array, cm
-        eps = []
-        mu = []
-        for i in range(self.numPoints):
-            eps_i = complex(self.epsInf1.value, self.epsInf2.value)
-            mu_i = complex(self.muInf1.value, 0)
-            for model in self.models:
-                if model.name == Model.OSCILLATOR:
-                    eps_i += model.deltaEps.value * model.f0.value ** 2 / (
-                            model.f0.value ** 2 - self.f[i] ** 2 - complex(0, model.gamma.value * self.f[i]))
-                if model.name == Model.MAGNET_OSCILLATOR:
-                    f0 = model.f0.value
-                    mu_i += model.deltaMu.value * f0 ** 2 / (
-                            f0 ** 2 - self.f[i] ** 2 - complex(0, model.gamma.value * self.f[i]))
-                if model.name == Model.RELAXATOR:
-                    eps_i += model.deltaEps.value / (1 - complex(0, self.f[i]/model.f0.value))
-                if model.name == Model.DRUDE:
-                    eps_i += 1j*4*math.pi*model.sigma.value*model.gamma.value/(self.f[i]*(model.gamma.value-1j*self.f[i]))
-            eps.append(eps_i)
-            mu.append(mu_i)
-        self.tr_f = []
-        self.ph_f = []
-        for i in range(self.numPoints):
-            TrPh = self.calcTrPh(mu[i], eps[i], self.f[i])
-            T = TrPh[0]
-            fiT = TrPh[1]
-            self.tr_f.append(T)
-            self.ph_f.append(fiT / self.f[i])
+        if self.isStageChanged(Theory.F_SWEEP) or self.eps_f is None:
+            numPoints = self.gridPoints(self.numPoints)
+            self.f = self.f_Start.value + np.arange(numPoints) * (
+                    self.f_End.value - self.f_Start.value) / numPoints  # frequencies array, cm
+            modelTable = ModelTable(self.models, self.modelTypes)
+            self.eps_f = modelTable.calcEps(self.f, 0, complex(self.epsInf1.value, self.epsInf2.value))
+            self.mu_f = modelTable.calcMu(self.f, 0, complex(self.muInf1.value, 0))
+        if self.derivativeParameters is None:
+            T, fiT, R, fiR = calcTrPh(self.mu_f, self.eps_f, self.f, self.d.value, minTr=1e-6)
+        else:
+            dEps, dMu, dD = self.slabDerivatives(ModelTable(self.models, self.modelTypes), self.f, 0)
+            (T, fiT, R, fiR), (dT, dFiT, dR, dFiR) = calcTrPhDerivatives(self.mu_f, self.eps_f, self.f, self.d.value,
+                                                                         dMu, dEps, dD, minTr=1e-6)
+        self.tr_f = T
+        self.ph_f = fiT / self.f
         self.updateCurvePoints(self.f, self.tr_f, DataTypes.Trf)
         self.updateCurvePoints(self.f, self.ph_f, DataTypes.Phf)
-
-    def calcTrPh(self, mu, eps, f):
-        # sigma = 0  # [0.5*self.epsInf2*self.w[i] for i in range(self.numPoints)] # cond
-        # nk = (mu * (self.eps[i] + complex(0, 2 * sigma / self.f[i] / self.LIGHT_SPEED))) ** 0.5
-        nk = (mu * eps) ** 0.5
-        n = nk.real
-        k = nk.imag
-        # ab = (mu / (self.eps[i] + complex(0, 2 * sigma / self.f[i] / self.LIGHT_SPEED))) ** 0.5
-        ab = (mu / eps) ** 0.5
-        a = ab.real
-        b = ab.imag
-        A = 2 * self.PI * n * self.d.value * f  # w_Hz = w_cm-1 * LIGHT_SPEED
-        E = math.exp(-4 * self.PI * k * self.d.value * f)  # w_Hz = w_cm-1 * LIGHT_SPEED
-        R = ((a - 1) ** 2 + b ** 2) / ((a + 1) ** 2 + b ** 2)
-        fiR = math.atan((2 * b) / (a ** 2 + b ** 2 - 1))
-        T = E * ((1 - R) ** 2 + 4 * R * (math.sin(fiR)) ** 2) / (
-                (1 - R * E) ** 2 + 4 * R * E * (math.sin(A + fiR)) ** 2)
-        if T < 1e-6:  # value limitation for logarithmic scale use
-            T = 1e-6
-        fiT = A - math.atan(b * (a ** 2 + b ** 2 - 1) / ((a ** 2 + b ** 2) * (2 + a) + a)) + math.atan(
-            (R * E * math.sin(2 * A + 2 * fiR)) / (1 - R * E * math.cos(2 * A + 2 * fiR)))
-        return T, fiT
+        if self.derivativeParameters is not None:
+            self.updateCurveDerivatives(dT, DataTypes.Trf)
+            self.updateCurveDerivatives(dFiT / self.f, DataTypes.Phf)
 
     def getModelsString(self):
         theoryStr = ""
@@ -1,7 +1,9 @@
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QListWidgetItem
 from theoryModels import Theory, TheoryParameter, TheoryCurve, Model
 from dataTypes import DataTypes, FileTypes
+from slabOptics import calcTrPh, calcTrPhDerivatives
+from modelResponse import ModelTable
+import numpy as np
 
 
 class TheoryTrPh_fH(Theory):
@@ -22,18 +24,20 @@ class TheoryTrPh_fH(Theory):
 
     def __init__(self):
         Theory.__init__(self)
-        self.listItem = QListWidgetItem(self.name)
-
-        self.d = TheoryParameter(1.756 * 0.1, 'd', "cm")  # thickness
-        self.epsInf1 = TheoryParameter(14, '\u03B5\'<sub>\u221E</sub>', "")  # epsilon1 inf
-        self.epsInf2 = TheoryParameter(0.05, '\u03B5\"<sub>\u221E</sub>', "")  # epsilon2 inf
-        self.muInf1 = TheoryParameter(1, '\u03BC\'<sub>\u221E</sub>', "")  # mu1 inf
-        self.Hext = TheoryParameter(40000, 'H<sub>ext</sub>', "Oe")  # H external
-        self.fFix = TheoryParameter(100, 'f<sub>fix</sub>', "GHz")  # f fixed
-        self.f_Start = TheoryParameter(2, '\u03BD<sub>start</sub>', "cm<sup>-1</sup>", False)  # nu start
-        self.f_End = TheoryParameter(5, '\u03BD<sub>end</sub>', "cm<sup>-1</sup>", False)  # nu end
-        self.H_Start = TheoryParameter(0, 'H<sub>start</sub>', "Oe", False)  # H start
-        self.H_End = TheoryParameter(60000, 'H<sub>end</sub>', "Oe", False)  # H end
+
+        sweeps = [Theory.F_SWEEP, Theory.H_SWEEP]  # eps, mu of both sweeps
+        self.d = TheoryParameter(1.756 * 0.1, 'd', "cm", stages=[Theory.SLAB])  # thickness
+        self.epsInf1 = TheoryParameter(14, '\u03B5\'<sub>\u221E</sub>', "", stages=sweeps)  # epsilon1 inf
+        self.epsInf2 = TheoryParameter(0.05, '\u03B5\"<sub>\u221E</sub>', "", stages=sweeps)  # epsilon2 inf
+        self.muInf1 = TheoryParameter(1, '\u03BC\'<sub>\u221E</sub>', "", stages=sweeps)  # mu1 inf
+        self.Hext = TheoryParameter(40000, 'H<sub>ext</sub>', "Oe", stages=[Theory.F_SWEEP])  # H external
+        self.fFix = TheoryParameter(100, 'f<sub>fix</sub>', "GHz", stages=[Theory.H_SWEEP])  # f fixed
+        self.f_Start = TheoryParameter(2, '\u03BD<sub>start</sub>', "cm<sup>-1</sup>", False,
+                                       stages=[Theory.F_SWEEP])  # nu start
+        self.f_End = TheoryParameter(5, '\u03BD<sub>end</sub>', "cm<sup>-1</sup>", False,
+                                     stages=[Theory.F_SWEEP])  # nu end
+        self.H_Start = TheoryParameter(0, 'H<sub>start</sub>', "Oe", False, stages=[Theory.H_SWEEP])  # H start
+        self.H_End = TheoryParameter(60000, 'H<sub>end</sub>', "Oe", False, stages=[Theory.H_SWEEP])  # H end
 
         self.parameters = [self.d, self.epsInf1, self.epsInf2, self.muInf1, self.Hext, self.fFix,
                            self.f_Start, self.f_End, self.H_Start, self.H_End]
@@ -46,6 +50,11 @@ class TheoryTrPh_fH(Theory):
         self.ph_f = None  # phase/frequency, rad/cm-1
         self.tr_H = None  # transmittance
         self.ph_H = None  # mirror (optical length), mm
+        self.modelTable = None  # models parameter table, rebuilt with the eps, mu stages
+        self.eps_f = None  # eps, mu of the frequency sweep, reused when only the slab stage changes
+        self.mu_f = None
+        self.eps_H = None  # eps, mu of the field sweep
+        self.mu_H = None
 
         # QFontDatabase.addApplicationFont("../fonts/Montserrat-ThinItalic.ttf")
 
@@ -57,87 +66,68 @@ class TheoryTrPh_fH(Theory):
         self.initParameters()
 
     def update(self):
-        self.calc_f()
-        self.calc_H()
+        if self.isStageChanged(Theory.F_SWEEP) or self.isStageChanged(Theory.H_SWEEP) or self.modelTable is None:
+            self.modelTable = ModelTable(self.models, self.modelTypes)
+        if self.isStageChanged(Theory.F_SWEEP) or self.isStageChanged(Theory.SLAB):
+            self.calc_f()
+        if self.isStageChanged(Theory.H_SWEEP) or self.isStageChanged(Theory.SLAB):
+            self.calc_H()
+
+    def supportsDerivatives(self, parameters):
+        modelTable = ModelTable(self.models, self.modelTypes)
+        slabParameters = [self.d, self.epsInf1, self.epsInf2, self.muInf1]
+        return all(any(p is q for q in slabParameters) or modelTable.hasDerivative(p) for p in parameters)
+
+    # derivatives of eps, mu and d by derivativeParameters
+    def slabDerivatives(self, modelTable, f, H):
+        dEps, dMu = modelTable.calcDerivatives(f, H, self.derivativeParameters,
+                                               {self.epsInf1: 1, self.epsInf2: 1j}, {self.muInf1: 1})
+        dD = [float(p is self.d) for p in self.derivativeParameters]
+        return dEps, dMu, dD
 
     def calc_f(self):
-        self.f = [self.f_Start.value + i * (self.f_End.value - self.f_Start.value) / self.numPoints for i in
-                  range(self.numPoints)]  # frequencies array, cm
-        eps = []
-        mu = []
-        for i in range(self.numPoints):
-            eps_i = complex(self.epsInf1.value, self.epsInf2.value)
-            mu_i = complex(self.muInf1.value, 0)
-            for model in self.models:
-                if model.name == Model.OSCILLATOR:
-                    eps_i += model.deltaEps.value * model.f0.value ** 2 / (
-                            model.f0.value ** 2 - self.f[i] ** 2 - complex(0, model.gamma.value * self.f[i]))
-                if model.name == Model.MAGNET_OSCILLATOR_H:
-                    f0 = model.f0_H(self.Hext.value)
-                    mu_i += model.deltaMu.value * f0 ** 2 / (
-                            f0 ** 2 - self.f[i] ** 2 - complex(0, model.gamma.value * self.f[i]))
-            eps.append(eps_i)
-            mu.append(mu_i)
-        self.tr_f = []
-        self.ph_f = []
-        for i in range(self.numPoints):
-            TrPh = self.calcTrPh(mu[i], eps[i], self.f[i])
-            T = TrPh[0]
-            fiT = TrPh[1]
-            self.tr_f.append(T)
-            self.ph_f.append(fiT / self.f[i])
+        if self.isStageChanged(Theory.F_SWEEP) or self.eps_f is None:
+            numPoints = self.gridPoints(self.numPoints)
+            self.f = self.f_Start.value + np.arange(numPoints) * (
+                    self.f_End.value - self.f_Start.value) / numPoints  # frequencies array, cm
+            self.eps_f = self.modelTable.calcEps(self.f, self.Hext.value,
+                                                 complex(self.epsInf1.value, self.epsInf2.value))
+            self.mu_f = self.modelTable.calcMu(self.f, self.Hext.value, complex(self.muInf1.value, 0))
+        if self.derivativeParameters is None:
+            T, fiT, R, fiR = calcTrPh(self.mu_f, self.eps_f, self.f, self.d.value)
+        else:
+            dEps, dMu, dD = self.slabDerivatives(self.modelTable, self.f, self.Hext.value)
+            (T, fiT, R, fiR), (dT, dFiT, dR, dFiR) = calcTrPhDerivatives(self.mu_f, self.eps_f, self.f, self.d.value,
+                                                                         dMu, dEps, dD)
+        self.tr_f = T
+        self.ph_f = fiT / self.f
         self.updateCurvePoints(self.f, self.tr_f, DataTypes.Trf)
         self.updateCurvePoints(self.f, self.ph_f, DataTypes.Phf)
+        if self.derivativeParameters is not None:
+            self.updateCurveDerivatives(dT, DataTypes.Trf)
+            self.updateCurveDerivatives(dFiT / self.f, DataTypes.Phf)
 
     def calc_H(self):
-        self.H = [self.H_Start.value + i * (self.H_End.value - self.H_Start.value) / self.numPoints for i in
-                  range(self.numPoints)]  # magnetic fields array, Oe
-        eps = []
-        mu = []
         f = self.fFix.value / 30
-        for i in range(self.numPoints):
-            eps_i = complex(self.epsInf1.value, self.epsInf2.value)
-            mu_i = complex(self.muInf1.value, 0)
-            for model in self.models:
-                if model.name == Model.OSCILLATOR:
-                    eps_i += model.deltaEps.value * model.f0.value ** 2 / (
-                            model.f0.value ** 2 - f ** 2 - complex(0, model.gamma.value * f))
-                if model.name == Model.MAGNET_OSCILLATOR_H:
-                    f0 = model.f0_H(self.H[i])
-                    mu_i += model.deltaMu.value * f0 ** 2 / (
-                            f0 ** 2 - f ** 2 - complex(0, model.gamma.value * f))
-            eps.append(eps_i)
-            mu.append(mu_i)
-        self.tr_H = []
-        self.ph_H = []
-        for i in range(self.numPoints):
-            TrPh = self.calcTrPh(mu[i], eps[i], f)
-            T = TrPh[0]
-            fiT = TrPh[1]
-            self.tr_H.append(T)
-            self.ph_H.append(fiT / (2 * self.PI * f) * 10)  # mirror (optical depth), mm
+        if self.isStageChanged(Theory.H_SWEEP) or self.eps_H is None:
+            numPoints = self.gridPoints(self.numPoints)
+            self.H = self.H_Start.value + np.arange(numPoints) * (
+                    self.H_End.value - self.H_Start.value) / numPoints  # magnetic fields array, Oe
+            self.eps_H = self.modelTable.calcEps(f, self.H, complex(self.epsInf1.value, self.epsInf2.value))
+            self.mu_H = self.modelTable.calcMu(f, self.H, complex(self.muInf1.value, 0))
+        if self.derivativeParameters is None:
+            T, fiT, R, fiR = calcTrPh(self.mu_H, self.eps_H, f, self.d.value)
+        else:
+            dEps, dMu, dD = self.slabDerivatives(self.modelTable, f, self.H)
+            (T, fiT, R, fiR), (dT, dFiT, dR, dFiR) = calcTrPhDerivatives(self.mu_H, self.eps_H, f, self.d.value,
+                                                                         dMu, dEps, dD)
+        self.tr_H = T
+        self.ph_H = fiT / (2 * self.PI * f) * 10  # mirror (optical depth), mm
         self.updateCurvePoints(self.H, self.tr_H, DataTypes.SignalH)
         self.updateCurvePoints(self.H, self.ph_H, DataTypes.MirrorH)
-
-    def calcTrPh(self, mu, eps, f):
-        # sigma = 0  # [0.5*self.epsInf2*self.w[i] for i in range(self.numPoints)] # cond
-        # nk = (mu * (self.eps[i] + complex(0, 2 * sigma / self.f[i] / self.LIGHT_SPEED))) ** 0.5
-        nk = (mu * eps) ** 0.5
-        n = nk.real
-        k = nk.imag
-        # ab = (mu / (self.eps[i] + complex(0, 2 * sigma / self.f[i] / self.LIGHT_SPEED))) ** 0.5
-        ab = (mu / eps) ** 0.5
-        a = ab.real
-        b = ab.imag
-        A = 2 * self.PI * n * self.d.value * f  # w_Hz = w_cm-1 * LIGHT_SPEED
-        E = math.exp(-4 * self.PI * k * self.d.value * f)  # w_Hz = w_cm-1 * LIGHT_SPEED
-        R = ((a - 1) ** 2 + b ** 2) / ((a + 1) ** 2 + b ** 2)
-        fiR = math.atan((2 * b) / (a ** 2 + b ** 2 - 1))
-        T = E * ((1 - R) ** 2 + 4 * R * (math.sin(fiR)) ** 2) / (
-                (1 - R * E) ** 2 + 4 * R * E * (math.sin(A + fiR)) ** 2)
-        fiT = A - math.atan(b * (a ** 2 + b ** 2 - 1) / ((a ** 2 + b ** 2) * (2 + a) + a)) + math.atan(
-            (R * E * math.sin(2 * A + 2 * fiR)) / (1 - R * E * math.cos(2 * A + 2 * fiR)))
-        return T, fiT
+        if self.derivativeParameters is not None:
+            self.updateCurveDerivatives(dT, DataTypes.SignalH)
+            self.updateCurveDerivatives(dFiT / (2 * self.PI * f) * 10, DataTypes.MirrorH)
 
     def getModelHRes(self, model):
         f0 = self.fFix.value / 30
@@ -1,26 +1,35 @@
-from theoryLangasite_M_H import TheoryLangasite_M_H
-from theoryLangasite_M_teta import TheoryLangasite_M_teta
-from theoryHoLGS_DistrAngleDcf import TheoryHoLGS_DistrAngleDcf
-from theoryNdLGS_TrPh_fH import theoryNdLGS_TrPh_fH
-from theoryTrPh_f import TheoryTrPh_f
-from theoryTrPh_f_RPh_f import TheoryTrPh_f_RPh_f
-from theoryTbLGS_M_teta import TheoryTbLGS_M_teta
-from theoryGaussPhonon import TheoryGaussPhonon
-from theoryTrPh_fH import TheoryTrPh_fH
-from theoryPrLGS_TrPh_f import TheoryPrLGS_TrPh_f
-from theoryTbLangasite_M_H import TheoryTbLangasite_M_H
+import importlib
+
+# The module of a theory is imported when a theory of its type is created first, so the numba kernels are not
+# compiled (or loaded from the numba cache) at start for all theories.
+
+
+class LazyTheoryType:
+    def __init__(self, moduleName, className):
+        self.moduleName = moduleName
+        self.className = className
+        self.theoryClass = None
+
+    def load(self):
+        if self.theoryClass is None:
+            self.theoryClass = getattr(importlib.import_module(self.moduleName), self.className)
+        return self.theoryClass
+
+    def __call__(self):
+        return self.load()()
 
 
 class TheoryType:
-    types = {TheoryTrPh_fH.name: TheoryTrPh_fH,
-             TheoryTrPh_f.name: TheoryTrPh_f,
-             TheoryLangasite_M_H.name: TheoryLangasite_M_H,
-             TheoryLangasite_M_teta.name: TheoryLangasite_M_teta,
-             TheoryHoLGS_DistrAngleDcf.name: TheoryHoLGS_DistrAngleDcf,
-             theoryNdLGS_TrPh_fH.name: theoryNdLGS_TrPh_fH,
-             TheoryTrPh_f_RPh_f.name: TheoryTrPh_f_RPh_f,
-             TheoryTbLGS_M_teta.name: TheoryTbLGS_M_teta,
-             TheoryGaussPhonon.name:TheoryGaussPhonon,
-             TheoryPrLGS_TrPh_f.name:TheoryPrLGS_TrPh_f,
-             TheoryTbLangasite_M_H.name: TheoryTbLangasite_M_H,
-            }
+    # theory name: type, the names are the name attributes of the theory classes (tests/test_theoryTypes.py)
+    types = {"Tr,Ph(f), Tr,Ph(H(f))": LazyTheoryType("theoryTrPh_fH", "TheoryTrPh_fH"),
+             "Tr,Ph(f)": LazyTheoryType("theoryTrPh_f", "TheoryTrPh_f"),
+             "Ho LGS M(H)": LazyTheoryType("theoryLangasite_M_H", "TheoryLangasite_M_H"),
+             "Ho LGS M(teta)": LazyTheoryType("theoryLangasite_M_teta", "TheoryLangasite_M_teta"),
+             "Ho LGS DistrAngleDcf": LazyTheoryType("theoryHoLGS_DistrAngleDcf", "TheoryHoLGS_DistrAngleDcf"),
+             "NgLGS TrPh(f,H)": LazyTheoryType("theoryNdLGS_TrPh_fH", "theoryNdLGS_TrPh_fH"),
+             "Tr,Ph(f); R,PhR(f)": LazyTheoryType("theoryTrPh_f_RPh_f", "TheoryTrPh_f_RPh_f"),
+             "Tb LGS M(teta)": LazyTheoryType("theoryTbLGS_M_teta", "TheoryTbLGS_M_teta"),
+             "Gauss phonon": LazyTheoryType("theoryGaussPhonon", "TheoryGaussPhonon"),
+             "PrLGS TrPh(f)": LazyTheoryType("theoryPrLGS_TrPh_f", "TheoryPrLGS_TrPh_f"),
+             "Tb LGS M(H) 3 + 3 pos": LazyTheoryType("theoryTbLangasite_M_H", "TheoryTbLangasite_M_H"),
+             }
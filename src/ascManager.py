@@ -1,105 +1,76 @@
+import io
 import re
-from datetime import datetime
+import numpy as np
 from dataTypes import DataTypes, FileTypes
 from spectrumObject import SpectrumObject
 
+GHZ_PER_CM = 30  # frequencies of TPSCalc are in GHz, cm-1 = GHz / 30
 
-class DataSet:
-    def __init__(self, sample, thickness, temperature, comment, date, points, data_type, dataX, dataY):
-        self.sample = sample
-        self.thickness = thickness
-        self.temperature = temperature
-        self.comment = comment
-        self.date = date
-        self.points = points
-        self.data_type = data_type
-        self.dataX = dataX  # Массив для частот (Frequency)
-        self.dataY = dataY  # Массив для значений (Transmission или Phase)
+# Header of a block: seven lines, the values of the first six and the data type from the columns header
+header_pattern = re.compile(r"^Sample=(.*)\n"
+                            r"Thickness,mm=(.*)\n"
+                            r"Temperature=(.*)\n"
+                            r"Comment=(.*)\n"
+                            r"(\d{2}\.\d{2}\.\d{4}).*\n"
+                            r"Points=(.*)\n"
+                            r"Frequency,GHz\t(Transmission|Phase)", re.MULTILINE)
+# Numeric rows following the header, numbers with a point or a comma
+not_row_pattern = re.compile(r"^(?![-\d])", re.MULTILINE)  # end of the rows block
+number = r"-?[\d,.]+E[+-]\d+"
+block_pattern = re.compile(r"(?:" + number + r"\t" + number + r"[^\n]*(?:\n|\Z))+")
+row_pattern = re.compile(r"^(" + number + r")\t(" + number + r")", re.MULTILINE)
 
-    def __repr__(self):
-        return (f"DataSet(sample={self.sample}, thickness={self.thickness}, temperature={self.temperature}, "
-                f"comment={self.comment}, date={self.date}, points={self.points}, "
-                f"data_type={self.data_type}, dataX={self.dataX}, dataY={self.dataY})")
 
-
-def parse_asc_data(text):
-    # Регулярные выражения для извлечения данных
-    sample_pattern = re.compile(r"Sample=(.*)")
-    thickness_pattern = re.compile(r"Thickness,mm=(.*)")
-    temperature_pattern = re.compile(r"Temperature=(.*)")
-    comment_pattern = re.compile(r"Comment=(.*)")
-    date_pattern = re.compile(r"(\d{2}\.\d{2}\.\d{4})")
-    points_pattern = re.compile(r"Points=(.*)")
-    data_header_pattern = re.compile(r"Frequency,GHz\t(Transmission|Phase)")
-    data_row_pattern = re.compile(r"([-]?[\d,.]+E[+-]\d+)\t([-]?[\d,.]+E[+-]\d+)")  # Поддержка чисел с точкой и запятой
-
-    datasets = []
-    lines = text.strip().split('\n')
-    i = 0
-    while i < len(lines):
-        # Парсим метаданные
-        if i + 6 >= len(lines):  # Проверяем, что есть достаточно строк для заголовка
-            break  # Если строк недостаточно, завершаем парсинг
-
-        sample_match = sample_pattern.match(lines[i])
-        thickness_match = thickness_pattern.match(lines[i + 1])
-        temperature_match = temperature_pattern.match(lines[i + 2])
-        comment_match = comment_pattern.match(lines[i + 3])
-        date_match = date_pattern.match(lines[i + 4])
-        points_match = points_pattern.match(lines[i + 5])
-        data_header_match = data_header_pattern.match(lines[i + 6])
-
-        # Если заголовок данных отсутствует, пропускаем этот блок
-        if not all([sample_match, thickness_match, temperature_match, comment_match, date_match, points_match,
-                    data_header_match]):
-            i += 1
+# Spectra of a TPSCalc export, yielded block by block. Headers are found by one pattern over the whole text,
+# the rows of a block are converted to a float array at once
+def iter_asc_spectra(text):
+    text = text.strip().replace("\r\n", "\n")
+    fileType = FileTypes.asc
+    pos = 0
+    while True:
+        header_match = header_pattern.search(text, pos)
+        if header_match is None:
+            return
+        pos = text.find("\n", header_match.end())
+        if pos < 0:
+            return  # header without data
+        pos += 1
+        values = read_rows(text, pos)
+        if values is None:
             continue
+        pos, values = values
 
-        # Если все метаданные и заголовок найдены, продолжаем парсинг
-        sample = sample_match.group(1)
-        thickness = float(thickness_match.group(1).replace(',', '.'))
-        temperature = float(temperature_match.group(1))
-        comment = comment_match.group(1)
-        date = date_match.group(1)  # datetime.strptime(date_match.group(1), "%d.%m.%Y")
-        points = int(points_match.group(1))
-        _data_type = data_header_match.group(1)
+        sample, thickness, temperature, comment, date, points, _data_type = header_match.groups()
+        data_type = DataTypes.Trf if _data_type == "Transmission" else DataTypes.Phf
+        dataX = values[:, 0] / GHZ_PER_CM
+        dataY = values[:, 1].copy()
+        spectrum = SpectrumObject(sample, comment, float(temperature.replace(',', '.')),
+                                  float(thickness.replace(',', '.')), date, "Clipboard",
+                                  data_type, int(points), float(dataX[0]), float(dataX[-1]),
+                                  fileType)
+        spectrum.xValues = dataX
+        spectrum.yValues = dataY
+        yield spectrum
 
-        if _data_type == "Transmission":
-            data_type = DataTypes.Trf
-        else:
-            data_type = DataTypes.Phf
 
-        # Парсим данные
-        dataX = []
-        dataY = []
-        i += 7
-        while i < len(lines):
-            data_row_match = data_row_pattern.match(lines[i])
-            if not data_row_match:
-                break
-            # Преобразуем числа с запятой в точку и в float
-            frequency = float(data_row_match.group(1).replace(',', '.')) / 30
-            value = float(data_row_match.group(2).replace(',', '.'))
-            dataX.append(frequency)
-            dataY.append(value)
-            i += 1
+# (end position, array of the x, y rows) of the block starting at pos or None if there are no rows
+def read_rows(text, pos):
+    end_match = not_row_pattern.search(text, pos)
+    end = end_match.start() if end_match is not None else len(text)
+    if end > pos:
+        try:
+            values = np.loadtxt(io.StringIO(text[pos:end].replace(",", ".")), delimiter="\t", ndmin=2)
+            if values.shape[1] == 2:
+                return end, values
+        except ValueError:
+            pass
+    # rows with other text, the block is the leading rows of two numbers
+    block_match = block_pattern.match(text, pos)
+    if block_match is None:
+        return None
+    rows = row_pattern.findall(block_match.group(0).replace(",", "."))
+    return block_match.end(), np.array(rows, dtype=np.float64).reshape(-1, 2)
 
-        # Создаем объект DataSet и добавляем его в список
-        dataset = DataSet(sample, thickness, temperature, comment, date, points, data_type, dataX, dataY)
-        datasets.append(dataset)
 
-    spectra = []
-    fileType = FileTypes.asc
-    for dataset in datasets:
-        # print(dataset)
-        spectrum = SpectrumObject(dataset.sample, dataset.comment, dataset.temperature,
-                                  dataset.thickness, dataset.date, "Clipboard",
-                                  dataset.data_type, dataset.points, dataset.dataX[0],
-                                  dataset.dataX[len(dataset.dataX) - 1],
-                                  fileType)
-        spectrum.xValues = dataset.dataX
-        spectrum.yValues = dataset.dataY
-        spectra.append(spectrum)
-
-    # return datasets
-    return spectra
+def parse_asc_data(text):
+    return list(iter_asc_spectra(text))
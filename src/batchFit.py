@@ -0,0 +1,123 @@
+import os
+import sys
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Theory"))
+
+from PyQt5.QtCore import pyqtSignal, QObject, QRunnable
+from fileManager import readSpectraFile, loadTheory, writeTheory
+from dataTypes import plotValues
+from theoryFit import TheoryFit, FitParameter, FitData
+
+
+# Refit of all .theory files of a directory: every file is loaded, fitted to the experiments it references
+# and saved back, the files are fitted in parallel worker processes without the GUI.
+
+
+def theoryFiles(directory):
+    return sorted(str(p) for p in Path(directory).iterdir() if p.is_file() and p.suffix.upper() == ".THEORY")
+
+
+def experimentFitData(experiments):
+    data = []
+    for experiment in experiments:
+        filePath = experiment["filePath"]
+        if not os.path.isfile(filePath):
+            filePath = filePath.replace("\\", "/")  # saved on Windows
+        spectra = readSpectraFile(filePath)
+        if not spectra:
+            raise FileNotFoundError("no spectra in " + filePath)
+        for spectrum in spectra:
+            if spectrum.inFileNum == experiment["inFileNum"]:
+                x, y = plotValues(spectrum.dataType, spectrum.xValues, spectrum.yValues)
+                data.append(FitData(spectrum.dataType, x, y, spectrum.spectrumName + ", " + spectrum.sampleName))
+    return data
+
+
+def initWorker(numThreads):
+    import numba  # in the workers only, the theory modules import it when they are used first
+    numba.set_num_threads(max(1, min(numThreads, numba.config.NUMBA_NUM_THREADS)))
+
+
+# runs in a worker process, returns (file path, cost or None, message)
+def refitTheoryFile(filePath, maxEvaluations=None):
+    try:
+        theory, experiments = loadTheory(filePath)
+        fitParameters = []
+        for parameter in theory.parameters:
+            if parameter.fitBounds is not None:
+                fitParameters.append(FitParameter(parameter, *parameter.fitBounds, text=parameter.name))
+        for model in theory.models:
+            for parameter in model.parameters:
+                if parameter.fitBounds is not None:
+                    fitParameters.append(FitParameter(parameter, *parameter.fitBounds,
+                                                      text=model.text + ": " + parameter.name))
+        if len(fitParameters) == 0:
+            return filePath, None, "no free parameters saved, fit it once in the fit dialog"
+        data = experimentFitData(experiments)
+        if len(data) == 0:
+            return filePath, None, "no experiments"
+        fit = TheoryFit(theory, fitParameters, data)
+        result = fit.run(maxEvaluations)
+        theory.update()  # curves of the best values are saved with the theory
+        writeTheory(theory, filePath, experiments)
+        return filePath, float(fit.bestCost), result.message
+    except Exception as e:
+        return filePath, None, "error: " + repr(e)
+
+
+def batchFit(directory, workers=None, maxEvaluations=None, progress=print):
+    files = theoryFiles(directory)
+    if len(files) == 0:
+        return []
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(files)))
+    numThreads = max(1, (os.cpu_count() or 1) // workers)  # numba threads of each worker
+    results = []
+    context = multiprocessing.get_context("spawn")  # the GUI process must not be forked
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initWorker,
+                             initargs=(numThreads,)) as executor:
+        futures = [executor.submit(refitTheoryFile, f, maxEvaluations) for f in files]
+        for future in as_completed(futures):
+            filePath, cost, message = future.result()
+            results.append((filePath, cost, message))
+            costText = "" if cost is None else f" cost {cost:.6g}"
+            progress(f"[{len(results)}/{len(files)}] {Path(filePath).name}:{costText} {message}")
+    return results
+
+
+class BatchFitSignals(QObject):
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(object)
+
+
+class BatchFitTask(QRunnable):
+    def __init__(self, directory):
+        super(BatchFitTask, self).__init__()
+        self.directory = directory
+        self.signals = BatchFitSignals()
+
+    def run(self):
+        results = []
+        try:
+            results = batchFit(self.directory, progress=self.signals.progress.emit)
+        except Exception as e:
+            self.signals.progress.emit("Batch fit error: " + repr(e))
+        finally:
+            self.signals.finished.emit(results)
+
+
+if __name__ == "__main__":
+    # run from the program directory, experiment paths in the .theory files are relative to it
+    parser = argparse.ArgumentParser(description="Refit all .theory files of a directory")
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--max-evaluations", type=int, default=None)
+    args = parser.parse_args()
+    results = batchFit(args.directory, args.workers, args.max_evaluations)
+    sys.exit(0 if all(cost is not None for filePath, cost, message in results) else 1)
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class DataTypes:
     Trf = "Tr(f)"
     Phf = "Ph(f)"
@@ -14,6 +17,20 @@ class DataTypes:
     types = [Trf, Phf, SignalH, MirrorH, M_H, M_T, M_teta, f_H, dMu_H, R_f, PhR_f]
 
 
+# spectrum values as plotted together with the theory curves: fields in Oe, Ph(f) divided by frequency, mirror inverted
+def plotValues(dataType, xValues, yValues):
+    xValues = np.asarray(xValues, dtype=np.float64)
+    yValues = np.asarray(yValues, dtype=np.float64)
+    if dataType == DataTypes.Phf:
+        yValues = yValues / xValues
+    elif dataType == DataTypes.SignalH:
+        xValues = xValues * 1e4
+    elif dataType == DataTypes.MirrorH:
+        xValues = xValues * 1e4
+        yValues = -yValues
+    return xValues, yValues
+
+
 def getDataTypeAttributes(types, dataType):
     attributes = None
     if dataType in types:
@@ -1,5 +1,12 @@
+import io
+import json
+import math
+import numbers
 import struct
+import mmap
+from functools import partial
 from pathlib import Path
+import numpy as np
 from spectrumObject import SpectrumObject
 import os
 import datetime as dt
@@ -11,6 +18,8 @@ from theoryTypes import TheoryType
 from PyQt5.QtWidgets import QFileDialog, QWidget
 from ascManager import parse_asc_data
 
+DAT_FLOAT = np.dtype('<f4')  # points of the .dat files, little endian float32
+
 
 class FileManager:
     files = []
@@ -67,62 +76,78 @@ def getFileType(f):
 
 
 def readDatFile(f):
+    # only the headers are read, the file is memory mapped so the point blocks are not touched,
+    # the points of a spectrum are read by readDatValues when it is first plotted
     spectra = []
     fileType = FileTypes.TrPhf
     try:
         file = open(f, "rb")
     except FileNotFoundError:
         return []
-    readBytes = file.read(1)  # first step without reading
-    inFileNum = 1
-    while readBytes:
-        readBytes = file.read(1)
-        nextTextLength = int.from_bytes(readBytes, byteorder='little',
-                                        signed=True)  # next text length/ little endian int
-        if nextTextLength == 0:
-            break
-        readBytes = file.read(2)
-        header = readBytes.decode("utf-8")
-        if header == "hd":
-            numPoints = int.from_bytes(file.read(2), byteorder='little', signed=True)  # 2 bytes int
-            nextTextLength = int.from_bytes(file.read(1), byteorder='little', signed=True)  # next text length
-            spectrumName = file.read(64).decode("utf-8")[:nextTextLength]  # read>decode>get substring
-            nextTextLength = int.from_bytes(file.read(1), byteorder='little', signed=True)  # next text length
-            date = file.read(14).decode("utf-8")[:nextTextLength]
-            frequencies = []
-            for frNum in range(numPoints):
-                frequency = readFloat(file)
-                frequencies.append(frequency)
-        else:
-            nextTextLength = int.from_bytes(file.read(1), byteorder='little', signed=True)  # next text length
-            sampleName = file.read(14).decode("utf-8")[:nextTextLength]
-            temperature = readFloat(file)
-            d = readFloat(file)
-            values = []
-            for frNum in range(numPoints):
-                value = readFloat(file)
-                values.append(value)
-            if header == "tr":
-                dataType = DataTypes.Trf
-            elif header == "pt":
-                dataType = DataTypes.Phf
-            else:
-                dataType = header
-            spectrum = SpectrumObject(sampleName, spectrumName, temperature, d, date, Path(f).stem,
-                                      dataType, numPoints, frequencies[0], frequencies[len(frequencies) - 1],
-                                      fileType)
-            spectrum.filePath = os.path.relpath(f, start=os.curdir)
-            spectrum.inFileNum = inFileNum
-            inFileNum += 1
-            for pointNum in range(numPoints):
-                spectrum.xValues.append(frequencies[pointNum])
-                spectrum.yValues.append(values[pointNum])
-
-            spectra.append(spectrum)
-    file.close()
+    with file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            filePath = os.path.abspath(f)
+            pos = 1  # first byte skipped
+            inFileNum = 1
+            xOffset = None
+            while pos + 3 <= len(data):
+                nextTextLength = int.from_bytes(data[pos:pos + 1], byteorder='little', signed=True)  # text length
+                if nextTextLength == 0:
+                    break
+                header = data[pos + 1:pos + 3].decode("utf-8")
+                pos += 3
+                if header == "hd":
+                    numPoints = int.from_bytes(data[pos:pos + 2], byteorder='little', signed=True)  # 2 bytes int
+                    nextTextLength = data[pos + 2]  # next text length
+                    spectrumName = data[pos + 3:pos + 67].decode("utf-8")[:nextTextLength]
+                    nextTextLength = data[pos + 67]
+                    date = data[pos + 68:pos + 82].decode("utf-8")[:nextTextLength]
+                    pos += 82
+                    if numPoints <= 0 or pos + 4 * numPoints > len(data):
+                        break  # truncated file
+                    xOffset = pos
+                    pStart = round(struct.unpack_from('<f', data, pos)[0], 6)
+                    pEnd = round(struct.unpack_from('<f', data, pos + 4 * (numPoints - 1))[0], 6)
+                    pos += 4 * numPoints
+                else:
+                    if xOffset is None or pos + 23 + 4 * numPoints > len(data):
+                        break  # no frequencies block before the values or truncated file
+                    nextTextLength = data[pos]  # next text length
+                    sampleName = data[pos + 1:pos + 15].decode("utf-8")[:nextTextLength]
+                    temperature, d = (round(v, 6) for v in struct.unpack_from('<2f', data, pos + 15))
+                    pos += 23
+                    if header == "tr":
+                        dataType = DataTypes.Trf
+                    elif header == "pt":
+                        dataType = DataTypes.Phf
+                    else:
+                        dataType = header
+                    spectrum = SpectrumObject(sampleName, spectrumName, temperature, d, date, Path(f).stem,
+                                              dataType, numPoints, pStart, pEnd, fileType)
+                    spectrum.filePath = os.path.relpath(f, start=os.curdir)
+                    spectrum.inFileNum = inFileNum
+                    inFileNum += 1
+                    spectrum.valuesLoader = partial(readDatValues, filePath, xOffset, pos, numPoints)
+                    pos += 4 * numPoints
+                    spectra.append(spectrum)
     return spectra
 
 
+# points of one spectrum of a .dat file: frequencies and values blocks as little endian float32.
+# OSError if the file is not read, ValueError if it is shorter than its headers (changed after they were read)
+def readDatValues(filePath, xOffset, yOffset, numPoints):
+    with open(filePath, "rb") as file:
+        file.seek(xOffset)
+        x = np.fromfile(file, dtype=DAT_FLOAT, count=numPoints)
+        file.seek(yOffset)
+        y = np.fromfile(file, dtype=DAT_FLOAT, count=numPoints)
+    if len(x) != numPoints or len(y) != numPoints:
+        raise ValueError(Path(filePath).name + " is shorter than its headers, " + str(numPoints) + " points expected")
+    return x.astype(np.float32), y.astype(np.float32)  # native byte order
+
+
 def readASC(f):
     try:
         file = open(f, "rb")
@@ -134,6 +159,30 @@ def readASC(f):
     return spectra
 
 
+# numeric columns of a whitespace separated text file, parsed in one pass by np.loadtxt; decimal commas are read
+# as points, rows with less than numColumns numbers are skipped, returns a (numColumns, rows) array
+def readColumns(f, numColumns, skipRows=0):
+    with open(f, "rb") as file:
+        for i in range(skipRows):
+            file.readline()
+        text = file.read().replace(b",", b".").decode("utf-8")
+    try:
+        table = np.loadtxt(io.StringIO(text), dtype=np.float64, ndmin=2)
+        if table.shape[1] < numColumns:
+            table = np.empty((0, numColumns))
+    except ValueError:  # ragged or text rows
+        rows = []
+        for line in text.splitlines():
+            try:
+                values = [float(strVal) for strVal in line.split()]
+            except ValueError:
+                continue
+            if len(values) >= numColumns:
+                rows.append(values[:numColumns])
+        table = np.array(rows, dtype=np.float64).reshape(-1, numColumns)
+    return np.ascontiguousarray(table[:, :numColumns].T)  # every column is a contiguous view
+
+
 def readFdpFile(f):
     spectra = []
     fileType = FileTypes.TrPhH
@@ -141,7 +190,8 @@ def readFdpFile(f):
         file = open(f, "rb")
     except FileNotFoundError:
         return []
-    headerString = str(file.readline())
+    with file:
+        headerString = str(file.readline())
     if not ("Field" in headerString):
         return []
     isSingle = "Signal" in headerString
@@ -154,53 +204,36 @@ def readFdpFile(f):
     spectrumName = Path(f).stem
     file_time = dt.datetime.fromtimestamp(os.path.getmtime(f))
     date = file_time.strftime("%d.%m.%Y")
-    lines = file.readlines()
-    numPoints = len(lines)
-    signal = SpectrumObject(sampleName, spectrumName, 0, 0, date,
+    columns = readColumns(f, 5 if hasMirror else 4, skipRows=1)
+    numPoints = columns.shape[1]
+    if numPoints == 0:
+        return []
+    field = columns[0]
+    minH = float(np.min(field))
+    maxH = float(np.max(field))
+    temperatureSmpl = np.cumsum(columns[1])[-1]  # summed point by point, the mean is rounded to 0.01 K
+    temperatureCntr = np.cumsum(columns[2])[-1]
+    temperature = round(float(0.75 * temperatureSmpl + 0.25 * temperatureCntr) / numPoints, 2)
+    signal = SpectrumObject(sampleName, spectrumName, temperature, 0, date,
                             Path(f).stem,
-                            dataType=DataTypes.SignalH, numPoints=numPoints, pStart=0, pEnd=0,
+                            dataType=DataTypes.SignalH, numPoints=numPoints, pStart=minH, pEnd=maxH,
                             fileType=fileType)
     signal.filePath = os.path.relpath(f, start=os.curdir)
     signal.inFileNum = 1
-    signal.xValues = []
-    signal.yValues = []
+    signal.xValues = field
+    signal.yValues = columns[3]
+    spectra.append(signal)
     if hasMirror:
-        mirror = SpectrumObject(sampleName, spectrumName, 0, 0, date,
+        if not ("SignalIntensity" in headerString):
+            signal.yValues = columns[3] ** 2
+        mirror = SpectrumObject(sampleName, spectrumName, temperature, 0, date,
                                 Path(f).stem,
-                                dataType=DataTypes.MirrorH, numPoints=numPoints, pStart=0, pEnd=0,
+                                dataType=DataTypes.MirrorH, numPoints=numPoints, pStart=minH, pEnd=maxH,
                                 fileType=fileType)
         mirror.filePath = os.path.relpath(f, start=os.curdir)
         mirror.inFileNum = 2
-        mirror.xValues = []
-        mirror.yValues = []
-    minH = 10000
-    maxH = -10000
-    temperatureSmpl = 0
-    temperatureCntr = 0
-    for line in lines:
-        values = [float(strVal) for strVal in str(line.decode("utf-8")).split()]
-        if values[0] < minH:
-            minH = values[0]
-        if values[0] > maxH:
-            maxH = values[0]
-        signal.xValues.append(values[0])
-        signalYValue = values[3]
-        if hasMirror:
-            mirror.xValues.append(values[0])
-            mirror.yValues.append(values[4])
-            if not ("SignalIntensity" in headerString):
-                signalYValue = signalYValue ** 2
-        signal.yValues.append(signalYValue)
-        temperatureSmpl += values[1]
-        temperatureCntr += values[2]
-    signal.pStart = minH
-    signal.pEnd = maxH
-    signal.temperature = round((0.75 * temperatureSmpl + 0.25 * temperatureCntr) / numPoints, 2)
-    spectra.append(signal)
-    if hasMirror:
-        mirror.pStart = minH
-        mirror.pEnd = maxH
-        mirror.temperature = signal.temperature
+        mirror.xValues = field
+        mirror.yValues = columns[4]
         spectra.append(mirror)
     return spectra
 
@@ -221,85 +254,37 @@ def readBrukerReflection(f):
     return readMultipleColText(f, FileTypes.RPhRf, [DataTypes.R_f, DataTypes.PhR_f])
 
 
+# first column is x, the next ones are y of dataTypes
 def readMultipleColText(f, fileType, dataTypes):
     spectra = []
     try:
-        file = open(f, "rb")
+        columns = readColumns(f, 1 + len(dataTypes))
     except FileNotFoundError:
         return []
     sampleName = Path(f).parts[-2]
     spectrumName = Path(f).stem
     file_time = dt.datetime.fromtimestamp(os.path.getmtime(f))
     date = file_time.strftime("%d.%m.%Y")
-    lines = file.readlines()
-    numPoints = len(lines)
+    numPoints = columns.shape[1]
+    if numPoints == 0:
+        return []
+    minX = float(np.min(columns[0]))
+    maxX = float(np.max(columns[0]))
     for i in range(len(dataTypes)):
         spectrum = SpectrumObject(sampleName, spectrumName, 0, 0, date,
                                   Path(f).stem,
-                                  dataType=dataTypes[i], numPoints=numPoints, pStart=0, pEnd=0,
+                                  dataType=dataTypes[i], numPoints=numPoints, pStart=minX, pEnd=maxX,
                                   fileType=fileType)
         spectrum.filePath = os.path.relpath(f, start=os.curdir)
         spectrum.inFileNum = 1
-        spectrum.xValues = []
-        spectrum.yValues = []
-        minX = 10000000
-        maxX = -10000000
-        for line in lines:
-            lineStr = str(line.decode("utf-8")).replace(",", ".")
-            values = [float(strVal) for strVal in lineStr.split()]
-            if len(values) < 2:
-                continue
-            if values[0] < minX:
-                minX = values[0]
-            if values[0] > maxX:
-                maxX = values[0]
-            spectrum.xValues.append(values[0])
-            spectrum.yValues.append(values[1 + i])
-        spectrum.pStart = minX
-        spectrum.pEnd = maxX
-        spectrum.temperature = 0
+        spectrum.xValues = columns[0]
+        spectrum.yValues = columns[1 + i]
         spectra.append(spectrum)
     return spectra
 
 
 def readTwoColText(f, fileType, dataType):
-    spectra = []
-    try:
-        file = open(f, "rb")
-    except FileNotFoundError:
-        return []
-    sampleName = Path(f).parts[-2]
-    spectrumName = Path(f).stem
-    file_time = dt.datetime.fromtimestamp(os.path.getmtime(f))
-    date = file_time.strftime("%d.%m.%Y")
-    lines = file.readlines()
-    numPoints = len(lines)
-    spectrum = SpectrumObject(sampleName, spectrumName, 0, 0, date,
-                              Path(f).stem,
-                              dataType=dataType, numPoints=numPoints, pStart=0, pEnd=0,
-                              fileType=fileType)
-    spectrum.filePath = os.path.relpath(f, start=os.curdir)
-    spectrum.inFileNum = 1
-    spectrum.xValues = []
-    spectrum.yValues = []
-    minX = 10000000
-    maxX = -10000000
-    for line in lines:
-        lineStr = str(line.decode("utf-8")).replace(",", ".")
-        values = [float(strVal) for strVal in lineStr.split()]
-        if len(values) < 2:
-            continue
-        if values[0] < minX:
-            minX = values[0]
-        if values[0] > maxX:
-            maxX = values[0]
-        spectrum.xValues.append(values[0])
-        spectrum.yValues.append(values[1])
-    spectrum.pStart = minX
-    spectrum.pEnd = maxX
-    spectrum.temperature = 0
-    spectra.append(spectrum)
-    return spectra
+    return readMultipleColText(f, fileType, [dataType])
 
 
 def saveExperimentFiles(spectra, fileType, q_widget):
@@ -326,13 +311,13 @@ def saveExperimentFiles(spectra, fileType, q_widget):
                     file.write(" Field[T] Tsmpl[K] Tcntr[K] SignalIntensity" +
                                ("   Mirror[MM]" if spectraMirror is not None else "") +
                                "\n")
-                    for i in range(len(spectraSignal.xValues)):
-                        file.write(" " + f"{spectraSignal.xValues[i]:.5f}" +
-                                   "    " + f"{spectraSignal.temperature:.2f}" +
-                                   "     " + f"{spectraSignal.temperature:.2f}" +
-                                   "   " + f"{spectraSignal.yValues[i]:.5f}" +
-                                   ("  " + f"{spectraMirror.yValues[i]:.4f}" if spectraMirror is not None else "") +
-                                   "\n")
+                    temperature = np.full(len(spectraSignal.xValues), spectraSignal.temperature)
+                    columns = [spectraSignal.xValues, temperature, temperature, spectraSignal.yValues]
+                    fmt = " %.5f    %.2f     %.2f   %.5f"
+                    if spectraMirror is not None:
+                        columns.append(spectraMirror.yValues)
+                        fmt += "  %.4f"
+                    np.savetxt(file, np.column_stack(columns), fmt=fmt)
                     file.close()
             if spectraSignal.dataType == DataTypes.Trf:
                 p = Path(filePath)
@@ -361,6 +346,9 @@ def saveExperimentFiles(spectra, fileType, q_widget):
                 stem = p.stem
                 ext = p.suffix
                 fileBytes = bytearray()
+                # the points of a lazily read file are read before it is rewritten, it is kept if they are not read
+                if not all([spectrum.loadValues() for spectrum in spectra]):
+                    return
                 with open(str(parent) + "\\" + str(stem) + str(ext), 'wb') as file:
                     fileBytes.append(10)  # byte. first step
                     for spectrum in spectra:
@@ -376,8 +364,7 @@ def saveExperimentFiles(spectra, fileType, q_widget):
                         # fileBytes.append(len(spectrum.date))  # byte. date length
                         fileBytes.extend(bytes(spectrum.date, 'UTF-8'))  # string. date
                         fileBytes.extend(bytearray(14 - len(spectrum.date)))  # bytes. date empty space
-                        for xValue in spectrum.xValues:
-                            fileBytes.extend(bytearray(struct.pack("f", xValue)))  # float. Frequency
+                        fileBytes.extend(np.asarray(spectrum.xValues, dtype=DAT_FLOAT).tobytes())  # floats. Frequencies
                         fileBytes.append(2)  # byte
                         if spectrum.dataType == DataTypes.Trf:
                             hd = "tr"
@@ -390,8 +377,7 @@ def saveExperimentFiles(spectra, fileType, q_widget):
                         fileBytes.extend(bytearray(14 - len(spectrum.sampleName)))  # bytes. sampleName empty space
                         fileBytes.extend(bytearray(struct.pack("f", spectrum.temperature)))  # float. temperature
                         fileBytes.extend(bytearray(struct.pack("f", spectrum.thickness)))  # float. thickness
-                        for yValue in spectrum.yValues:
-                            fileBytes.extend(bytearray(struct.pack("f", yValue)))  # float. Tr or Ph
+                        fileBytes.extend(np.asarray(spectrum.yValues, dtype=DAT_FLOAT).tobytes())  # floats. Tr or Ph
 
                     file.write(fileBytes)
                     file.close()
@@ -401,47 +387,197 @@ def saveExperimentFiles(spectra, fileType, q_widget):
 def saveTheory(theory, directory, tables):
     if len(directory) == 0:
         return
-    with open(directory + "/" + theory.listItem.text() + ".theory", 'wb') as file:
-        for table in tables:
-            table.onSaveAll()
-
-        parameters = []
-        for parameter in theory.parameters:
-            parameters.append(parameter.value)
-        models = []
-        for model in theory.models:
-            modelParameters = []
-            for parameter in model.parameters:
-                modelParameters.append(parameter.value)
-            models.append({"name": model.name, "text": model.listItem.text(), "parameters": modelParameters})
-        experiments = []
-        for table in tables:
-            for spectra in table.selectedPlotsBySpectra:
-                experiments.append({"filePath": spectra.filePath, "inFileNum": spectra.inFileNum})
-        theoryObject = {"name": theory.name, "parameters": parameters, "models": models, "experiments": experiments}
-        pickle.dump(theoryObject, file)
+    for table in tables:
+        table.onSaveAll()
+    experiments = []
+    for table in tables:
+        for spectra in table.selectedPlotsBySpectra:
+            experiments.append({"filePath": spectra.filePath, "inFileNum": spectra.inFileNum})
+    writeTheory(theory, directory + "/" + theory.listItem.text() + ".theory", experiments)
+
+
+# .theory files are JSON: parameters by attribute name, the free parameters of the fit, the experiments
+# and the curves calculated for the saved values. Files of the first format (pickled lists of values by
+# position) are read and converted.
+THEORY_FORMAT = "tscalc theory"
+THEORY_VERSION = 2
+PICKLE_BUILTINS = {"set", "frozenset", "complex"}  # the first format holds lists, tuples, numbers and strings
+
+
+# files of the first format are unpickled without creating objects of other classes, no code of the file is run
+class TheoryUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module == "builtins" and name in PICKLE_BUILTINS:
+            return super(TheoryUnpickler, self).find_class(module, name)
+        raise pickle.UnpicklingError(module + "." + name + " is not allowed in a theory file")
+
+
+def readFirstFormat(data):
+    try:
+        return TheoryUnpickler(io.BytesIO(data)).load()
+    except Exception:  # damaged, empty or not a theory file
+        raise ValueError("not a theory file")
+
+
+# attribute names of the parameters of a theory or a model
+def parameterNames(owner, parameters):
+    names = {id(value): key for key, value in vars(owner).items()}
+    return [names.get(id(parameter), "#" + str(i)) for i, parameter in enumerate(parameters)]
+
+
+def parametersToDict(owner, parameters):
+    values = {}
+    fitBounds = {}
+    for name, parameter in zip(parameterNames(owner, parameters), parameters):
+        values[name] = parameter.value
+        if parameter.fitBounds is not None:
+            fitBounds[name] = list(parameter.fitBounds)
+    return values, fitBounds
+
+
+def theoryToDict(theory, experiments):
+    parameters, fitBounds = parametersToDict(theory, theory.parameters)
+    models = []
+    for model in theory.models:
+        modelParameters, modelBounds = parametersToDict(model, model.parameters)
+        text = model.listItem.text() if model.listItem is not None else model.text
+        models.append({"name": model.name, "text": text, "parameters": modelParameters, "fitBounds": modelBounds})
+    curves = []
+    if theory.task is None:  # no update pending, the curves are of the saved values
+        for curve in theory.curves:
+            if curve.x is not None and curve.y is not None:
+                curves.append({"dataType": curve.dataType, "comment": curve.comment,
+                               "x": np.asarray(curve.x, dtype=np.float64).tolist(),
+                               "y": np.asarray(curve.y, dtype=np.float64).tolist()})
+    return {"format": THEORY_FORMAT, "version": THEORY_VERSION, "name": theory.name, "parameters": parameters,
+            "resolution": theory.getResolution(), "fitBounds": fitBounds, "models": models,
+            "experiments": experiments, "curves": curves}
+
+
+def writeTheory(theory, filePath, experiments):
+    with open(filePath, 'w', encoding="utf-8") as file:
+        json.dump(theoryToDict(theory, experiments), file)
+
+
+# theory dict of the first format to the current one, names are taken from a new theory of the same type
+def upgradeTheoryDict(oldDict):
+    if not isinstance(oldDict, dict) or oldDict.get("name") not in TheoryType.types:
+        raise ValueError("unknown theory " + str(oldDict.get("name") if isinstance(oldDict, dict) else oldDict))
+    try:
+        theory = TheoryType.types[oldDict["name"]]()
+        fitBounds = oldDict.get("fitBounds", {"parameters": [], "models": []})
+        names = parameterNames(theory, theory.parameters)
+        theoryDict = {"format": THEORY_FORMAT, "version": THEORY_VERSION, "name": oldDict["name"],
+                      "parameters": dict(zip(names, oldDict["parameters"])),
+                      "resolution": oldDict.get("resolution", {}),
+                      "fitBounds": {name: bounds for name, bounds in zip(names, fitBounds["parameters"])
+                                    if bounds is not None},
+                      "models": [], "experiments": oldDict["experiments"], "curves": []}
+        modelsBounds = fitBounds["models"] + [[]] * len(oldDict["models"])
+        for modelDict, modelBounds in zip(oldDict["models"], modelsBounds):
+            model = Model(modelDict["name"])
+            names = parameterNames(model, model.parameters)
+            theoryDict["models"].append({"name": modelDict["name"], "text": modelDict["text"],
+                                         "parameters": dict(zip(names, modelDict["parameters"])),
+                                         "fitBounds": {name: bounds for name, bounds in zip(names, modelBounds)
+                                                       if bounds is not None}})
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError("corrupted theory file of the first format: " + repr(e))
+    return theoryDict
+
+
+def checkNamedValues(owner):
+    if not isinstance(owner, dict):
+        raise ValueError("models must be mappings")
+    for key in ["parameters", "fitBounds"]:
+        values = owner.get(key, {})
+        if not isinstance(values, dict) or not all(isinstance(name, str) for name in values):
+            raise ValueError(key + " must be a mapping by name")
+    if not all(isinstance(value, numbers.Real) for value in owner.get("parameters", {}).values()):
+        raise ValueError("parameter values must be numbers")
+    for bounds in owner.get("fitBounds", {}).values():
+        if not isinstance(bounds, (list, tuple)) or len(bounds) != 2 or \
+                not all(bound is None or isinstance(bound, numbers.Real) for bound in bounds):
+            raise ValueError("fit bounds must be [lower, upper]")
+
+
+def checkTheoryDict(theoryDict):
+    if not isinstance(theoryDict, dict) or theoryDict.get("format") != THEORY_FORMAT:
+        raise ValueError("not a theory file")
+    if not isinstance(theoryDict.get("version"), int) or theoryDict["version"] > THEORY_VERSION:
+        raise ValueError("theory file version " + str(theoryDict.get("version")) + " is not supported")
+    if theoryDict.get("name") not in TheoryType.types:
+        raise ValueError("unknown theory " + str(theoryDict.get("name")))
+    for key in ["models", "experiments", "curves"]:
+        if not isinstance(theoryDict.get(key, []), list):
+            raise ValueError(key + " must be a list")
+    resolution = theoryDict.get("resolution", {})
+    if not isinstance(resolution, dict) or not all(isinstance(name, str) for name in resolution):
+        raise ValueError("resolution must be a mapping by name")
+    if not all(isinstance(value, numbers.Real) and math.isfinite(value) for value in resolution.values()):
+        raise ValueError("resolution values must be numbers")
+    checkNamedValues(theoryDict)
+    for modelDict in theoryDict.get("models", []):
+        checkNamedValues(modelDict)
+        if not isinstance(modelDict.get("name"), str):
+            raise ValueError("model without a name")
+    for experiment in theoryDict.get("experiments", []):
+        if not isinstance(experiment, dict) or not all(key in experiment for key in ["filePath", "inFileNum"]):
+            raise ValueError("experiments must have filePath and inFileNum")
+    for curveDict in theoryDict.get("curves", []):
+        if not isinstance(curveDict, dict) or not all(key in curveDict for key in ["dataType", "comment", "x", "y"]):
+            raise ValueError("curves must have dataType, comment, x and y")
+        if not all(isinstance(curveDict[key], list) and all(isinstance(value, numbers.Real) for value in curveDict[key])
+                   for key in ["x", "y"]):
+            raise ValueError("curve points must be lists of numbers")
+        if len(curveDict["x"]) != len(curveDict["y"]):
+            raise ValueError("curve x and y must be of the same length")
+
+
+# parameters missing in the file keep their default values, unknown names are skipped
+def setParameters(owner, parameters, values, fitBounds):
+    for name, parameter in zip(parameterNames(owner, parameters), parameters):
+        if name in values:
+            parameter.setValue(values[name])
+        parameter.fitBounds = tuple(fitBounds[name]) if name in fitBounds else None
+    unknown = set(values) - set(parameterNames(owner, parameters))
+    if unknown:
+        print("theory file: unknown parameters skipped: " + ", ".join(sorted(unknown)))
+
+
+def theoryFromDict(theoryDict):
+    if isinstance(theoryDict, dict) and "version" not in theoryDict:
+        theoryDict = upgradeTheoryDict(theoryDict)
+    checkTheoryDict(theoryDict)
+    theory = TheoryType.types[theoryDict["name"]]()
+    setParameters(theory, theory.parameters, theoryDict.get("parameters", {}), theoryDict.get("fitBounds", {}))
+    theory.setResolution(theoryDict.get("resolution", {}))
+    for modelDict in theoryDict.get("models", []):
+        model = Model(modelDict["name"])
+        model.text = modelDict.get("text", modelDict["name"])
+        setParameters(model, model.parameters, modelDict.get("parameters", {}), modelDict.get("fitBounds", {}))
+        theory.models.append(model)
+    for curveDict in theoryDict.get("curves", []):  # shown until the theory is calculated again
+        theory.updateCurvePoints(np.array(curveDict["x"], dtype=np.float64),
+                                 np.array(curveDict["y"], dtype=np.float64),
+                                 curveDict["dataType"], curveDict["comment"])
+    experiments = []
+    for experiment in theoryDict.get("experiments", []):
+        experiments.append({"filePath": experiment["filePath"], "inFileNum": experiment["inFileNum"]})
+    return theory, experiments
 
 
 def loadTheory(filePath):
     if Path(filePath).is_file():
         with open(filePath, 'rb') as file:
-            theoryDict = pickle.load(file)
-            theory = TheoryType.types[theoryDict["name"]]()
-            theory.directory = os.path.relpath(os.path.dirname(filePath), start=os.curdir)
-            theory.text = Path(filePath).stem
-            for i in range(len(theoryDict["parameters"])):
-                theory.parameters[i].value = theoryDict["parameters"][i]
-                theory.parameters[i].numberEdit.resetValue(theory.parameters[i].value)
-            for modelDict in theoryDict["models"]:
-                model = Model(modelDict["name"])
-                model.text = modelDict["text"]
-                for i in range(len(modelDict["parameters"])):
-                    model.parameters[i].value = modelDict["parameters"][i]
-                    model.parameters[i].numberEdit.resetValue(model.parameters[i].value)
-                theory.models.append(model)
-            experiments = []
-            for experiment in theoryDict["experiments"]:
-                experiments.append({"filePath": experiment["filePath"], "inFileNum": experiment["inFileNum"]})
-            return theory, experiments
+            data = file.read()
+        if data.lstrip()[:1] == b"{":
+            theoryDict = json.loads(data)
+        else:
+            theoryDict = readFirstFormat(data)  # first format
+        theory, experiments = theoryFromDict(theoryDict)
+        theory.directory = os.path.relpath(os.path.dirname(filePath), start=os.curdir)
+        theory.text = Path(filePath).stem
+        return theory, experiments
     else:
         return None
@@ -0,0 +1,146 @@
+import math
+import numpy as np
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QCheckBox, QLineEdit, \
+    QPushButton, QWidget, QScrollArea
+from PyQt5.QtCore import pyqtSlot
+from PyQt5.QtGui import QFont
+from theoryFit import TheoryFit, FitParameter, selectedFitData
+from theoryTask import FitTask
+
+
+class FitDialog(QDialog):
+    # free parameters with bounds of a theory, fitted to the spectra selected in the experiment tables
+    def __init__(self, theory, tables, plotByType, parent=None):
+        super(FitDialog, self).__init__(parent)
+        self.theory = theory
+        self.tables = tables
+        self.plotByType = plotByType
+        self.task = None
+        self.rows = []
+
+        self.setWindowTitle("Fit: " + theory.text)
+        self.setModal(True)
+        layout = QVBoxLayout(self)
+
+        parametersContainer = QWidget()
+        grid = QGridLayout(parametersContainer)
+        for col, text in enumerate(["Fit", "Parameter", "Value", "Min", "Max", "Error"]):
+            grid.addWidget(QLabel(text), 0, col)
+        parameters = [("", parameter) for parameter in theory.parameters]
+        for model in theory.models:
+            parameters += [(model.text + ": ", parameter) for parameter in model.parameters]
+        for row, (prefix, parameter) in enumerate(parameters, 1):
+            checkBox = QCheckBox()
+            checkBox.setChecked(parameter.fitBounds is not None)
+            label = QLabel(prefix + parameter.name + (", " if len(parameter.unit) > 0 else "") + parameter.unit)
+            label.setFont(QFont('Times new roman', 12))
+            valueLabel = QLabel(f"{parameter.value:.8f}")
+            lower, upper = parameter.fitBounds if parameter.fitBounds is not None else (-math.inf, math.inf)
+            lowerEdit = QLineEdit("" if math.isinf(lower) else str(lower))
+            upperEdit = QLineEdit("" if math.isinf(upper) else str(upper))
+            lowerEdit.setPlaceholderText("-inf")
+            upperEdit.setPlaceholderText("inf")
+            errorLabel = QLabel("")
+            for col, w in enumerate([checkBox, label, valueLabel, lowerEdit, upperEdit, errorLabel]):
+                grid.addWidget(w, row, col)
+            self.rows.append((parameter, prefix, checkBox, valueLabel, lowerEdit, upperEdit, errorLabel))
+        grid.setRowStretch(grid.rowCount(), 1)
+        scrollArea = QScrollArea()
+        scrollArea.setWidget(parametersContainer)
+        scrollArea.setWidgetResizable(True)
+        layout.addWidget(scrollArea)
+
+        self.statusLabel = QLabel("")
+        layout.addWidget(self.statusLabel)
+
+        buttonsLayout = QHBoxLayout()
+        self.fitButton = QPushButton("Fit")
+        self.fitButton.clicked.connect(self.onFit)
+        buttonsLayout.addWidget(self.fitButton)
+        self.stopButton = QPushButton("Stop")
+        self.stopButton.setEnabled(False)
+        self.stopButton.clicked.connect(self.onStop)
+        buttonsLayout.addWidget(self.stopButton)
+        closeButton = QPushButton("Close")
+        closeButton.clicked.connect(self.reject)
+        buttonsLayout.addWidget(closeButton)
+        layout.addLayout(buttonsLayout)
+
+        self.resize(800, 600)
+
+    @staticmethod
+    def readBound(lineEdit, default):
+        try:
+            return float(lineEdit.text())
+        except ValueError:
+            return default
+
+    @pyqtSlot()
+    def onFit(self):
+        fitParameters = []
+        for parameter, prefix, checkBox, valueLabel, lowerEdit, upperEdit, errorLabel in self.rows:
+            errorLabel.setText("")
+            if checkBox.isChecked():
+                parameter.fitBounds = (self.readBound(lowerEdit, -math.inf), self.readBound(upperEdit, math.inf))
+                fitParameters.append(FitParameter(parameter, *parameter.fitBounds, text=prefix + parameter.name))
+            else:
+                parameter.fitBounds = None
+        if len(fitParameters) == 0:
+            self.statusLabel.setText("No free parameters")
+            return
+        if any(p.lower >= p.upper for p in fitParameters):
+            self.statusLabel.setText("Min must be less than max")
+            return
+        data = selectedFitData(self.tables, self.plotByType)
+        if len(data) == 0:
+            self.statusLabel.setText("Select experimental spectra to fit")
+            return
+
+        self.fitParameters = fitParameters
+        self.task = FitTask(TheoryFit(self.theory, fitParameters, data))
+        self.task.signals.progress.connect(self.onProgress)
+        self.task.signals.finished.connect(self.onFinished)
+        self.fitButton.setEnabled(False)
+        self.stopButton.setEnabled(True)
+        self.statusLabel.setText("Fitting " + str(len(data)) + " spectra...")
+        self.task.start()
+
+    @pyqtSlot()
+    def onStop(self):
+        if self.task is not None:
+            self.task.fit.stopped = True
+
+    def showValues(self, values):
+        for fitParameter, value in zip(self.fitParameters, values):
+            for row in self.rows:
+                if row[0] is fitParameter.parameter:
+                    row[3].setText(f"{value:.8f}")
+
+    def onProgress(self, values, cost, data):
+        self.theory.plotCurves(data)
+        self.showValues(values)
+        self.statusLabel.setText(f"Evaluations: {self.task.fit.evaluations}, cost: {cost:.6g}")
+
+    def onFinished(self, result, message):
+        fit = self.task.fit
+        self.task = None
+        self.showValues(fit.values())
+        for fitParameter in self.fitParameters:
+            fitParameter.parameter.setValue(fitParameter.parameter.value)
+        self.theory.requestUpdate()  # replots the best fit
+        if result is not None and result.errors is not None:
+            for fitParameter, error in zip(self.fitParameters, result.errors):
+                for row in self.rows:
+                    if row[0] is fitParameter.parameter:
+                        row[6].setText(f"± {error:.3g}")
+        cost = "" if not np.isfinite(fit.bestCost) else f", cost: {fit.bestCost:.6g}"
+        self.statusLabel.setText(f"Evaluations: {fit.evaluations}{cost}. {message}")
+        self.fitButton.setEnabled(True)
+        self.stopButton.setEnabled(False)
+
+    def reject(self):
+        if self.task is not None:
+            self.task.fit.stopped = True
+            self.task.signals.finished.connect(self.reject)  # closed when the fit stops
+            return
+        super(FitDialog, self).reject()
@@ -0,0 +1,62 @@
+from pathlib import Path
+from PyQt5.QtCore import pyqtSignal, QObject, QRunnable, QThreadPool
+from fileManager import readSpectraFile
+from ascManager import parse_asc_data
+
+IMPORT_THREADS = 4  # files read at once, the tables are added in the GUI thread as the files are read
+
+threadPool = None
+
+
+def getThreadPool():
+    global threadPool
+    if threadPool is None:
+        threadPool = QThreadPool()
+        threadPool.setMaxThreadCount(IMPORT_THREADS)
+    return threadPool
+
+
+class ImportTaskSignals(QObject):
+    loaded = pyqtSignal(str, object)  # file path, spectra
+    failed = pyqtSignal(str, str)  # file path, message
+
+
+class ImportTask(QRunnable):
+    # one dropped experiment file, errors are reported per file
+    def __init__(self, filePath):
+        super(ImportTask, self).__init__()
+        self.filePath = filePath
+        self.signals = ImportTaskSignals()
+
+    def run(self):
+        try:
+            spectra = readSpectraFile(self.filePath)
+        except Exception as e:
+            self.signals.failed.emit(self.filePath, repr(e))
+            return
+        if not spectra:
+            self.signals.failed.emit(self.filePath, "no spectra in " + Path(self.filePath).name)
+            return
+        self.signals.loaded.emit(self.filePath, spectra)
+
+    def start(self):
+        self.setAutoDelete(False)
+        getThreadPool().start(self)
+
+
+class PasteTask(ImportTask):
+    # TPSCalc spectra pasted from the clipboard, parsed in the import pool
+    def __init__(self, text):
+        super(PasteTask, self).__init__("Clipboard")
+        self.text = text
+
+    def run(self):
+        try:
+            spectra = parse_asc_data(self.text)
+        except Exception as e:
+            self.signals.failed.emit(self.filePath, repr(e))
+            return
+        if not spectra:
+            self.signals.failed.emit(self.filePath, "no spectra in the clipboard")
+            return
+        self.signals.loaded.emit(self.filePath, spectra)
@@ -50,15 +50,13 @@ class ModelsListWidget(QListWidget):
         model.text = model.name + " #" + str(num)
         model.listItem = QListWidgetItem(model.text)
         self.addItem(model.listItem)
-        self.theory.update()
-        self.theory.plotCurves()
+        self.theory.requestUpdate()
         for parameter in model.parameters:
             parameter.numberEdit.signalUpdateNumber.connect(self.updateNumber)
 
     @pyqtSlot(float)
     def updateNumber(self, num):
-        self.theory.update()
-        self.theory.plotCurves()
+        self.theory.requestUpdate()
 
     def getModelByListItem(self, listItem):
         for model in self.theory.models:
@@ -78,11 +76,11 @@ class ModelsListWidget(QListWidget):
     def onRemoveAll(self):
         for model in self.theory.models:
             for parameter in model.parameters:
-                parameter.widget.deleteLater()
+                if parameter.binding is not None:
+                    parameter.widget.deleteLater()
         self.clear()
         self.theory.models.clear()
-        self.theory.update()
-        self.theory.plotCurves()
+        self.theory.requestUpdate()
 
     @pyqtSlot()
     def onRemoveSelected(self):
@@ -91,8 +89,7 @@ class ModelsListWidget(QListWidget):
             model = self.getModelByListItem(listItem)
             self.theory.models.remove(model)
             self.takeItem(self.row(listItem))
-            self.theory.update()
-            self.theory.plotCurves()
+            self.theory.requestUpdate()
 
     @pyqtSlot()
     def itemSelected(self):
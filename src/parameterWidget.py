@@ -0,0 +1,46 @@
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QComboBox
+from PyQt5.QtGui import QFont
+from numberLineEdit import NumberLineEdit
+
+
+# label and number editor of a theory or model parameter, the edited value is passed to the parameter,
+# a parameter with choices is edited in a combo box
+class ParameterWidget:
+    def __init__(self, parameter):
+        self.parameter = parameter
+        w = QWidget()
+        hBoxLayout = QHBoxLayout(w)
+        hBoxLayout.setContentsMargins(0, 0, 0, 0)
+        label = QLabel(parameter.name + (", " if len(parameter.unit) > 0 else "") + parameter.unit)
+        label.setFont(QFont('Times new roman', 12))
+        label.setStyleSheet("color: #000000;" if parameter.isMain else "color: #888888;")
+        hBoxLayout.addWidget(label)
+        self.numberEdit = None
+        self.choiceBox = None
+        if parameter.choices is not None:
+            choiceBox = QComboBox()
+            choiceBox.setMaximumWidth(180)
+            for value, text in parameter.choices.items():
+                choiceBox.addItem(text, value)
+            choiceBox.setCurrentIndex(choiceBox.findData(parameter.value))
+            hBoxLayout.addWidget(choiceBox)
+            self.choiceBox = choiceBox
+            self.choiceBox.currentIndexChanged.connect(self.onChoiceChanged)
+        else:
+            numberEdit = NumberLineEdit()
+            numberEdit.multiplier = parameter.multiplier
+            numberEdit.resetValue(parameter.value)
+            hBoxLayout.addWidget(numberEdit)
+            self.numberEdit = numberEdit
+            self.numberEdit.signalUpdateNumber.connect(parameter.updateNumber)
+        self.widget = w
+
+    def onChoiceChanged(self, index):
+        self.parameter.updateNumber(self.choiceBox.itemData(index))
+
+    # value set by the program, passed to the listeners as an edited one
+    def resetValue(self, value):
+        if self.choiceBox is not None:
+            self.choiceBox.setCurrentIndex(self.choiceBox.findData(value))
+        else:
+            self.numberEdit.resetValue(value)
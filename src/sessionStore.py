@@ -0,0 +1,161 @@
+import os
+import json
+from functools import partial
+import numpy as np
+from spectrumObject import SpectrumObject
+from fileManager import readSpectraFile, readDatValues, theoryToDict, theoryFromDict
+
+# Workspace saved on exit and reopened on start: the points of all spectra in two flat arrays and the tables,
+# selections, theories and plot ranges as JSON in one uncompressed NPZ (no pickle). A table is read again from
+# its file if the size or the modification time of the file has changed. Spectra of lazily read files whose points
+# were not loaded keep only the position of the points in the file. Files are stored by absolute path.
+
+SESSION_FILE = "session.npz"
+SESSION_VERSION = 1
+SPECTRUM_FIELDS = ["sampleName", "spectrumName", "temperature", "thickness", "date", "fileName", "filePath",
+                   "fileType", "inFileNum", "dataType", "numPoints", "pStart", "pEnd", "color"]
+
+
+# [mtime in ns, size] of a file or None if there is no file
+def fileStamp(filePath):
+    try:
+        stat = os.stat(filePath)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+# readDatValues arguments of a spectrum whose points are not loaded yet or None
+def lazyValues(spectrum):
+    loader = spectrum.valuesLoader
+    if isinstance(loader, partial) and loader.func is readDatValues:
+        return list(loader.args)
+    return None
+
+
+def absolutePath(filePath):
+    return os.path.abspath(filePath) if filePath else ""
+
+
+# path relative to the working directory as the files read by fileManager have
+def relativePath(filePath):
+    if not filePath:
+        return ""
+    try:
+        return os.path.relpath(filePath, start=os.curdir)
+    except ValueError:  # other drive
+        return filePath
+
+
+def saveSession(sessionPath, tables, theories, plotByType):
+    xParts = []
+    yParts = []
+    spectraMeta = []
+    tablesMeta = []
+    empty = np.empty(0, dtype=np.float64)
+    for table in tables:
+        sources = sorted({absolutePath(spectrum.filePath) for spectrum in table.spectra if spectrum.filePath})
+        tablesMeta.append({"experimentName": table.experimentName, "fileType": table.fileType,
+                           "sources": [[source, fileStamp(source)] for source in sources],
+                           "first": len(spectraMeta), "count": len(table.spectra),
+                           "selected": [row for row, spectrum in enumerate(table.spectra)
+                                        if spectrum in table.selectedPlotsBySpectra]})
+        for spectrum in table.spectra:
+            meta = {field: getattr(spectrum, field) for field in SPECTRUM_FIELDS}
+            meta["filePath"] = absolutePath(spectrum.filePath)
+            meta["lazy"] = lazyValues(spectrum)
+            if meta["lazy"] is None:
+                meta["dtype"] = spectrum.xValues.dtype.str
+                xParts.append(spectrum.xValues)
+                yParts.append(spectrum.yValues)
+            else:  # not read on exit, the file is unchanged if the table is restored from the session
+                meta["dtype"] = np.dtype(np.float32).str
+                xParts.append(empty)
+                yParts.append(empty)
+            spectraMeta.append(meta)
+    theoriesMeta = []
+    for theory in theories:
+        theoryDict = theoryToDict(theory, [])
+        theoryDict["text"] = theory.listItem.text() if theory.listItem is not None else theory.text
+        theoryDict["directory"] = theory.directory
+        theoriesMeta.append(theoryDict)
+    session = {"version": SESSION_VERSION, "tables": tablesMeta, "spectra": spectraMeta, "theories": theoriesMeta,
+               "selectionRanges": {dataType: plot.selectionRange for dataType, plot in plotByType.items()
+                                   if None not in plot.selectionRange}}
+
+    offsets = np.cumsum([0] + [len(x) for x in xParts], dtype=np.int64)
+    tmpPath = sessionPath + ".tmp"
+    with open(tmpPath, "wb") as file:  # replaced at once, a failed save keeps the previous session
+        np.savez(file, session=np.array(json.dumps(session, default=float)), offsets=offsets,
+                 xValues=np.concatenate(xParts, dtype=np.float64) if xParts else empty,
+                 yValues=np.concatenate(yParts, dtype=np.float64) if yParts else empty)
+    os.replace(tmpPath, sessionPath)
+
+
+# (tables, theories, selection ranges by data type) or None if there is no session,
+# tables are (experiment name, file type, spectra, selected rows, source files)
+def loadSession(sessionPath):
+    if not os.path.isfile(sessionPath):
+        return None
+    with np.load(sessionPath, allow_pickle=False) as data:
+        session = json.loads(data["session"].item())
+        if session.get("version") != SESSION_VERSION:
+            return None
+        offsets = data["offsets"]
+        xValues = data["xValues"]
+        yValues = data["yValues"]
+
+    tables = []
+    for tableMeta in session["tables"]:
+        first = tableMeta["first"]
+        spectraMeta = session["spectra"][first:first + tableMeta["count"]]
+        sources = [os.path.abspath(source) for source, stamp in tableMeta["sources"]]
+        if all(fileStamp(source) == stamp for source, (_, stamp) in zip(sources, tableMeta["sources"])):
+            spectra = []
+            for i, meta in enumerate(spectraMeta, first):
+                spectrum = SpectrumObject(meta["sampleName"], meta["spectrumName"], meta["temperature"],
+                                          meta["thickness"], meta["date"])
+                for field in SPECTRUM_FIELDS:
+                    setattr(spectrum, field, meta[field])
+                spectrum.filePath = relativePath(meta["filePath"])
+                if meta.get("lazy") is not None:
+                    spectrum.valuesLoader = partial(readDatValues, *meta["lazy"])
+                else:
+                    dtype = np.dtype(meta["dtype"])
+                    spectrum.xValues = xValues[offsets[i]:offsets[i + 1]].astype(dtype)
+                    spectrum.yValues = yValues[offsets[i]:offsets[i + 1]].astype(dtype)
+                spectra.append(spectrum)
+            selected = tableMeta["selected"]
+        else:
+            try:  # changed files are read again, the selection is kept by the position in the file
+                spectra = []
+                for source in sources:
+                    spectra += readSpectraFile(source)
+            except Exception as e:
+                print("session: " + tableMeta["experimentName"] + " skipped: " + repr(e))
+                continue
+            if len(spectra) == 0:
+                continue
+            colors = {}
+            for row in tableMeta["selected"]:
+                meta = spectraMeta[row]
+                colors[(absolutePath(meta["filePath"]), meta["inFileNum"], meta["dataType"])] = meta["color"]
+            selected = []
+            for row, spectrum in enumerate(spectra):
+                key = (absolutePath(spectrum.filePath), spectrum.inFileNum, spectrum.dataType)
+                if key in colors:
+                    spectrum.color = colors[key]
+                    selected.append(row)
+        tables.append((tableMeta["experimentName"], tableMeta["fileType"], spectra, selected, sources))
+
+    theories = []
+    for theoryDict in session["theories"]:
+        try:
+            theory, experiments = theoryFromDict(theoryDict)
+        except Exception as e:
+            print("session: theory " + str(theoryDict.get("text")) + " skipped: " + repr(e))
+            continue
+        theory.text = theoryDict["text"]
+        theory.directory = theoryDict["directory"]
+        theories.append(theory)
+    return tables, theories, session["selectionRanges"]
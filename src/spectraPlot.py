@@ -3,7 +3,7 @@ from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QPoint
 from PyQt5.QtWidgets import QPushButton, QLabel, QAction, QWidget, QHBoxLayout
 import pyqtgraph as pg
 from pyqtgraph import ScatterPlotItem
-from dataTypes import DataTypes, getDataTypeAttributes
+from dataTypes import DataTypes, getDataTypeAttributes, plotValues
 from screenSettings import screenSize
 
 import numpy as np
@@ -115,21 +115,7 @@ class SpectraPlot(QWidget):
 
     def plot(self, spectrum):
         plotName = spectrum.spectrumName + ", " + spectrum.sampleName + ", " + str(spectrum.temperature) + " K"
-        if self.dataType == DataTypes.Trf:
-            xValues = spectrum.xValues
-            yValues = spectrum.yValues
-        elif self.dataType == DataTypes.Phf:
-            xValues = spectrum.xValues
-            yValues = [spectrum.yValues[i] / spectrum.xValues[i] for i in range(spectrum.numPoints)]
-        elif self.dataType == DataTypes.SignalH:
-            xValues = [spectrum.xValues[i] * 1e4 for i in range(spectrum.numPoints)]
-            yValues = spectrum.yValues
-        elif self.dataType == DataTypes.MirrorH:
-            xValues = [spectrum.xValues[i] * 1e4 for i in range(spectrum.numPoints)]
-            yValues = [-spectrum.yValues[i] for i in range(spectrum.numPoints)]
-        else:
-            xValues = spectrum.xValues
-            yValues = spectrum.yValues
+        xValues, yValues = plotValues(self.dataType, spectrum.xValues, spectrum.yValues)
 
         plotDataItem = self.plotWidget.plot(xValues, yValues,
                                             name=plotName, pen=None,
@@ -1,5 +1,3 @@
-import array
-
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtGui import QColor, QFont
 from PyQt5.QtCore import QObject, pyqtSignal, Qt, pyqtSlot
@@ -9,7 +7,7 @@ from PyQt5.QtWidgets import QTableView, QStyledItemDelegate, QMenu, \
 from numberLineEdit import NumberLineEdit
 from fileManager import FileManager, getFileType, saveExperimentFiles
 import clipboard
-from dataTypes import DataTypes
+from dataTypes import DataTypes, plotValues
 
 import numpy as np
 
@@ -76,18 +74,7 @@ class SpectraTable(QWidget):
             spectrum = self.currentSelectedSpectrum
             if spectrum and spectrum in self.selectedPlotsBySpectra:
                 newXValues, newYValues = self.getRangeCorrectionValues(spectrum)
-                if spectrum.dataType == DataTypes.Trf:
-                    xValues = newXValues
-                    yValues = newYValues
-                elif spectrum.dataType == DataTypes.Phf:
-                    xValues = newXValues
-                    yValues = [newYValues[i] / spectrum.xValues[i] for i in range(spectrum.numPoints)]
-                elif spectrum.dataType == DataTypes.SignalH:
-                    xValues = [newXValues[i] * 1e4 for i in range(spectrum.numPoints)]
-                    yValues = newYValues
-                elif spectrum.dataType == DataTypes.MirrorH:
-                    xValues = [newXValues[i] * 1e4 for i in range(spectrum.numPoints)]
-                    yValues = [-newYValues[i] for i in range(spectrum.numPoints)]
+                xValues, yValues = plotValues(spectrum.dataType, newXValues, newYValues)
                 # if spectrum in self.selectedPlotsBySpectra:
                 self.selectedPlotsBySpectra[spectrum].setData(xValues, yValues)
                 spectrum.plot.plotSelectionRange()
@@ -198,18 +185,17 @@ class SpectraTable(QWidget):
             self.signalCellClick.emit(logicalIndex, 0)
 
     def updateCorrection(self, xValues, yValues, num):
-        newXValues = xValues[:]
-        newYValues = yValues[:]
-        for i in range(len(xValues)):
-            if self.correctionType == "Y+":
-                newYValues[i] = yValues[i] + num
-            elif self.correctionType == "Y*":
-                newYValues[i] = yValues[i] * num
-            elif self.correctionType == "Y+X*":
-                newYValues[i] = yValues[i] + xValues[i] * num
-            elif self.correctionType == "X+":
-                newXValues[i] = xValues[i] + num
-        return newXValues, newYValues
+        xValues = np.asarray(xValues)
+        yValues = np.asarray(yValues)
+        if self.correctionType == "Y+":
+            return xValues, yValues + num
+        elif self.correctionType == "Y*":
+            return xValues, yValues * num
+        elif self.correctionType == "Y+X*":
+            return xValues, yValues + xValues * num
+        elif self.correctionType == "X+":
+            return xValues + num, yValues
+        return xValues, yValues
 
     def getRangeCorrectionValues(self, spectrum):
         x, y = self.updateCorrection(spectrum.xValues, spectrum.yValues, self.numberEdit.value)
@@ -287,11 +273,9 @@ class SpectraTable(QWidget):
     @pyqtSlot()
     def onCopyToClipboard(self):
         if self.rightClickSpectrum:
-            spectrumStr = ""
-            for i in range(len(self.rightClickSpectrum.xValues)):
-                spectrumStr += str(self.rightClickSpectrum.xValues[i]) + "\t" + str(
-                    self.rightClickSpectrum.yValues[i]) + "\n"
-            clipboard.copy(spectrumStr)
+            xValues = self.rightClickSpectrum.xValues.tolist()
+            yValues = self.rightClickSpectrum.yValues.tolist()
+            clipboard.copy("".join(f"{x}\t{y}\n" for x, y in zip(xValues, yValues)))
 
     @pyqtSlot()
     def onCorrectionYShift(self):
@@ -1,8 +1,26 @@
-from array import array
 import numpy as np
 
 
+# points are stored as read-only contiguous float32 (binary files) or float64 (text files) arrays,
+# transforms and corrections make new arrays
+def valuesArray(values):
+    values = np.asarray(values)
+    if values.dtype != np.float32 and values.dtype != np.float64:
+        values = values.astype(np.float64)
+    values = np.ascontiguousarray(values).view()
+    values.flags.writeable = False
+    return values
+
+
+# called with (spectrum, message) when the points of a lazily read file are not read, from any thread
+loadErrorListeners = []
+
+
 class SpectrumObject:
+    __slots__ = ["sampleName", "spectrumName", "temperature", "thickness", "date", "fileName", "filePath",
+                 "fileType", "inFileNum", "dataType", "numPoints", "pStart", "pEnd", "_xValues", "_yValues",
+                 "valuesLoader", "yMultiplier", "color", "dataRow", "plot"]
+
     def __init__(self, sampleName, spectrumName, temperature, thickness, date, fileName="",
                  dataType="", numPoints=0, pStart=0, pEnd=0, fileType=""):
         self.sampleName = sampleName
@@ -21,8 +39,9 @@ class SpectrumObject:
         self.pStart = pStart
         self.pEnd = pEnd
 
-        self.xValues = array('f', [])  # frequency in cm-1 # magnetic field in Tesla
-        self.yValues = array('f', [])  # Tr(f), Ph(f), Signal(H), Mirror(H)
+        self._xValues = valuesArray(np.empty(0, dtype=np.float32))  # frequency in cm-1 # magnetic field in Tesla
+        self._yValues = self._xValues  # Tr(f), Ph(f), Signal(H), Mirror(H)
+        self.valuesLoader = None  # () -> (xValues, yValues) of the points not read with the headers
 
         self.yMultiplier = 1
 
@@ -33,6 +52,41 @@ class SpectrumObject:
 
         # self.dataPointSizes = None
 
+    # points of the lazily read files are loaded on the first access. If the file is not read, the loader is kept
+    # for the next access and the points stay empty, False is returned
+    def loadValues(self):
+        if self.valuesLoader is not None:
+            try:
+                xValues, yValues = self.valuesLoader()
+            except (OSError, ValueError) as e:
+                for listener in loadErrorListeners:
+                    listener(self, str(e))
+                return False
+            self.valuesLoader = None
+            self._xValues = valuesArray(xValues)
+            self._yValues = valuesArray(yValues)
+        return True
+
+    @property
+    def xValues(self):
+        self.loadValues()
+        return self._xValues
+
+    @xValues.setter
+    def xValues(self, values):
+        self.loadValues()
+        self._xValues = valuesArray(values)
+
+    @property
+    def yValues(self):
+        self.loadValues()
+        return self._yValues
+
+    @yValues.setter
+    def yValues(self, values):
+        self.loadValues()
+        self._yValues = valuesArray(values)
+
     # def setDataPointSizes(self, xValues, yValues):
     #     self.xValues = xValues
     #     self.yValues = yValues
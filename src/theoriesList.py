@@ -6,6 +6,7 @@ from theoryTypes import TheoryType
 from PyQt5.QtCore import pyqtSignal, pyqtSlot, QRegExp
 from modelsList import ModelsListWidget
 from fileManager import saveTheory
+from fitDialog import FitDialog
 from PyQt5.QtGui import QRegExpValidator, QColor
 
 
@@ -53,6 +54,10 @@ class TheoriesListWidget(QListWidget):
         context.addAction(actionRemoveSelected)
         actionRemoveSelected.triggered.connect(self.onRemoveSelected)
         context.addSeparator()
+        action = QAction("Fit selected...", self)
+        context.addAction(action)
+        action.triggered.connect(self.onFitSelected)
+        context.addSeparator()
         for theoryName in self.theoryTypes:
             action = QAction(theoryName, self)
             self.actions[theoryName] = action
@@ -93,17 +98,19 @@ class TheoriesListWidget(QListWidget):
     def addTheory(self, theory):
         self.theories.append(theory)
         self.addItem(theory.listItem)
-        theory.update()
         for curve in theory.curves:
             if theory.color is None:
                 color = QColor(0xFF0000)
             else:
-                color = theory.color
-            curve.plotItem = self.plotByType[curve.dataType].plotWidget.plot(curve.x,
-                                                                             curve.y,
+                color = QColor(theory.color)
+            curve.plotItem = self.plotByType[curve.dataType].plotWidget.plot([],
+                                                                             [],
                                                                              name=theory.text,
                                                                              pen=pg.mkPen(color))
             # self.plotByType[dataType].showPlotWidget()
+        if len(theory.curves) > 0 and all(curve.x is not None for curve in theory.curves):
+            theory.plotCurves()  # curves saved with the theory until it is calculated again
+        theory.requestUpdate()  # curves are plotted when calculated
         self.signalTheorySelected.emit()
 
     def contextMenuEvent(self, e):
@@ -141,8 +148,9 @@ class TheoriesListWidget(QListWidget):
     @pyqtSlot()
     def onRemoveAll(self):
         for theory in self.theories:
-            for parameter in theory.parameters:
-                parameter.widget.deleteLater()
+            for parameter in theory.parameters + theory.resolution:
+                if parameter.binding is not None:
+                    parameter.widget.deleteLater()
             for curve in theory.curves:
                 self.plotByType[curve.dataType].removePlotItem(curve.plotItem)
         self.clear()
@@ -158,6 +166,12 @@ class TheoriesListWidget(QListWidget):
             self.theories.remove(theory)
             self.takeItem(self.row(listItem))
 
+    @pyqtSlot()
+    def onFitSelected(self):
+        if len(self.selectedItems()) > 0:
+            theory = self.getTheoryByListItem(self.selectedItems()[0])
+            FitDialog(theory, self.tables, self.plotByType, self).exec_()
+
     @pyqtSlot()
     def itemSelected(self):
         if len(self.selectedItems()) > 0:
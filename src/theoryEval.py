@@ -0,0 +1,160 @@
+import os
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from fileManager import loadTheory
+from theoryModels import TheoryParameter
+
+# Evaluation of saved .theory files without the GUI: the curves of every theory are calculated on the saved
+# or overridden grid and written as CSV, NPZ or HDF5 (h5py is needed for HDF5 only).
+
+FORMATS = ["csv", "npz", "hdf5"]
+HDF5_FILE = "theories.h5"  # all theories of a run in one file, a group per theory
+
+
+# .theory files of the given files and directories, a file given twice is evaluated once
+def inputFiles(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(str(p) for p in Path(path).iterdir() if p.is_file() and p.suffix.upper() == ".THEORY")
+        else:
+            files.append(str(path))
+    seen = set()
+    unique = []
+    for f in files:
+        key = os.path.normcase(os.path.abspath(f))
+        if key not in seen:
+            seen.add(key)
+            unique.append(f)
+    return unique
+
+
+# names of the outputs (csv, npz files or hdf5 groups) by input file: the file stem, prefixed with the parent
+# directory name if files of the same stem are written to one place, and numbered if they still coincide
+def outputNames(files, outputDirectory=None, outputFormat="csv"):
+    def outputKey(f, name):
+        place = None if outputFormat == "hdf5" or outputDirectory is not None else os.path.abspath(os.path.dirname(f))
+        return place, os.path.normcase(name)
+
+    stems = [Path(f).stem for f in files]
+    counts = Counter(outputKey(f, stem) for f, stem in zip(files, stems))
+    names = []
+    used = set()
+    for f, stem in zip(files, stems):
+        name = stem if counts[outputKey(f, stem)] == 1 else Path(os.path.abspath(f)).parent.name + "_" + stem
+        unique = name
+        number = 1
+        while outputKey(f, unique) in used:
+            number += 1
+            unique = name + "_" + str(number)
+        used.add(outputKey(f, unique))
+        names.append(unique)
+    return names
+
+
+# "name=value" overrides of the theory parameters by attribute name, e.g. f_Start=2 or numPoints=5000
+def parseSettings(settings):
+    values = {}
+    for setting in settings:
+        name, sep, value = setting.partition("=")
+        if sep == "":
+            raise ValueError("expected name=value: " + setting)
+        values[name.strip()] = float(value)
+    return values
+
+
+# runs in a worker process, returns (file path, theory text, theory name, curves or None, message),
+# curves are (dataType, comment, x, y) in the units of the plots
+def evaluateTheoryFile(filePath, settings=None):
+    try:
+        theory, experiments = loadTheory(filePath)
+        for name, value in (settings or {}).items():
+            parameter = getattr(theory, name, None)
+            if not isinstance(parameter, TheoryParameter):
+                return filePath, theory.text, theory.name, None, "no parameter " + name
+            parameter.setValue(value)
+        theory.update()
+        curves = [(curve.dataType, curve.comment, np.asarray(curve.x, dtype=np.float64),
+                   np.asarray(curve.y, dtype=np.float64)) for curve in theory.curves if curve.x is not None]
+        message = theory.name + ", " + str(len(curves)) + " curves"
+        if getattr(theory, "quadratureError", None) is not None:
+            message += ", quadrature error ~%.1e" % theory.quadratureError
+        return filePath, theory.text, theory.name, curves, message
+    except Exception as e:
+        return filePath, None, None, None, "error: " + repr(e)
+
+
+def writeCsv(filePath, curves):
+    with open(filePath, "w", encoding="utf-8") as file:
+        file.write("dataType,comment,x,y\n")
+        for dataType, comment, x, y in curves:
+            prefix = f'"{dataType}","{comment}",'
+            file.writelines(f"{prefix}{xValue!r},{yValue!r}\n" for xValue, yValue in zip(x.tolist(), y.tolist()))
+
+
+def writeNpz(filePath, curves):
+    arrays = {"dataTypes": np.array([c[0] for c in curves]), "comments": np.array([c[1] for c in curves])}
+    for i, (dataType, comment, x, y) in enumerate(curves):
+        arrays[f"x{i}"] = x
+        arrays[f"y{i}"] = y
+    np.savez_compressed(filePath, **arrays)
+
+
+def writeHdf5Group(h5File, name, theoryName, curves):
+    if name in h5File:
+        del h5File[name]
+    group = h5File.create_group(name)
+    group.attrs["theory"] = theoryName
+    for i, (dataType, comment, x, y) in enumerate(curves):
+        dataset = group.create_dataset(f"curve{i}", data=np.stack([x, y]), compression="gzip")
+        dataset.attrs["dataType"] = dataType
+        dataset.attrs["comment"] = comment
+
+
+def evalTheories(paths, outputDirectory=None, outputFormat="csv", settings=None, workers=1, progress=print):
+    if outputFormat not in FORMATS:
+        raise ValueError("unknown format " + outputFormat)
+    files = inputFiles(paths)
+    if len(files) == 0:
+        return []
+    h5File = None
+    if outputFormat == "hdf5":
+        import h5py  # optional, HDF5 output only
+        os.makedirs(outputDirectory or os.curdir, exist_ok=True)
+        h5File = h5py.File(os.path.join(outputDirectory or os.curdir, HDF5_FILE), "a")
+    elif outputDirectory is not None:
+        os.makedirs(outputDirectory, exist_ok=True)
+    workers = max(1, min(workers, len(files)))
+    names = outputNames(files, outputDirectory, outputFormat)
+
+    results = []
+    executor = None
+    try:
+        if workers == 1:
+            evaluated = (evaluateTheoryFile(f, settings) for f in files)
+        else:
+            context = multiprocessing.get_context("spawn")  # the GUI process must not be forked
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            evaluated = executor.map(evaluateTheoryFile, files, [settings] * len(files))
+        for name, (filePath, text, theoryName, curves, message) in zip(names, evaluated):  # in the order of the files
+            if curves is not None:
+                directory = outputDirectory if outputDirectory is not None else os.path.dirname(filePath)
+                if outputFormat == "csv":
+                    writeCsv(os.path.join(directory, name + ".csv"), curves)
+                elif outputFormat == "npz":
+                    writeNpz(os.path.join(directory, name + ".npz"), curves)
+                else:
+                    writeHdf5Group(h5File, name, theoryName, curves)
+                if name != Path(filePath).stem:
+                    message += ", written as " + name
+            results.append((filePath, curves is not None, message))
+            progress(f"[{len(results)}/{len(files)}] {Path(filePath).name}: {message}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if h5File is not None:
+            h5File.close()
+    return results
@@ -7,9 +7,11 @@ import os
 import clipboard
 from PyQt5.QtGui import QRegExpValidator
 from fileManager import loadTheory
+from batchFit import BatchFitTask
 
 class TheoryFileTree(QTreeView):
     signalOpenFiles = pyqtSignal(str)
+    signalBatchFitMessage = pyqtSignal(str)
 
     def __init__(self, layout):
         super(QTreeView, self).__init__()
@@ -41,6 +43,7 @@ class TheoryFileTree(QTreeView):
         self.tree.customContextMenuRequested.connect(self.openMenu)
 
         layout.addWidget(self.tree)
+        self.batchFitTask = None
 
     @pyqtSlot(QtCore.QPoint)
     def openMenu(self, position):
@@ -52,6 +55,10 @@ class TheoryFileTree(QTreeView):
             action = QAction("Copy table of models", self)
             menu.addAction(action)
             action.triggered.connect(self.onCopyModelsTable)
+            action = QAction("Refit all theories", self)
+            action.setEnabled(self.batchFitTask is None)
+            menu.addAction(action)
+            action.triggered.connect(self.onBatchFit)
             menu.addSeparator()
             action = QAction("Show in Explorer", self)
             menu.addAction(action)
@@ -77,12 +84,35 @@ class TheoryFileTree(QTreeView):
             for f in files:
                 file = filePath + "/" + f
                 if os.path.isfile(file) and Path(file).suffix.upper() == ".THEORY":
-                    tup = loadTheory(file)
+                    try:
+                        tup = loadTheory(file)
+                    except ValueError as e:
+                        print("copy table of models: " + f + " skipped: " + str(e))
+                        continue
                     theory = tup[0]
                     modelParametersStr += self.getTheoryModelsString(theory)
                     modelParametersStr += "\n"
             clipboard.copy(modelParametersStr)
 
+    @pyqtSlot()
+    def onBatchFit(self):
+        index = self.tree.currentIndex()
+        indexItem = self.model.index(index.row(), 0, index.parent())
+        filePath = self.model.filePath(indexItem)
+        if os.path.isdir(filePath) and self.batchFitTask is None:
+            self.batchFitTask = BatchFitTask(filePath)
+            self.batchFitTask.setAutoDelete(False)
+            self.batchFitTask.signals.progress.connect(self.signalBatchFitMessage)
+            self.batchFitTask.signals.finished.connect(self.onBatchFitFinished)
+            self.signalBatchFitMessage.emit("Refit: " + filePath)
+            QtCore.QThreadPool.globalInstance().start(self.batchFitTask)
+
+    def onBatchFitFinished(self, results):
+        self.batchFitTask = None
+        failed = len([result for result in results if result[1] is None])
+        self.signalBatchFitMessage.emit("Refit finished: " + str(len(results) - failed) + " fitted, " +
+                                        str(failed) + " failed")
+
     def getTheoryModelsString(self, theory):
         theoryStr = ""
         theoryStr += theory.text
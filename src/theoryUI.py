@@ -60,7 +60,7 @@ class TheoryUI(QObject):
             return
         if self.currentTheory.modelsList is None:
             return
-        for parameter in self.currentTheory.parameters:
+        for parameter in self.currentTheory.parameters + self.currentTheory.resolution:
             if parameter is not None:
                 parameter.widget.setVisible(False)
         self.theoryParametersContainer.setVisible(False)
@@ -72,8 +72,8 @@ class TheoryUI(QObject):
     def showTheoryParameters(self):
         self.theoryParametersContainer.setVisible(True)
         i = 0
-        l = math.ceil(len(self.currentTheory.parameters) * 0.5)
-        for parameter in self.currentTheory.parameters:
+        l = math.ceil(len(self.currentTheory.parameters + self.currentTheory.resolution) * 0.5)
+        for parameter in self.currentTheory.parameters + self.currentTheory.resolution:
             self.theoryParametersLayout.addWidget(parameter.widget, 1 + i % l, math.floor(i / l))
             parameter.widget.setVisible(True)
             i += 1
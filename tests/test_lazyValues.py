@@ -0,0 +1,53 @@
+import os
+import sys
+import shutil
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "Theory")]
+
+import spectrumObject
+from fileManager import readSpectraFile, readDatValues
+
+DAT_FILE = os.path.join(ROOT, "dat", "123.dat")
+
+
+@pytest.fixture
+def failures(monkeypatch):
+    messages = []
+    monkeypatch.setattr(spectrumObject, "loadErrorListeners", [lambda spectrum, message: messages.append(message)])
+    return messages
+
+
+def lazySpectra(tmp_path):
+    filePath = tmp_path / "123.dat"
+    shutil.copy(DAT_FILE, filePath)
+    return filePath, readSpectraFile(str(filePath))
+
+
+def test_missingFileIsReadLater(tmp_path, failures):
+    filePath, spectra = lazySpectra(tmp_path)
+    moved = tmp_path / "moved.dat"
+    os.rename(filePath, moved)
+    assert len(spectra[0].xValues) == 0
+    assert spectra[0].valuesLoader is not None
+    assert spectra[0].loadValues() is False
+    assert len(failures) == 2
+    os.rename(moved, filePath)
+    assert len(spectra[0].xValues) == spectra[0].numPoints
+    assert spectra[0].valuesLoader is None
+    assert len(failures) == 2
+
+
+def test_shortenedFileFails(tmp_path, failures):
+    filePath, spectra = lazySpectra(tmp_path)
+    last = spectra[-1]
+    with open(filePath, "r+b") as file:
+        file.truncate(os.path.getsize(filePath) - 4)
+    with pytest.raises(ValueError):
+        readDatValues(*last.valuesLoader.args)
+    assert len(last.yValues) == 0
+    assert last.valuesLoader is not None
+    assert failures and "shorter" in failures[0]
+    assert len(spectra[0].xValues) == len(spectra[0].yValues) == spectra[0].numPoints
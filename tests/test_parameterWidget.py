@@ -0,0 +1,48 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "Theory")]
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from theoryModels import Theory, TheoryParameter
+
+app = QApplication.instance() or QApplication([])
+
+
+def precisionParameter():
+    parameter = TheoryParameter(Theory.MIXED, 'Precision', "", False, choices=Theory.PRECISIONS)
+    values = []
+    parameter.listeners.append(values.append)
+    return parameter, values
+
+
+def test_choicesInComboBox():
+    parameter, values = precisionParameter()
+    choiceBox = parameter.getBinding().choiceBox
+    assert parameter.getBinding().numberEdit is None
+    assert [choiceBox.itemText(i) for i in range(choiceBox.count())] == list(Theory.PRECISIONS.values())
+    assert choiceBox.currentData() == Theory.MIXED
+    choiceBox.setCurrentIndex(choiceBox.findData(Theory.DOUBLE))
+    assert parameter.value == Theory.DOUBLE
+    assert values == [Theory.DOUBLE]
+
+
+def test_setValueShownInComboBox():
+    parameter, values = precisionParameter()
+    parameter.getBinding()
+    parameter.setValue(0.2)
+    assert parameter.value == Theory.SINGLE
+    assert parameter.getBinding().choiceBox.currentData() == Theory.SINGLE
+    with pytest.raises(ValueError, match="Precision must be one of"):
+        parameter.setValue(5)
+    assert parameter.value == Theory.SINGLE
+
+
+def test_numberParameterInLineEdit():
+    parameter = TheoryParameter(2.5, 'd', "cm")
+    assert parameter.getBinding().choiceBox is None
+    parameter.setValue(3.25)
+    assert parameter.numberEdit.value == 3.25
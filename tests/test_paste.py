@@ -0,0 +1,40 @@
+import os
+import sys
+from types import SimpleNamespace
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "Theory"), ROOT]
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QStatusBar
+from importTask import PasteTask
+
+app = QApplication.instance() or QApplication([])
+
+
+def runPaste(text):
+    task = PasteTask(text)
+    results = []
+    task.signals.loaded.connect(lambda source, spectra: results.append(("loaded", source, spectra)))
+    task.signals.failed.connect(lambda source, message: results.append(("failed", source, message)))
+    task.run()  # in this thread, the signals are delivered directly
+    return results
+
+
+@pytest.mark.parametrize("text", ["", "not an export\n1 2 3"])
+def test_pasteFailedWithMessage(text):
+    (result, source, message), = runPaste(text)
+    assert result == "failed"
+    assert source == "Clipboard"
+    assert message
+
+
+def test_pasteFailedShownInStatusBar():
+    pytest.importorskip("darktheme")
+    import main
+    task = PasteTask("")
+    window = SimpleNamespace(pasteTasks=[task], statusbar=QStatusBar())
+    main.MainWindow.onPasteFailed(window, task, "Clipboard", "no spectra in the clipboard")
+    assert window.pasteTasks == []
+    assert window.statusbar.currentMessage() == "Paste failed: no spectra in the clipboard"
@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import shutil
+from types import SimpleNamespace
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "Theory")]
+
+from fileManager import readSpectraFile
+from sessionStore import saveSession, loadSession
+
+DAT_FILE = os.path.join(ROOT, "dat", "123.dat")
+
+
+def readTable(fileName, selected):
+    spectra = readSpectraFile(fileName)
+    return SimpleNamespace(experimentName="123", fileType=spectra[0].fileType, spectra=spectra,
+                           selectedPlotsBySpectra={spectra[row]: None for row in selected})
+
+
+def savedTable(tmp_path, monkeypatch):
+    dataDir = tmp_path / "data"
+    dataDir.mkdir()
+    shutil.copy(DAT_FILE, dataDir / "123.dat")
+    monkeypatch.chdir(dataDir)
+    table = readTable("123.dat", [1])
+    points = [(s.xValues.copy(), s.yValues.copy()) for s in readSpectraFile("123.dat")]
+    table.spectra[1].xValues  # plotted, the others are not read
+    sessionPath = str(tmp_path / "session.npz")
+    saveSession(sessionPath, [table], [], {})
+    return sessionPath, dataDir, points
+
+
+def test_lazySpectraFromOtherDirectory(tmp_path, monkeypatch):
+    sessionPath, dataDir, points = savedTable(tmp_path, monkeypatch)
+    with np.load(sessionPath) as data:
+        session = json.loads(data["session"].item())
+        assert len(data["xValues"]) == len(points[1][0])  # only the loaded spectrum
+    assert session["tables"][0]["sources"][0][0] == str(dataDir / "123.dat")
+    assert [meta["lazy"] is not None for meta in session["spectra"]] == [True, False, True, True]
+
+    monkeypatch.chdir(tmp_path)
+    (name, fileType, spectra, selected, sources), = loadSession(sessionPath)[0]
+    assert selected == [1]
+    assert sources == [str(dataDir / "123.dat")]
+    assert spectra[0].valuesLoader is not None
+    assert spectra[0].filePath == os.path.join("data", "123.dat")
+    for spectrum, (x, y) in zip(spectra, points):
+        assert np.array_equal(spectrum.xValues, x)
+        assert np.array_equal(spectrum.yValues, y)
+
+
+def test_changedFileIsReadAgain(tmp_path, monkeypatch):
+    sessionPath, dataDir, points = savedTable(tmp_path, monkeypatch)
+    os.utime(dataDir / "123.dat", ns=(0, 0))
+    monkeypatch.chdir(tmp_path)
+    (name, fileType, spectra, selected, sources), = loadSession(sessionPath)[0]
+    assert selected == [1]
+    assert np.array_equal(spectra[1].yValues, points[1][1])
@@ -0,0 +1,55 @@
+import os
+import sys
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "Theory")]
+
+from fileManager import writeTheory
+from theoryTypes import TheoryType
+from theoryEval import inputFiles, outputNames, evalTheories
+
+THEORY_NAME = "Tr,Ph(f)"
+
+
+def writeTheoryFile(directory, stem, f_End):
+    directory.mkdir(parents=True, exist_ok=True)
+    theory = TheoryType.types[THEORY_NAME]()
+    theory.f_End.setValue(f_End)
+    theory.numPoints.setValue(50)
+    filePath = directory / (stem + ".theory")
+    writeTheory(theory, str(filePath), [])
+    return str(filePath)
+
+
+def test_namesNextToInputsKeepStems():
+    files = [os.path.join("x", "a.theory"), os.path.join("y", "a.theory")]
+    assert outputNames(files) == ["a", "a"]
+
+
+def test_sameStemsInOneDirectoryArePrefixed():
+    files = [os.path.join("x", "a.theory"), os.path.join("y", "a.theory"), os.path.join("y", "b.theory")]
+    assert outputNames(files, "out") == ["x_a", "y_a", "b"]
+    assert outputNames(files, None, "hdf5") == ["x_a", "y_a", "b"]
+
+
+def test_sameParentNamesAreNumbered():
+    files = [os.path.join("1", "x", "a.theory"), os.path.join("2", "x", "a.theory")]
+    assert outputNames(files, "out") == ["x_a", "x_a_2"]
+
+
+def test_fileGivenTwiceIsEvaluatedOnce(tmp_path):
+    filePath = writeTheoryFile(tmp_path / "x", "a", 5)
+    assert inputFiles([filePath, str(tmp_path / "x")]) == [filePath]
+
+
+def test_sameStemsDoNotOverwrite(tmp_path):
+    first = writeTheoryFile(tmp_path / "x", "a", 5)
+    second = writeTheoryFile(tmp_path / "y", "a", 7)
+    output = tmp_path / "out"
+    results = evalTheories([first, second], str(output), "npz", progress=lambda message: None)
+    assert [ok for filePath, ok, message in results] == [True, True]
+    assert sorted(os.listdir(output)) == ["x_a.npz", "y_a.npz"]
+    for name, f_End in [("x_a", 5), ("y_a", 7)]:
+        with np.load(output / (name + ".npz")) as data:
+            assert np.isclose(data["x0"].max(), f_End, rtol=0.05)
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import pickle
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "Theory")]
+
+from fileManager import THEORY_FORMAT, THEORY_VERSION, theoryFromDict, loadTheory, writeTheory
+from theoryTypes import TheoryType
+
+THEORY_NAME = "Tr,Ph(f)"
+
+
+def header(**entries):
+    theoryDict = {"format": THEORY_FORMAT, "version": THEORY_VERSION, "name": THEORY_NAME}
+    theoryDict.update(entries)
+    return theoryDict
+
+
+def test_minimalHeader():
+    theory, experiments = theoryFromDict(header())
+    assert theory.name == THEORY_NAME
+    assert experiments == []
+
+
+@pytest.mark.parametrize("theoryDict", [
+    header(models={}),
+    header(models="ab"),
+    header(models=["ab"]),
+    header(models=[{}]),
+    header(models=[{"name": "Oscillator", "parameters": []}]),
+    header(parameters={"d": "thick"}),
+    header(fitBounds={"d": [0]}),
+    header(resolution=[]),
+    header(experiments=[{"filePath": "a.dat"}]),
+    header(curves=[{"x": []}]),
+    header(resolution={"numPoints": "abc"}),
+    header(resolution={"numPoints": None}),
+    header(resolution={"numPoints": float("nan")}),
+    header(curves=[{"dataType": "Tr(f)", "comment": "", "x": [1.0, 2.0], "y": [1.0]}]),
+    header(curves=[{"dataType": "Tr(f)", "comment": "", "x": [[1.0], [2.0]], "y": [[1.0], [2.0]]}]),
+    header(curves=[{"dataType": "Tr(f)", "comment": "", "x": ["1", "2"], "y": [1.0, 2.0]}]),
+    header(curves=[{"dataType": "Tr(f)", "comment": "", "x": None, "y": None}]),
+    header(name="no such theory"),
+    {"name": "no such theory", "parameters": [], "models": [], "experiments": []},
+    {"name": THEORY_NAME},
+    [THEORY_NAME],
+    5,
+])
+def test_malformedRaisesValueError(theoryDict):
+    with pytest.raises(ValueError):
+        theoryFromDict(theoryDict)
+
+
+def test_roundTrip(tmp_path):
+    theory = TheoryType.types[THEORY_NAME]()
+    theory.parameters[0].setValue(0.25)
+    theory.parameters[0].fitBounds = (0.1, 0.5)
+    filePath = str(tmp_path / "t.theory")
+    writeTheory(theory, filePath, [{"filePath": "a.dat", "inFileNum": 1}])
+    loaded, experiments = loadTheory(filePath)
+    assert loaded.parameters[0].value == 0.25
+    assert loaded.parameters[0].fitBounds == (0.1, 0.5)
+    assert experiments == [{"filePath": "a.dat", "inFileNum": 1}]
+
+
+def test_firstFormat(tmp_path):
+    theory = TheoryType.types[THEORY_NAME]()
+    oldDict = {"name": THEORY_NAME, "parameters": [p.value for p in theory.parameters], "models": [],
+               "experiments": [], "fitBounds": {"parameters": [(0.1, 0.2)], "models": []}}
+    filePath = tmp_path / "old.theory"
+    filePath.write_bytes(pickle.dumps(oldDict))
+    loaded, experiments = loadTheory(str(filePath))
+    assert loaded.parameters[0].fitBounds == (0.1, 0.2)
+    json.dumps(experiments)
+
+
+class Payload:  # a pickled object runs code when it is unpickled by pickle.loads
+    def __reduce__(self):
+        return os.system, ("echo unpickled",)
+
+
+@pytest.mark.parametrize("data", [b"", b"garbage\x00\x01", b"\x80\x04\x95", pickle.dumps(Payload()),
+                                  pickle.dumps([1, 2]), b"{not json"])
+def test_notTheoryFileRaisesValueError(tmp_path, data):
+    filePath = tmp_path / "bad.theory"
+    filePath.write_bytes(data)
+    with pytest.raises(ValueError):
+        loadTheory(str(filePath))
+
+
+@pytest.mark.parametrize("name, resolution", [("Ho LGS M(H)", {"quadrature": 2}),
+                                              ("Gauss phonon", {"precision": 3}),
+                                              ("Gauss phonon", {"precision": -1})])
+def test_choiceOutOfSetRaisesValueError(name, resolution):
+    with pytest.raises(ValueError):
+        theoryFromDict(header(name=name, resolution=resolution))
+
+
+def test_choiceIsRounded():
+    theory, experiments = theoryFromDict(header(name="Ho LGS M(H)", resolution={"quadrature": 0.9999}))
+    assert theory.quadrature.value == 1
+    assert isinstance(theory.quadrature.value, int)
@@ -0,0 +1,14 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "Theory")]
+
+from theoryTypes import TheoryType
+
+
+# .theory files and sessions are loaded by the key, it must be the name of the class
+@pytest.mark.parametrize("name", list(TheoryType.types))
+def test_keyIsClassName(name):
+    assert TheoryType.types[name].load().name == name
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = [os.path.join(ROOT, "src"), os.path.join(ROOT, "src", "Theory")]
+EXIT_TIMEOUT = 120  # s, includes the compilation of the kernels without the numba cache
+
+# the parallel kernels are calculated in a worker thread as in the GUI, the process must exit afterwards
+THREAD_SCRIPT = """
+import threading
+import numpy as np
+import langasiteSites
+from theoryTypes import TheoryType
+
+def run():
+    langasiteSites.sumM_H(np.linspace(0, 1e4, 10), np.full(5, 1e-40), np.ones(5), np.ones(3), np.ones(3), 2.0)
+    TheoryType.types["Gauss phonon"]().update()
+    print("done")
+
+thread = threading.Thread(target=run)
+thread.start()
+thread.join()
+"""
+
+POOL_SCRIPT = """
+from PyQt5.QtCore import QCoreApplication, QRunnable, QThreadPool
+from theoryTypes import TheoryType
+
+class UpdateTask(QRunnable):
+    def __init__(self, theory):
+        super(UpdateTask, self).__init__()
+        self.theory = theory
+
+    def run(self):
+        self.theory.update()
+        print("done")
+
+app = QCoreApplication([])
+theory = TheoryType.types["Ho LGS DistrAngleDcf"]()
+pool = QThreadPool()
+pool.start(UpdateTask(theory))
+pool.waitForDone()
+"""
+
+
+def runScript(script):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(PATHS + [os.environ.get("PYTHONPATH", "")]),
+               QT_QPA_PLATFORM="offscreen")
+    return subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True,
+                          timeout=EXIT_TIMEOUT)
+
+
+def test_exitAfterKernelsInThread():
+    result = runScript(THREAD_SCRIPT)
+    assert result.returncode == 0, result.stderr
+    assert "done" in result.stdout
+
+
+def test_exitAfterTheoryInThreadPool():
+    result = runScript(POOL_SCRIPT)
+    assert result.returncode == 0, result.stderr
+    assert "done" in result.stdout
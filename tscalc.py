@@ -0,0 +1,45 @@
+import os
+import sys
+import argparse
+
+# Command line tools without the GUI, run from the program directory:
+#   python -m tscalc eval theories/ --format npz --output-dir results --set numPoints=5000
+
+sys.path[:0] = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"),
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "Theory")]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="tscalc")
+    commands = parser.add_subparsers(dest="command", required=True)
+    evalParser = commands.add_parser("eval", help="calculate the curves of .theory files")
+    evalParser.add_argument("paths", nargs="+", help=".theory files or directories with them")
+    evalParser.add_argument("--format", choices=["csv", "npz", "hdf5"], default="csv")
+    evalParser.add_argument("--output-dir", default=None,
+                            help="next to the .theory files by default, the current directory for hdf5")
+    evalParser.add_argument("--points", type=int, default=None, help="curve points, the saved value by default")
+    evalParser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                            help="theory parameter by attribute name, e.g. f_Start=2")
+    evalParser.add_argument("--workers", type=int, default=1,
+                            help="worker processes, each compiles the kernels once, so for long lists only")
+    args = parser.parse_args(args)
+
+    if args.command == "eval":
+        from theoryEval import evalTheories, parseSettings
+        try:
+            settings = parseSettings(args.set)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.points is not None:
+            settings["numPoints"] = args.points
+        if args.format == "hdf5":
+            try:
+                import h5py
+            except ImportError:
+                parser.error("hdf5 output needs h5py")
+        results = evalTheories(args.paths, args.output_dir, args.format, settings, args.workers)
+        return 0 if all(ok for filePath, ok, message in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())